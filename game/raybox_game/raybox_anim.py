@@ -0,0 +1,65 @@
+# raybox_anim.py
+#
+# Register animations: timed effects (e.g. the environment flash, vshift scrolling, leak
+# wading) described as a table of steps, one per frame, where each step is a list of
+# 'reg' peripheral calls as (method, args) tuples, e.g.:
+#   [ [('sky', (63,)), ('floor', (63,))], [('sky', (47,))], [], ... ]
+#
+# If the device supports it (i.e. its controller has `animations` set; see ANIM in
+# raybox_peripheral_ttsdk2.py), each animation is uploaded once (and again only if it
+# changes), and the RP2040 plays it back locked to vsync, so triggering an effect is one
+# command instead of a burst of register writes every frame. Otherwise, RegisterAnimator
+# plays it back from the host, one step per tick().
+
+class RegisterAnimator:
+    def __init__(self, raybox):
+        self.raybox = raybox
+        self.remote = getattr(raybox, 'animations', False)
+        self.programs = {}  # name => (steps, loop)
+        self.uploaded = {}  # name => (steps, loop) as last uploaded to the device.
+        self.playing = {}   # name => index of next step (host playback only).
+        self.looping = set()# Looped animations that are currently playing.
+
+    def load(self, name, steps, loop=False):
+        self.programs[name] = (steps, loop)
+
+    def play(self, name):
+        if self.programs[name][1]:
+            self.looping.add(name)
+        if self.remote:
+            if self.uploaded.get(name) != self.programs[name]:
+                self.raybox.load_animation(name, *self.programs[name])
+                self.uploaded[name] = self.programs[name]
+            self.raybox.play_animation(name)
+        else:
+            self.playing[name] = 0
+
+    def stop(self, name):
+        self.looping.discard(name)
+        if self.remote:
+            self.raybox.stop_animation(name)
+        else:
+            self.playing.pop(name, None)
+
+    # Start or stop a looped animation, returning whether it's now playing:
+    def toggle(self, name):
+        if name in self.looping:
+            self.stop(name)
+            return False
+        self.play(name)
+        return True
+
+    # Host playback: send the next step of each playing animation:
+    def tick(self):
+        for name in list(self.playing):
+            steps, loop = self.programs[name]
+            i = self.playing[name]
+            for method, args in steps[i]:
+                self.raybox.call_peripheral_method('reg', method, *args)
+            i += 1
+            if i < len(steps):
+                self.playing[name] = i
+            elif loop:
+                self.playing[name] = 0
+            else:
+                del self.playing[name]
@@ -0,0 +1,91 @@
+# raybox_bench.py
+#
+# Flythrough benchmark for raybox_game (--bench PATH): flies a canned camera path through
+# the full transport stack (controller or fan-out, batching, SPI) with no human input, as
+# fast as the link allows, then reports updates/s, update latency percentiles, and dropped
+# frames (60Hz display frames that didn't get a new POV).
+#
+# Camera scripts are JSON files, kept in BENCH_DIR so that results from different hosts,
+# boards and firmware are comparable. A script is a start POV and a list of segments:
+#   {
+#     "description": "Two full turns on the spot",
+#     "start":    { "x": 11.5, "y": 10.5, "a": 0, "facing": 1.0 },
+#     "segments": [ { "updates": 720, "a": 720 } ]
+#   }
+# Each segment moves linearly (per update, not per unit of time, so every run sends exactly
+# the same POVs) from where the last one ended to its own x, y, a (angle in degrees, which
+# may go past 360 to keep turning) and facing (i.e. Player.facing_scaler), over `updates`
+# updates. Anything a segment leaves out stays as it was. Paths ignore collisions.
+#
+# Examples:
+#   python3 raybox_game.py ttsdk2 --bench spin
+#   python3 raybox_game.py ttsdk2:COM5 ci2311:COM7 --bench bench/corridor.json
+
+import json
+import math
+import os
+
+BENCH_DIR       = 'bench'
+FRAME_TIME      = 1.0/60.0  # Display frame period, for counting dropped frames.
+POV_KEYS        = ('x', 'y', 'a', 'facing')
+
+
+# Resolve a bench path: either a file, or the name of a script in BENCH_DIR (relative to
+# this file), e.g. 'spin' for bench/spin.json:
+def find_script(path):
+    if os.path.isfile(path):
+        return os.path.abspath(path)
+    named = os.path.join(os.path.dirname(os.path.abspath(__file__)), BENCH_DIR, path + '.json')
+    if os.path.isfile(named):
+        return named
+    raise FileNotFoundError(f"No bench script {path!r} (and no {named})")
+
+# Load a camera script, and return the list of POVs it flies through, each as a tuple of
+# (x, y, a, facing) with `a` in radians:
+def load_script(path):
+    with open(path) as f:
+        script = json.load(f)
+    pov = {'x': 11.5, 'y': 10.5, 'a': 0.0, 'facing': 1.0}
+    pov.update(script.get('start', {}))
+    povs = [tuple(pov[k] for k in POV_KEYS)]
+    for seg in script['segments']:
+        start = dict(pov)
+        pov.update((k, seg[k]) for k in POV_KEYS if k in seg)
+        n = seg['updates']
+        for i in range(1, n+1):
+            t = i/n
+            povs.append(tuple(start[k] + (pov[k]-start[k])*t for k in POV_KEYS))
+    return [(x, y, math.radians(a), facing) for x, y, a, facing in povs]
+
+
+# Per-update timing for one bench run:
+class BenchStats:
+    def __init__(self):
+        self.latencies = []     # Time (seconds) from sending each update until it was done.
+        self.done = []          # perf_counter() time each update was done.
+        self.start = None
+
+    def add(self, sent, done):
+        if self.start is None:
+            self.start = sent
+        self.latencies.append(done-sent)
+        self.done.append(done)
+
+    # Display frames (at FRAME_TIME) that went by without a new POV arriving:
+    def dropped_frames(self):
+        gaps = [b-a for a, b in zip([self.start] + self.done, self.done)]
+        return sum(max(0, math.ceil(g/FRAME_TIME)-1) for g in gaps)
+
+    def report(self):
+        n = len(self.latencies)
+        if n == 0:
+            return "No updates sent"
+        elapsed = self.done[-1] - self.start
+        lat = sorted(self.latencies)
+        ms = lambda p: lat[min(n-1, int(n*p))]*1000.0
+        frames = elapsed/FRAME_TIME
+        return (
+            f"{n} updates in {elapsed:.3f}s: {n/elapsed:.1f} updates/s\n"
+            f"Latency ms p50/p95/p99/max: {ms(0.5):.2f}/{ms(0.95):.2f}/{ms(0.99):.2f}/{ms(1.0):.2f}\n"
+            f"Dropped frames: {self.dropped_frames()} of {frames:.0f}"
+        )
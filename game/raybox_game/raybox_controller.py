@@ -22,7 +22,9 @@ import sys
 import serial
 import serial.tools.list_ports
 import os
+from contextlib import contextmanager
 from pathlib import Path
+from raybox_profiler import NullProfiler
 
 # These files contain the MicroPython code that gets pushed to a respective version of the
 # TT demo board's RP2040.
@@ -32,12 +34,15 @@ PATH_TO_RAYBOX_PERIPHERAL_CI2311_CODE   = './raybox_peripheral_ci2311.py'
 
 CLOCK_SPEED = 25_000_000  # Clock for design. 25.175MHz is 'typical' VGA clock, at 59.94fps
 MACHINE_FREQ = 225_000_000 # RP2040 clock. This should be an integer multiple (2+) of CLOCK_SPEED.
+LATENCY_SMOOTHING = 0.1 # EWMA weight of each new batch() round trip in latency().
 
 # Represents a serial connection to a MicroPython device:
 class MicroPythonInterface:
     def __init__(self, **kwargs):
         # print("***************** MicroPythonInterface init")
         debug = kwargs.get('debug', False)
+        # Optional SpanProfiler for timing each transaction (see raybox_profiler.py):
+        self.profiler = kwargs.get('profiler') or NullProfiler()
         if debug:
             # List COM ports:
             print("Available COM ports:")
@@ -50,9 +55,9 @@ class MicroPythonInterface:
                 port_id = f"{desc} - {hwid}"
                 if port_id != "n/a - n/a":
                     print(f"{port}: {port_id}")
-        # Check whether a port is a Raspberry Pi device
-        self.port = None
-        for port in ports:
+        # Use a specific port if given, otherwise check whether a port is a Raspberry Pi device:
+        self.port = kwargs.get('port')
+        for port in ports if self.port is None else []:
             if port.vid == 0x2E8A:
                 self.port = port.device
                 print(f"Found RP port: {port.hwid} -- {port.device}")
@@ -62,13 +67,15 @@ class MicroPythonInterface:
             port = ports[-1]
             self.port = port.device
             print(f"Using the last port by default: {port.hwid} -- {port.device}")
-        print(f"*** NOTE: If you need to use a specific port, edit {self.__class__.__name__} in {__file__}")
+        print(f"*** NOTE: If you need to use a specific port, pass port=... to {self.__class__.__name__} (e.g. raybox_game.py DEVICE:PORT)")
         #NOTE: baudrate doesn't really make any difference for USB CDC serial devices,
         # though there is one value (1200) that is a signal to the RP2040 to reset itself.
         self.conn = serial.Serial(port=self.port, baudrate=9600)
         self.conn.timeout = 10.0
         self.conn.write_timeout = 10.0
         # self.write = self.conn.write
+        self.pending = None # List of queued commands, while in a batch().
+        self.rtt = None # Smoothed batch() round trip time (seconds).
 
     def write(self, *data):
         for p in data:
@@ -120,13 +127,19 @@ class MicroPythonInterface:
             raise Exception(f'Expected raw REPL welcome but got: {r}')
 
     def raw_exec(self, data, decode_response='utf-8'):
-        self.write(data, b'\x04')
-        # Expect acknowledgement of CTRL+D:
-        self.await_bytes(b'OK', exception=Exception('Did not receive OK'))
-        # Expect first EOT to mark start of response:
-        out = self.await_bytes(b'\x04', exception=Exception('Did not receive first EOT'))
-        # Wait until the next EOT to mark the end of the response:
-        r = self.await_bytes(b'\x04>')
+        prof = self.profiler
+        args = { 'data': repr(data[:80]) } if prof.enabled else None
+        with prof.span('raw_exec', 'serial', args):
+            with prof.span('serial_write', 'serial'):
+                self.write(data, b'\x04')
+            # Expect acknowledgement of CTRL+D:
+            with prof.span('await_ok', 'serial'):
+                self.await_bytes(b'OK', exception=Exception('Did not receive OK'))
+            # Expect first EOT to mark start of response:
+            with prof.span('await_eot', 'serial'):
+                out = self.await_bytes(b'\x04', exception=Exception('Did not receive first EOT'))
+                # Wait until the next EOT to mark the end of the response:
+                r = self.await_bytes(b'\x04>')
         if type(r) is not tuple:
             raise Exception(f'Expected 2nd EOT and > prompt but got: {r}')
         if len(r[1]) != 0:
@@ -139,6 +152,34 @@ class MicroPythonInterface:
     def exec(self, data):
         return self.raw_exec(data, 'ascii').strip()
 
+    # Within a `with batch():` block, commands sent via command() are queued and then all
+    # executed in one raw_exec at the end, i.e. one serial round trip (and one burst of SPI
+    # activity on the peripheral) instead of one per command:
+    @contextmanager
+    def batch(self):
+        outer = self.pending is not None
+        if not outer: self.pending = []
+        try:
+            yield
+        finally:
+            if not outer:
+                pending, self.pending = self.pending, None
+                if pending:
+                    start = time.perf_counter()
+                    self.exec('\n'.join(pending))
+                    rtt = time.perf_counter() - start
+                    self.rtt = rtt if self.rtt is None else self.rtt + (rtt-self.rtt)*LATENCY_SMOOTHING
+
+    # Smoothed time (seconds) for a batch() of commands to be sent and executed:
+    def latency(self):
+        return self.rtt or 0.0
+
+    # Execute a command now, or queue it if we're in a batch() (in which case there's no response):
+    def command(self, data):
+        if self.pending is None:
+            return self.exec(data)
+        self.pending.append(data)
+
 
 # Represents a TT demo board running MicroPython SDK 1.x:
 class TTSDK1(MicroPythonInterface):
@@ -233,6 +274,9 @@ class RayboxZeroControllerTTSDK1(TTSDK1):
     UI_REG      = 6
     UI_GEN_TEX  = 7 # Not supported by TT04 version.
 
+    pov_via_reg = False # Send POV via CMD_POV on the 'reg' interface? Not supported by TT04 version.
+    animations  = False # Can register animations be uploaded and played on the RP2040? (See raybox_anim.py)
+
     def __init__(self, **kwargs):
         # print("***************** RayboxZeroControllerTTSDK1 init")
         super().__init__(**kwargs)
@@ -262,10 +306,12 @@ class RayboxZeroControllerTTSDK1(TTSDK1):
         self.set_ui_bit(self.UI_GEN_TEX, state)
 
     def set_raw_pov(self, pov):
-        return self.exec(f'pov.set_raw_pov({repr(pov)})')
+        if self.pov_via_reg:
+            return self.command(f'reg.pov({repr(pov)})')
+        return self.command(f'pov.set_raw_pov({repr(pov)})')
     
     def call_peripheral_method(self, interface, method, *data):
-        return self.exec(f'{interface}.{method}({','.join(map(str,map(int,data)))})')
+        return self.command(f'{interface}.{method}({','.join(map(str,map(int,data)))})')
 
     def set_sky(self, color):
         return self.call_peripheral_method('reg', 'sky', color)
@@ -282,6 +328,8 @@ class RayboxZeroControllerTTSDK1(TTSDK1):
 
 
 class RayboxZeroControllerTTSDK2(RayboxZeroControllerTTSDK1, TTSDK2):
+    animations  = True
+
     def __init__(self, **kwargs):
         # print("***************** RayboxZeroControllerTTSDK2 init")
         super(TTSDK2, self).__init__(**kwargs)
@@ -309,13 +357,32 @@ class RayboxZeroControllerTTSDK2(RayboxZeroControllerTTSDK1, TTSDK2):
         print(self.exec(remote_api_code))
         print(self.exec('print(repr(tt))'))
         print('RP2040 core clock:', self.exec('print(machine.freq())'))
+        # Send POV via the 'reg' interface (CMD_POV) if the design supports it, so each tick's
+        # POV and register updates all go out on the one SPI bus. pov_via_reg=None means probe for it:
+        pov_via_reg = kwargs.get('pov_via_reg')
+        if pov_via_reg is None:
+            pov_via_reg = self.exec('print(int(reg.probe_pov_via_reg()))') == '1'
+            print(f"POV via REG (CMD_POV) probe: {'supported' if pov_via_reg else 'not supported'}")
+        self.pov_via_reg = pov_via_reg
+
+    # Register animations (see ANIM in raybox_peripheral_ttsdk2.py):
+    def load_animation(self, name, steps, loop=False):
+        return self.command(f'anim.load({name!r},{steps!r},{loop!r})')
+
+    def play_animation(self, name):
+        return self.command(f'anim.play({name!r})')
+
+    def stop_animation(self, name=None):
+        return self.command(f'anim.stop({name!r})')
 
 
 # Represents Anton's RP2040 board (or probably any RP2040 board)
 # sending commands via UART to firmware on a CI2311 raybox-zero chip.
 class RayboxZeroControllerCI2311(MicroPythonInterface):
-    def __init__(self, debug=False):
-        super().__init__(debug=debug)
+    animations  = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
         self.enter_raw_mode()
         peripheral_code_path = os.path.join(
             os.path.dirname(os.path.abspath(__file__)),
@@ -331,10 +398,10 @@ class RayboxZeroControllerCI2311(MicroPythonInterface):
         bin = '0' * (-len(pov) % 8) + pov
         # Convert this string of binary digits into a bytearray:
         ba = bytes([int(bin[i:i+8], 2) for i in range(0, len(bin), 8)])
-        return self.exec(f'pov.set_raw_pov({repr(ba)})')
+        return self.command(f'pov.set_raw_pov({repr(ba)})')
     
     def call_peripheral_method(self, interface, method, *data):
-        return self.exec(f'{interface}.{method}({','.join(map(str,map(int,data)))})')
+        return self.command(f'{interface}.{method}({','.join(map(str,map(int,data)))})')
 
     def set_sky(self, color):
         return self.call_peripheral_method('reg', 'sky', color)
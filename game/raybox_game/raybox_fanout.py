@@ -0,0 +1,291 @@
+# raybox_fanout.py
+#
+# Drives several raybox-zero devices (e.g. a TT07 board and a CI2311 board side by side)
+# from one raybox_game, all showing the same scene.
+#
+# RayboxZeroFanout looks like a single controller to the game (same methods as the
+# RayboxZeroController* classes), but each call is broadcast to every device. Each device
+# gets its own I/O worker thread (DeviceLink) that owns its controller, so the game never
+# waits on serial I/O and a slow board doesn't hold up the others:
+# - Calls made within a batch() are queued as one unit, and each worker runs a whole unit
+#   in one raw_exec (see MicroPythonInterface.batch()).
+# - If a worker falls behind, it merges everything queued into one unit, keeping every
+#   register write but only the newest POV, so a slow board skips frames rather than lagging.
+# - If a device fails (e.g. serial error or timeout), it's dropped out and the worker keeps
+#   trying to reconnect. Once reconnected, it replays the latest POV and register state so
+#   it matches the other devices again.
+# - Each worker keeps latency stats (queue wait and round trip), printed by close().
+#
+# Device specs are CLASS or CLASS:PORT, where CLASS is one of DEVICE_CLASSES, e.g.:
+#   python3 raybox_game.py ttsdk2:COM5 ci2311:COM7
+
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from raybox_controller import RayboxZeroControllerTTSDK1, RayboxZeroControllerTTSDK2, RayboxZeroControllerCI2311
+from raybox_profiler import NullProfiler
+
+DEVICE_CLASSES = {
+    'ttsdk1':   RayboxZeroControllerTTSDK1,
+    'ttsdk2':   RayboxZeroControllerTTSDK2,
+    'ci2311':   RayboxZeroControllerCI2311,
+}
+
+RECONNECT_DELAY = 2.0   # Seconds between reconnect attempts for a failed device.
+CLOSE_TIMEOUT   = 2.0   # Seconds to wait for each worker to finish its queue in close().
+LATENCY_HISTORY = 1000  # Number of recent round trips kept for latency percentiles.
+LATENCY_SMOOTHING = 0.1 # EWMA weight of each new update in LinkStats.latency.
+
+
+# Parse a device spec (CLASS or CLASS:PORT) into (class, port):
+def parse_device(spec):
+    name, _, port = spec.partition(':')
+    if name not in DEVICE_CLASSES:
+        raise ValueError(f"Unknown device {name!r}; must be one of: {', '.join(DEVICE_CLASSES)}")
+    return DEVICE_CLASSES[name], (port or None)
+
+# Key for the piece of device state that a call sets, so reconnects can replay just the
+# latest value of each. Calls that don't set state (return None) aren't replayed:
+def state_key(method, args):
+    if method == 'call_peripheral_method':
+        interface, name = args[:2]
+        return (interface, name) + (tuple(args[2:3]) if name == 'texadd' else ())
+    if method == 'load_animation':
+        return (method, args[0])
+    if method in ('set_raw_pov', 'set_sky', 'set_floor', 'set_leak', 'set_gen_tex', 'debug', 'enable_player_auto_increment'):
+        return (method,)
+    return None
+
+
+# Round trip/queue latency stats for one device:
+class LinkStats:
+    def __init__(self):
+        self.updates = 0        # Units of work (i.e. batches) sent.
+        self.merged = 0         # Units merged into a later one because the device was behind.
+        self.povs_skipped = 0   # POVs dropped from merged units.
+        self.errors = 0
+        self.reconnects = 0
+        self.rtts = []          # Recent round trips (seconds), up to LATENCY_HISTORY.
+        self.waits = []         # Recent queue waits (seconds), up to LATENCY_HISTORY.
+        self.latency = None     # Smoothed queue wait + round trip (seconds).
+
+    def add(self, rtt, wait):
+        self.updates += 1
+        t = rtt + wait
+        self.latency = t if self.latency is None else self.latency + (t-self.latency)*LATENCY_SMOOTHING
+        for history, v in ((self.rtts, rtt), (self.waits, wait)):
+            history.append(v)
+            if len(history) > LATENCY_HISTORY:
+                del history[0]
+
+    def summary(self):
+        def ms(values, p):
+            return sorted(values)[min(len(values)-1, int(len(values)*p))]*1000.0 if values else 0.0
+        return (
+            f"{self.updates} update(s), RTT ms p50/p95/max: {ms(self.rtts, 0.5):.1f}/{ms(self.rtts, 0.95):.1f}/{ms(self.rtts, 1.0):.1f}, "
+            f"queue wait p95: {ms(self.waits, 0.95):.1f}ms, merged: {self.merged}, POVs skipped: {self.povs_skipped}, "
+            f"errors: {self.errors}, reconnects: {self.reconnects}"
+        )
+
+
+# One device, and the I/O worker thread that owns its controller:
+class DeviceLink:
+    def __init__(self, spec, profiler=None, **kwargs):
+        self.name = spec
+        self.cls, port = parse_device(spec)
+        self.kwargs = dict(kwargs, port=port, profiler=profiler)
+        self.profiler = profiler or NullProfiler()
+        self.controller = None
+        self.connected = False
+        self.stats = LinkStats()
+        self.queue = []                 # Pending units: (submit time, [(method, args), ...])
+        self.state = OrderedDict()      # Latest state-setting call for each state_key(), in order set.
+        self.cond = threading.Condition()
+        self.running = True
+        self.sending = False            # True while a unit is being sent.
+        self.thread = threading.Thread(target=self.run, name=f'rbz-{spec}', daemon=True)
+        self.thread.start()
+
+    def submit(self, calls):
+        with self.cond:
+            self.queue.append((time.perf_counter(), calls))
+            self.cond.notify_all()
+
+    # Merge all queued units into one, keeping only the newest POV:
+    def _take(self):
+        units = self.queue
+        self.queue = []
+        calls = [c for _, unit in units for c in unit]
+        last_pov = max((i for i, (m, _) in enumerate(calls) if m == 'set_raw_pov'), default=None)
+        merged = [c for i, c in enumerate(calls) if c[0] != 'set_raw_pov' or i == last_pov]
+        self.stats.merged += len(units)-1
+        self.stats.povs_skipped += len(calls)-len(merged)
+        return units[0][0], merged
+
+    def _connect(self):
+        with self.profiler.span('connect', 'device', {'device': self.name}):
+            self.controller = self.cls(**self.kwargs)
+        self.connected = True
+        print(f"[{self.name}] Connected")
+
+    def _disconnect(self, error):
+        self.connected = False
+        self.stats.errors += 1
+        print(f"[{self.name}] Dropped out: {error!r}")
+        conn = getattr(self.controller, 'conn', None)
+        self.controller = None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    # Methods a device's controller doesn't have (e.g. CI2311 has no set_gen_tex) are skipped:
+    def _send(self, calls):
+        with self.controller.batch():
+            for method, args in calls:
+                f = getattr(self.controller, method, None)
+                if f is not None:
+                    f(*args)
+
+    def run(self):
+        while self.running:
+            if not self.connected:
+                try:
+                    self._connect()
+                    if self.stats.errors > 0:
+                        # Bring this device back in line with the others, which covers
+                        # everything that was queued while it was down:
+                        self.stats.reconnects += 1
+                        with self.cond:
+                            self.queue = [(time.perf_counter(), list(self.state.values()))]
+                except (Exception, SystemExit) as e:
+                    self._disconnect(e)
+                    with self.cond:
+                        self.queue = [] # Don't pile up updates while it's down.
+                    time.sleep(RECONNECT_DELAY)
+                    continue
+            with self.cond:
+                while self.running and not self.queue:
+                    self.cond.wait()
+                if not self.queue:
+                    break
+                submitted, calls = self._take()
+                self.sending = True
+            start = time.perf_counter()
+            try:
+                with self.profiler.span('device_update', 'device', {'device': self.name}):
+                    self._send(calls)
+            except (Exception, SystemExit) as e:
+                self._disconnect(e)
+                continue
+            finally:
+                with self.cond:
+                    self.sending = False
+                    self.cond.notify_all()
+            self.stats.add(time.perf_counter()-start, start-submitted)
+
+    # Wait until everything submitted so far has been sent (or the device has dropped out):
+    def drain(self):
+        with self.cond:
+            while self.running and self.connected and (self.queue or self.sending):
+                self.cond.wait()
+
+    def record_state(self, calls):
+        for method, args in calls:
+            key = state_key(method, args)
+            if key is not None:
+                self.state.pop(key, None)
+                self.state[key] = (method, args)
+
+    # Wait (up to timeout) for the queue to empty, then stop the worker:
+    def close(self, timeout=CLOSE_TIMEOUT):
+        deadline = time.perf_counter() + timeout
+        while self.connected and self.queue and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(max(0.0, deadline-time.perf_counter()))
+
+
+# Looks like a single RayboxZeroController* to the game, but broadcasts to all devices:
+class RayboxZeroFanout:
+    def __init__(self, specs, profiler=None, **kwargs):
+        self.links = [DeviceLink(spec, profiler, **kwargs) for spec in specs]
+        # Register animations are only played on the devices if they all support them:
+        self.animations = all(link.cls.animations for link in self.links)
+        self.pending = None # Calls queued while in a batch().
+        self.debug_state = False
+        self.closed = False
+        atexit.register(self.close)
+
+    def _call(self, method, *args):
+        if self.pending is not None:
+            self.pending.append((method, args))
+        else:
+            self._broadcast([(method, args)])
+
+    def _broadcast(self, calls):
+        for link in self.links:
+            with link.cond:
+                link.record_state(calls)
+            link.submit(calls)
+
+    # Same as MicroPythonInterface.batch(): calls within the block go to each device as one unit:
+    @contextmanager
+    def batch(self):
+        outer = self.pending is not None
+        if not outer: self.pending = []
+        try:
+            yield
+        finally:
+            if not outer:
+                calls, self.pending = self.pending, None
+                if calls: self._broadcast(calls)
+
+    def set_raw_pov(self, pov):                         self._call('set_raw_pov', pov)
+    def call_peripheral_method(self, interface, method, *data):
+                                                        self._call('call_peripheral_method', interface, method, *data)
+    def set_sky(self, color):                           self._call('set_sky', color)
+    def set_floor(self, color):                         self._call('set_floor', color)
+    def set_leak(self, leak):                           self._call('set_leak', leak)
+    def set_gen_tex(self, state):                       self._call('set_gen_tex', state)
+    def debug(self, state):                             self._call('debug', state)
+    def enable_player_auto_increment(self, inc_px=True, inc_py=True):
+                                                        self._call('enable_player_auto_increment', inc_px, inc_py)
+    def load_animation(self, name, steps, loop=False):  self._call('load_animation', name, steps, loop)
+    def play_animation(self, name):                     self._call('play_animation', name)
+    def stop_animation(self, name=None):                self._call('stop_animation', name)
+
+    # Devices might not agree on their current debug state, so we track it here instead:
+    def toggle_debug(self):
+        self.debug_state = not self.debug_state
+        self.debug(self.debug_state)
+        return self.debug_state
+
+    # Wait for every device to finish sending what's been submitted so far, e.g. so a
+    # benchmark can go only as fast as the slowest device:
+    def drain(self):
+        for link in self.links:
+            link.drain()
+
+    def stats(self):
+        return {link.name: link.stats for link in self.links}
+
+    # Smoothed time for an update to reach the slowest connected device. There's only the one
+    # POV for all devices, so this lets latency compensation favour the laggiest board:
+    def latency(self):
+        return max((link.stats.latency or 0.0 for link in self.links if link.connected), default=0.0)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for link in self.links:
+            link.close()
+        for link in self.links:
+            print(f"[{link.name}] {'connected' if link.connected else 'NOT connected'}: {link.stats.summary()}")
+
@@ -7,7 +7,14 @@ import time
 import os
 import math
 import argparse
-from raybox_controller import RayboxZeroControllerTTSDK1, RayboxZeroControllerTTSDK2, RayboxZeroControllerCI2311
+import atexit
+import sys
+from raybox_profiler import SpanProfiler, NullProfiler
+from raybox_fanout import RayboxZeroFanout, parse_device
+from raybox_rate import RateController
+from raybox_bench import BenchStats, find_script, load_script
+from raybox_anim import RegisterAnimator
+from raybox_wallsets import WallSets
 
 # Main input functions:
 # - WASD keys move
@@ -42,10 +49,13 @@ from raybox_controller import RayboxZeroControllerTTSDK1, RayboxZeroControllerTT
 #     M or F12: Toggle mouse capture
 #     F11: Toggle system pause
 #     R: Reset game state
+#     V: Toggle vshift scrolling
+#     L: Toggle leak 'wading'
 #     `: Toggle vectors debug overlay
+#     N: Next wall set (SHIFT: previous), with --walls
 
 parser = argparse.ArgumentParser(add_help=False, description='Runs a raybox-zero "game", controlling target rendering hardware.')
-parser.add_argument('device',           type=str,               choices=['ttsdk1', 'ttsdk2', 'ci2311'], help='Target rendering device/ASIC')
+parser.add_argument('device',           type=str, nargs='+',                                            help='Target rendering device/ASIC: ttsdk1, ttsdk2 or ci2311, optionally with :PORT (e.g. ttsdk2:COM5). Give several to drive them all at once')
 parser.add_argument('-d', '--debug',    action='store_true',                                            help='Print debug info for each update')
 parser.add_argument('-r', '--rotate',   type=int, default=270,  choices=[0,90,180,270],                 help='Clockwise screen rotation in degrees')
 parser.add_argument('-w', '--width',    type=int, default=1000,                                         help='Main window width')
@@ -55,17 +65,39 @@ parser.add_argument('-p', '--player-size', type=float, default=0.55,
 parser.add_argument('-n', '--no-clip',  action='store_true',                                            help='Disable clipping (collisions)')
 parser.add_argument('-g', '--gen-tex',  action='store_true',                                            help='Textures are generated instead of SPI-loaded')
 parser.add_argument('-f', '--flash-delta', type=int, default=0,                                         help='SPI texture base address delta for flash effects (0 to disable)')
+parser.add_argument('--trace',       type=str, metavar='FILE',                                       help='Profile main loop phases and write a Chrome trace (JSON) to FILE on exit')
+parser.add_argument('--pov-via',     type=str, default='auto', choices=['auto', 'pov', 'reg'],   help="Send POV via its own SPI interface, or via CMD_POV on the 'reg' interface (auto: probe the design; TT SDK2 only)")
+parser.add_argument('--tick',        type=float, metavar='MS',                                       help='Send updates at this fixed interval (ms), instead of adapting to the link (see raybox_rate.py)')
+parser.add_argument('--predict',     action='store_true',                                            help='Extrapolate the POV to when it will actually be displayed, to hide link latency')
+parser.add_argument('--predict-max', type=float, default=60.0, metavar='MS',                      help='Max. time (ms) to extrapolate the POV ahead with --predict')
+parser.add_argument('--bench',       type=str, metavar='PATH',                                       help='Fly a canned camera script (a file, or a name in bench/, e.g. spin) as fast as possible, report stats, and quit')
+parser.add_argument('--walls',       type=str, metavar='MANIFEST',                                   help='Wall sets manifest (JSON, from utils/texpack.py) to start with the first of, and switch between with N')
 parser.add_argument('--help', action='help', help='Show this help message and exit')
 args = parser.parse_args()
 
-if args.device == 'ttsdk1':
-    TARGET_DEVICE = RayboxZeroControllerTTSDK1
-elif args.device == 'ttsdk2':
-    TARGET_DEVICE = RayboxZeroControllerTTSDK2
-elif args.device == 'ci2311':
-    TARGET_DEVICE = RayboxZeroControllerCI2311
-
-print(f"Target raybox-zero device controller: {TARGET_DEVICE.__name__}")
+try:
+    DEVICES = [parse_device(spec) for spec in args.device]
+except ValueError as e:
+    parser.error(str(e))
+
+try:
+    #NOTE: Resolve the path now, before we change working dir below.
+    BENCH_FILE = find_script(args.bench) if args.bench else None
+except FileNotFoundError as e:
+    parser.error(str(e))
+
+try:
+    #NOTE: Load now, before we change working dir below.
+    WALL_SETS = WallSets(args.walls) if args.walls else None
+except (OSError, ValueError, KeyError) as e:
+    parser.error(f"Can't load wall sets: {e}")
+
+if len(DEVICES) == 1:
+    TARGET_DEVICE, TARGET_PORT = DEVICES[0]
+    print(f"Target raybox-zero device controller: {TARGET_DEVICE.__name__}")
+else:
+    # Broadcast to all devices, each with its own I/O worker thread:
+    print(f"Target raybox-zero device controllers: {', '.join(args.device)}")
 
 # Natural-feeling behaviour of controls depends on VGA screen orientation:
 if args.rotate == 0:
@@ -103,14 +135,35 @@ PLAYER_SIZE         = args.player_size  # 0.6875 is same as Wolf3D? 0.55 fees ri
 ZOOM_PULSE_SCALER   = 1.5
 
 FLASH_DELTA         = args.flash_delta
+LEAK_WADE_DEPTH     = 12    # Mean 'leak' (in texels) while wading.
+LEAK_WADE_SWELL     = 3     # Peak 'leak' variation (in texels) either side of LEAK_WADE_DEPTH.
+LEAK_WADE_PERIOD    = 90    # Frames per swell.
+
+PREDICT             = args.predict
+PREDICT_MAX         = args.predict_max / 1000.0 # Max. lead time (seconds) for POV prediction.
+PREDICT_SMOOTHING   = 0.5   # EWMA weight of each new tick's velocity for POV prediction.
+# After reaching the chip, a POV goes live at the end of the current frame (half a frame
+# later, on average), and then that frame takes another frame to scan out (so, half a frame
+# to reach the middle of the screen):
+DISPLAY_DELAY       = 1.0/60.0
 
 # Nanoseconds to milliseconds:
 NSMS        = 1_000_000
 
-# 8ms: Size of a "tick" (i.e. the time unit we want to schedule to) in nanoseconds.
-# This really only needs to be less than 1 frame (~16.7ms), but I want to see if
-# it's possible to schedule at least 2 updates per frame:
-TICK        = 8_000_000
+# Size of a "tick" (i.e. the time unit we want to schedule to), in seconds, if fixed by --tick.
+# Otherwise the tick adapts to what the link can sustain (see raybox_rate.py), aiming for
+# up to 2 updates per frame:
+FIXED_TICK  = None if args.tick is None else args.tick/1000.0
+
+# Optional profiling of main loop phases and serial transactions.
+# Recorded spans live in a ring buffer and are only written out on exit:
+if args.trace:
+    #NOTE: Resolve the path now, before we change working dir below.
+    TRACE_FILE = os.path.abspath(args.trace)
+    profiler = SpanProfiler()
+    atexit.register(profiler.save, TRACE_FILE)
+else:
+    profiler = NullProfiler()
 
 # Set working dir to wherever this script is located:
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -118,7 +171,16 @@ os.chdir(os.path.dirname(os.path.abspath(__file__)))
 # Create our interface that talks to MicroPython on the TT04 demo board,
 # for loading and controlling the raybox-zero project:
 # raybox = RayboxZeroCI2311Controller() # RayboxZeroController()
-raybox = TARGET_DEVICE(debug=DEBUG, gen_tex=GEN_TEX)
+POV_VIA_REG = { 'auto': None, 'pov': False, 'reg': True }[args.pov_via]
+if len(DEVICES) == 1:
+    raybox = TARGET_DEVICE(debug=DEBUG, gen_tex=GEN_TEX, profiler=profiler, pov_via_reg=POV_VIA_REG, port=TARGET_PORT)
+else:
+    raybox = RayboxZeroFanout(args.device, debug=DEBUG, gen_tex=GEN_TEX, profiler=profiler, pov_via_reg=POV_VIA_REG)
+
+# Update rate control, starting from this device (or set of devices)'s saved profile:
+rate = RateController(' '.join(args.device), fixed_tick=FIXED_TICK)
+atexit.register(rate.save)
+print(f"Update rate: {rate.summary()}")
 
 # Set up a Pygame window.
 pygame.init()
@@ -175,7 +237,7 @@ pause           = False
 min_loops       = None  # Min. no. of loop iterations that we managed to get within a tick.
 max_loops       = 0
 sum_loops       = 0
-max_delta       = 0     # Target is 'TICK', but so long as it's less than TICK*1.5 we're probably OK.
+max_delta       = 0     # Target is the tick, but so long as it's less than tick*1.5 we're probably OK.
 sum_deltas      = 0     # Used to produce an average of time deltas.
 
 
@@ -196,6 +258,9 @@ class RBZMap:
     ]
     def __init__(self, raybox): #: RayboxZeroController = None):
         self.raybox = raybox
+        self.anim = RegisterAnimator(raybox)
+        # Register writes waiting for flush_registers(), newest value per register:
+        self.__dict__['pending_regs'] = {}
         self.leak = 0
         self.vinf = False
         self.vshift = 0
@@ -232,7 +297,10 @@ class RBZMap:
         self.screen_width = float(SCREEN_W)
         self.screen_height = float(SCREEN_H)
         self.map_surface = None
-        self.flash_step = 0
+        # Looped register animations (see raybox_anim.py), toggled by keys:
+        self.anim.load('vshift_scroll', [[('vshift', (v,))] for v in range(64)], loop=True)
+        levels = [round(LEAK_WADE_DEPTH + LEAK_WADE_SWELL*math.sin(2.0*math.pi*i/LEAK_WADE_PERIOD)) for i in range(LEAK_WADE_PERIOD)]
+        self.anim.load('leak_wade', [[('leak', (v,))] if i == 0 or v != levels[i-1] else [] for i, v in enumerate(levels)], loop=True)
         # Initialise map to our bitwise pattern per:
         # https://github.com/algofoogle/raybox-zero/blob/main/src/rtl/map_rom.v
         self.map_data = [0] * (self.map_cols * self.map_rows)
@@ -275,28 +343,32 @@ class RBZMap:
         self.generate_map_surface()
 
     # Make the environment appear to "flash":
-    def env_flash(self, start=False):
-        if FLIPPED:
-            sky = self.raybox.set_floor
-            floor = self.raybox.set_sky
-        else:
-            sky = self.raybox.set_sky
-            floor = self.raybox.set_floor
+    def env_flash(self):
+        self.anim.load('flash', self.flash_program())
+        self.anim.play('flash')
+
+    # The flash as a register animation: sky and floor step through FLASH_STEPS (ending on
+    # their final colours) and, if FLASH_DELTA is set, each texadd# is offset from its own
+    # base by the step's multiple of FLASH_DELTA:
+    def flash_program(self):
+        sky, floor = ('floor', 'sky') if FLIPPED else ('sky', 'floor')
         count = len(RBZMap.FLASH_STEPS)
-        if start:
-            self.flash_step = count
-        elif self.flash_step > 0:
-            self.flash_step -= 1
-        if self.flash_step > 2:
-            sky(RBZMap.FLASH_STEPS[count-self.flash_step][0])
-        if self.flash_step > 0:
-            flash_step = RBZMap.FLASH_STEPS[count-self.flash_step]
-            floor(flash_step[0])
-            self.raybox.call_peripheral_method('reg', 'texadd', 0, self.texadd0+flash_step[1]*FLASH_DELTA)
-            self.raybox.call_peripheral_method('reg', 'texadd', 1, self.texadd0+flash_step[1]*FLASH_DELTA)
-            self.raybox.call_peripheral_method('reg', 'texadd', 2, self.texadd0+flash_step[1]*FLASH_DELTA)
-            self.raybox.call_peripheral_method('reg', 'texadd', 3, self.texadd0+flash_step[1]*FLASH_DELTA)
-        return self.flash_step
+        steps = []
+        for n, (color, mul) in enumerate(RBZMap.FLASH_STEPS):
+            step = [(sky, (color,))] if n < count-2 else []
+            step.append((floor, (color,)))
+            if FLASH_DELTA != 0:
+                step += [('texadd', (i, (getattr(self, f'texadd{i}') + mul*FLASH_DELTA) & 0xFFFFFF)) for i in range(4)]
+            steps.append(step)
+        return steps
+
+    # Start or stop a looped register animation. When stopped, `register` goes back to the
+    # value we have for it:
+    def toggle_animation(self, name, register):
+        playing = self.anim.toggle(name)
+        if not playing:
+            self.queue_reg(register, getattr(self, register))
+        return playing
 
     # Look up the colour we should render in the map preview, based on wall type:
     def cell_color_lut(self, color: int):
@@ -316,30 +388,31 @@ class RBZMap:
     # - vinf
     # - gen_tex
     # - texadd0..3
-    # which automatically update their respective register values in our raybox peripheral:
+    # which automatically update their respective register values in our raybox peripheral
+    # (via queue_reg(), except gen_tex which goes out immediately):
     def __setattr__(self, name, value):
         if name in ['sky_color', 'floor_color', 'leak', 'vshift', 'other_x', 'other_y']:
             value %= 64 # Range is 0..63.
             self.__dict__[name] = value
             if name in ['other_x', 'other_y']:
                 # print(f'other x/y:{self.other_x},{self.other_y}')
-                self.raybox.call_peripheral_method('reg', 'other', self.other_x, self.other_y)
+                self.queue_reg('other', self.other_x, self.other_y)
             else:
-                self.raybox.call_peripheral_method('reg', name.split('_')[0], value)
+                self.queue_reg(name.split('_')[0], value)
         elif name in ['texadd0', 'texadd1', 'texadd2', 'texadd3']:
             value &= 0xFFFFFF # 24-bit address range.
             self.__dict__[name] = value
-            self.raybox.call_peripheral_method('reg', 'texadd', int(name.split('texadd')[1]), value)
+            self.queue_reg('texadd', int(name.split('texadd')[1]), value)
         elif name in ['mapdx', 'mapdy', 'mapdxw', 'mapdyw']:
             self.__dict__[name] = value
             # if name in ['mapdx', 'mapdy']:
             #     # Dividing wall coordinate:
             # else:
             #     # Dividing wall ID:
-            self.raybox.call_peripheral_method('reg', 'mapd', self.mapdx, self.mapdy, self.mapdxw, self.mapdyw)
+            self.queue_reg('mapd', self.mapdx, self.mapdy, self.mapdxw, self.mapdyw)
         elif name == 'vinf':
             v = self.__dict__[name] = not not value
-            self.raybox.call_peripheral_method('reg', name.split('_')[0], v)
+            self.queue_reg(name.split('_')[0], v)
         elif name == 'gen_tex':
             v = self.__dict__[name] = not not value
             self.raybox.set_gen_tex(v)
@@ -350,6 +423,19 @@ class RBZMap:
         else:
             super().__setattr__(name, value)
 
+    # Register writes are coalesced (only the latest value of each register is kept) until the
+    # next flush_registers(), which the game loop does every `rate.reg_every` ticks:
+    def queue_reg(self, name, *args):
+        key = (name, args[0]) if name == 'texadd' else (name,)
+        self.pending_regs.pop(key, None)
+        self.pending_regs[key] = args
+
+    def flush_registers(self):
+        pending = self.pending_regs
+        self.__dict__['pending_regs'] = {}
+        for key, args in pending.items():
+            self.raybox.call_peripheral_method('reg', key[0], *args)
+
     # Reset the map preview:
     def reset(self):
         self.screen_scale = RBZ_MAP_SCALE
@@ -484,11 +570,13 @@ class Player(Actor):
     def vplane_mag(self):
         return 0.5*self.vplane_scaler
     
-    def current_view_vectors(self):
-        sina, cosa = math.sin(self.a), math.cos(self.a)
+    # View vectors for the current POV, or for a given (x, y, a) instead (e.g. a predicted POV):
+    def current_view_vectors(self, pov=None):
+        x, y, a = (self.x, self.y, self.a) if pov is None else pov
+        sina, cosa = math.sin(a), math.cos(a)
         fm, vm = self.facing_mag(), self.vplane_mag()
         return [
-            self.x, self.y,
+            x, y,
             sina * fm, cosa * fm,
             -cosa * vm, sina * vm
         ]
@@ -584,8 +672,8 @@ class Player(Actor):
     # Get the player vectors (or one of them) in fixed-point formats that
     # match the requirements of the raybox-zero "Vectors" SPI interface,
     # optionally as strings of binary digits instead of integers:
-    def fixed(self, k: str = None, binary: bool = False):
-        px, py, fx, fy, vx, vy = self.current_view_vectors()
+    def fixed(self, k: str = None, binary: bool = False, pov=None):
+        px, py, fx, fy, vx, vy = self.current_view_vectors(pov)
         m = {
             'player_x': px,
             'player_y': py,
@@ -690,6 +778,39 @@ class Player(Actor):
         return (tx, ty)
 
 
+# Latency compensation: tracks the player's velocity (position and angle) from tick to
+# tick, and extrapolates the POV to when it will be displayed, i.e. after the measured link
+# latency (serial round trip and device exec) plus DISPLAY_DELAY. The lead time is capped
+# at PREDICT_MAX, and the extrapolated move goes through Player.try_move() so it can't
+# overshoot into (or through) walls:
+class Predictor:
+    def __init__(self):
+        self.last = None # (x, y, a, t) at the previous tick.
+        self.vx = self.vy = self.va = 0.0 # Smoothed velocity, in map units (or radians) per second.
+        self.lead = 0.0
+
+    def update(self, player: Player, t: float):
+        if self.last is not None and t > self.last[3]:
+            lx, ly, la, lt = self.last
+            dt = t - lt
+            da = (player.a - la + math.pi) % (2.0*math.pi) - math.pi # Shortest way around.
+            k = PREDICT_SMOOTHING
+            if math.hypot(player.x-lx, player.y-ly) > 1.0:
+                # Teleported (e.g. reset), so don't extrapolate that:
+                self.vx = self.vy = self.va = 0.0
+            else:
+                self.vx += ((player.x-lx)/dt - self.vx)*k
+                self.vy += ((player.y-ly)/dt - self.vy)*k
+                self.va += (da/dt - self.va)*k
+        self.last = (player.x, player.y, player.a, t)
+
+    # Predicted (x, y, a) POV, given the current link latency (seconds):
+    def predict(self, player: Player, latency: float, clip_map: RBZMap):
+        self.lead = min(latency + DISPLAY_DELAY, PREDICT_MAX)
+        x, y = player.try_move(self.vx*self.lead, self.vy*self.lead, clip_map)
+        return (x, y, player.a + self.va*self.lead)
+
+
 misses = 0 # [] # Keeps track of updates where we missed our timing target.
 
 # Create the player:
@@ -697,6 +818,31 @@ player = Player(11.5, 10.5)
 
 # Create the environment:
 game_map = RBZMap(raybox)
+if WALL_SETS:
+    print(f"Wall set: {WALL_SETS.select(game_map)}")
+
+predictor = Predictor()
+
+# Flythrough benchmark: send each POV of the camera script as soon as the last one is done
+# (i.e. for a fan-out, once the slowest device has it), then report and quit:
+if BENCH_FILE:
+    povs = load_script(BENCH_FILE)
+    print(f"Bench: {BENCH_FILE} ({len(povs)} updates) on {' '.join(args.device)}")
+    bench = BenchStats()
+    drain = getattr(raybox, 'drain', None)
+    for x, y, a, facing in povs:
+        if any(event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE) for event in pygame.event.get()):
+            print("Bench aborted")
+            break
+        player.x, player.y, player.a, player.facing_scaler = x, y, a, facing
+        sent = time.perf_counter()
+        with profiler.span('bench_update'), raybox.batch():
+            raybox.set_raw_pov(''.join(player.fixed(binary=True)))
+            game_map.flush_registers()
+        if drain: drain()
+        bench.add(sent, time.perf_counter())
+    print(bench.report())
+    sys.exit(0)
 
 # Direction keys: QWEASD, hence W=1, A=3, S=4, D=5
 dir_keys    = [False] * 6
@@ -720,6 +866,12 @@ other_y_tracking = 0
 mapdx_tracking = 0
 mapdy_tracking = 0
 
+# Mouse-wheel adjustments to RBZMap register properties, accumulated per property between
+# register flushes, then applied once each (see below):
+wheel_deltas = {}
+def wheel(name, d):
+    wheel_deltas[name] = wheel_deltas.get(name, 0) + d
+
 while running:
 
     mouse_delta = pygame.mouse.get_rel()
@@ -729,75 +881,97 @@ while running:
     delta = now-timer   # Time since last tick was registered.
 
 
-    if delta >= TICK:
+    tick = int(rate.tick*1e9) # Current tick, in nanoseconds.
+    if delta >= tick:
         # The way I've designed this currently, it will attempt to send rendering update control data
-        # to Raybox every `TICK` nanoseconds.
+        # to Raybox every `tick` nanoseconds.
         
         # OK, hit our scheduled target:
         # At the least, our target has elapsed... probably a little more.
         hit_counter += 1                            # Increment hit counter.
         if delta > max_delta: max_delta = delta     # Used for finding max_delta.
         sum_deltas += delta                         # Used for calculating average.
-        ticks = int(delta/TICK)
+        ticks = int(delta/tick)
         if ticks > 1: misses += 1 # misses.append(hit_counter)
         tick_counter += ticks                       # Count of what would be WHOLE ticks since start.
-        timer += int(delta/TICK)*TICK               # Update timer to refer to what WOULD'VE been the start of this tick.
+        timer += int(delta/tick)*tick               # Update timer to refer to what WOULD'VE been the start of this tick.
 
         # Get vectors as fixed-point hex values:
-        vectors = player.fixed(binary=True)
-
-        raybox.set_raw_pov(''.join(vectors))
-        game_map.env_flash()
+        with profiler.span('pov_encode'):
+            if PREDICT:
+                predictor.update(player, now/1e9)
+                vectors = player.fixed(binary=True, pov=predictor.predict(player, raybox.latency(), game_map))
+            else:
+                vectors = player.fixed(binary=True)
+
+        # This tick's POV and register updates all go out in one batch:
+        with profiler.span('tick_update'), raybox.batch():
+            with profiler.span('set_raw_pov'):
+                raybox.set_raw_pov(''.join(vectors))
+            with profiler.span('animate'):
+                game_map.anim.tick()
+            if rate.reg_due():
+                for name, d in wheel_deltas.items():
+                    setattr(game_map, name, getattr(game_map, name) + d)
+                wheel_deltas.clear()
+                game_map.flush_registers()
         player.zoom_pulse()
 
-        # Render our preview window:
-        screen.fill((40,80,120))
-        game_map.draw(screen)
-        player.render(game_map, screen)
-        screen.blit(info_text, (0,0))
-        # Draw WASD keys overlay:
-        for n in range(6):
-            if True: #n != 0 and n!= 2:
-                pygame.draw.rect(
-                    screen,
-                    (0,255,0),
-                    pygame.Rect( 20+(n%3)*32, 20+(n//3)*32, 30, 30),
-                    0 if dir_keys[n] else 1, 4
-                )
-        # Display other data:
-        # Vectors (decimal floating-point):
-        px, py, fx, fy, vx, vy = player.current_view_vectors()
-        text = font.render(
-            f"player({px:15.6f}, {py:15.6f})  "+
-            f"facing({fx:11.6f}, {fy:11.6f})  "+
-            f"vplane({vx:11.6f}, {vy:11.6f})", True, (255,255,255))
-        rect = text.get_rect()
-        rect.bottomright = (SCREEN_W, SCREEN_H-rect.height)
-        screen.blit(text, rect)
+        # Render our preview window (unless we're skipping the HUD this tick to keep up):
+        hud_time = None
+        if rate.hud_due():
+            hud_start = time.perf_counter_ns()
+            screen.fill((40,80,120))
+            game_map.draw(screen)
+            player.render(game_map, screen)
+            screen.blit(info_text, (0,0))
+            # Draw WASD keys overlay:
+            for n in range(6):
+                if True: #n != 0 and n!= 2:
+                    pygame.draw.rect(
+                        screen,
+                        (0,255,0),
+                        pygame.Rect( 20+(n%3)*32, 20+(n//3)*32, 30, 30),
+                        0 if dir_keys[n] else 1, 4
+                    )
+            # Display other data:
+            # Vectors (decimal floating-point):
+            px, py, fx, fy, vx, vy = player.current_view_vectors()
+            text = font.render(
+                f"player({px:15.6f}, {py:15.6f})  "+
+                f"facing({fx:11.6f}, {fy:11.6f})  "+
+                f"vplane({vx:11.6f}, {vy:11.6f})", True, (255,255,255))
+            rect = text.get_rect()
+            rect.bottomright = (SCREEN_W, SCREEN_H-rect.height)
+            screen.blit(text, rect)
         
-        # Vectors (hex fixed-point):
-        text = font.render(
-            f"player({vectors[0]}, {vectors[1]})  "+
-            f"facing({vectors[2]}, {vectors[3]})  "+
-            f"vplane({vectors[4]}, {vectors[5]})", True, (255,255,255))
-        rect = text.get_rect()
-        rect.bottomright = (SCREEN_W, SCREEN_H)
-        screen.blit(text, rect)
-
-        # Calculate FPS:
-        if frame_count >= 10:
-            time_delta = float(pygame.time.get_ticks()-last_fps_time)/1000.0
-            fps = 10.0 / time_delta
-            fps_text = font.render( f"FPS: {fps:6.1f}", True, (255,255,255) )
-            frame_count = 0
-        if fps_text is not None:
-            rect = fps_text.get_rect()
-            rect.topright = (SCREEN_W, 0)
-            screen.blit(fps_text,rect)
-        pygame.display.flip()
-        if frame_count == 0:
-            last_fps_time = pygame.time.get_ticks() # In ms.
-        frame_count += 1
+            # Vectors (hex fixed-point):
+            text = font.render(
+                f"player({vectors[0]}, {vectors[1]})  "+
+                f"facing({vectors[2]}, {vectors[3]})  "+
+                f"vplane({vectors[4]}, {vectors[5]})", True, (255,255,255))
+            rect = text.get_rect()
+            rect.bottomright = (SCREEN_W, SCREEN_H)
+            screen.blit(text, rect)
+
+            # Calculate FPS:
+            if frame_count >= 10:
+                time_delta = float(pygame.time.get_ticks()-last_fps_time)/1000.0
+                fps = 10.0 / time_delta
+                fps_text = font.render( f"FPS: {fps:6.1f}", True, (255,255,255) )
+                frame_count = 0
+            if fps_text is not None:
+                rect = fps_text.get_rect()
+                rect.topright = (SCREEN_W, 0)
+                screen.blit(fps_text,rect)
+            profiler.record('hud_render', 'game', hud_start, time.perf_counter_ns())
+            with profiler.span('flip'):
+                pygame.display.flip()
+            if frame_count == 0:
+                last_fps_time = pygame.time.get_ticks() # In ms.
+            frame_count += 1
+            hud_time = (time.perf_counter_ns() - hud_start)/1e9
+        rate.update(raybox.latency(), hud_time)
 
         if DEBUG:
             print(
@@ -809,6 +983,7 @@ while running:
         sum_loops += loop_counter
         loop_counter = 0  # Reset loop counter.
 
+    input_start = time.perf_counter_ns()
     mods = pygame.key.get_mods()
     shift_key   = mods & pygame.KMOD_SHIFT
     alt_key     = mods & pygame.KMOD_ALT
@@ -835,7 +1010,7 @@ while running:
             running = False
         elif event.type == pygame.MOUSEBUTTONDOWN:
             if event.button == 1 and not pause:
-                game_map.env_flash(True)
+                game_map.env_flash()
                 player.zoom_pulse(True)
         elif event.type == pygame.MOUSEWHEEL:
             texadd_mult = 1
@@ -851,39 +1026,33 @@ while running:
             if keys[pygame.K_1]:
                 # Change sky colour:
                 adjust_fov = False
-                if FLIPPED:
-                    game_map.floor_color += event.y * add_speed * mult
-                else:
-                    game_map.sky_color += event.y * add_speed * mult
+                wheel('floor_color' if FLIPPED else 'sky_color', event.y * add_speed * mult)
             if keys[pygame.K_2]:
                 # Change floor colour:
                 adjust_fov = False
-                if FLIPPED:
-                    game_map.sky_color += event.y * add_speed * mult
-                else:
-                    game_map.floor_color += event.y * add_speed * mult
+                wheel('sky_color' if FLIPPED else 'floor_color', event.y * add_speed * mult)
             if keys[pygame.K_3]:
                 # Change leak:
                 adjust_fov = False
-                game_map.leak += event.y * add_speed * mult
+                wheel('leak', event.y * add_speed * mult)
             if keys[pygame.K_4]:
                 # Change texture VSHIFT:
                 adjust_fov = False
-                game_map.vshift += event.y * add_speed * mult
+                wheel('vshift', event.y * add_speed * mult)
             
             # Handle each CMD_TEXADD#:
             if keys[pygame.K_6] or keys[pygame.K_0]:
                 adjust_fov = False
-                game_map.texadd3 += event.y * texadd_mult
+                wheel('texadd3', event.y * texadd_mult)
             if keys[pygame.K_7] or keys[pygame.K_0]:
                 adjust_fov = False
-                game_map.texadd0 += event.y * texadd_mult
+                wheel('texadd0', event.y * texadd_mult)
             if keys[pygame.K_8] or keys[pygame.K_0]:
                 adjust_fov = False
-                game_map.texadd1 += event.y * texadd_mult
+                wheel('texadd1', event.y * texadd_mult)
             if keys[pygame.K_9] or keys[pygame.K_0]:
                 adjust_fov = False
-                game_map.texadd2 += event.y * texadd_mult
+                wheel('texadd2', event.y * texadd_mult)
 
             if adjust_fov:
                 player.facing_scaler *= 1.0 + event.y * zoom_speed * mult
@@ -910,12 +1079,18 @@ while running:
                 print("Reset game state")
                 player.reset()
                 game_map.reset()
+            elif event.key == pygame.K_v:
+                print(f"vshift scrolling: {'ON' if game_map.toggle_animation('vshift_scroll', 'vshift') else 'OFF'}")
+            elif event.key == pygame.K_l:
+                print(f"Leak wading: {'ON' if game_map.toggle_animation('leak_wade', 'leak') else 'OFF'}")
             elif event.key == pygame.K_i:
                 game_map.vinf = not game_map.vinf
                 print(f"VINF: {game_map.vinf}")
             elif event.key == pygame.K_t:
                 game_map.gen_tex = not game_map.gen_tex
                 print(f"Texture source: {"Internally generated" if game_map.gen_tex else "External SPI"}")
+            elif event.key == pygame.K_n and WALL_SETS:
+                print(f"Wall set: {WALL_SETS.select(game_map, -1 if event.mod & pygame.KMOD_SHIFT else 1)}")
             elif event.key == pygame.K_BACKQUOTE:
                 r = raybox.toggle_debug()
                 print(f"Turning Vectors DEBUG signal {'ON' if r else 'OFF'}")
@@ -930,6 +1105,8 @@ while running:
                 elif event.key == pygame.K_KP_3: game_map.floor_color+= 1 # Increment floor colour.
                 elif event.key == pygame.K_KP_1: game_map.floor_color-= 1 # Decrement floor colour.
 
+    profiler.record('input', 'game', input_start, time.perf_counter_ns())
+
     # Update game state based on inputs and time elapsed:
     this_time = pygame.time.get_ticks()
     delta_time = this_time - last_time
@@ -950,7 +1127,8 @@ while running:
         mouse_move = mouse_delta[0] if not ROTATE_MOUSE else mouse_delta[1]
 
     if not pause:
-        player.recalc_vectors(dir_keys, delta_time, mouse_move, shift_key, alt_key, game_map)
+        with profiler.span('physics'):
+            player.recalc_vectors(dir_keys, delta_time, mouse_move, shift_key, alt_key, game_map)
 
 
 
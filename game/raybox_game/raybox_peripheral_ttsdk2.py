@@ -2,7 +2,7 @@
 # to enable a host to communicate with raybox-zero running on the ASIC.
 # See raybox-controller.py for the host PC side that sends us commands.
 import time
-from machine import Pin, SoftSPI
+from machine import Pin, SoftSPI, Timer
 
 # Raybox-Zero SPI interface, can talk to either of RBZ's SPI peripherals:
 # - "vectors" (POV) and "registers" (REG)
@@ -11,6 +11,7 @@ class RBZSPI:
     def __init__(self, tt, interface):
         self.tt = tt
         self.debug = False
+        self.busy = False # True while sending a payload (so ANIM doesn't cut in mid-transaction).
         self.interface = interface
         if interface == 'pov':
             self.align_right = False # When payload is padded to bytes, it is left-aligned.
@@ -75,6 +76,13 @@ class RBZSPI:
 
 
     def send_payload(self, data, count=None, debug=False):
+        self.busy = True
+        try:
+            self._send_payload(data, count, debug)
+        finally:
+            self.busy = False
+
+    def _send_payload(self, data, count=None, debug=False):
         if self.debug or debug: start_time = time.ticks_us()
         self.txn_start()
         if type(data) is bytearray or type(data) is bytes:
@@ -149,6 +157,7 @@ class REG(RBZSPI):
     CMD_TEXADD1= 8;  LEN_TEXADD1= 24
     CMD_TEXADD2= 9;  LEN_TEXADD2= 24
     CMD_TEXADD3=10;  LEN_TEXADD3= 24
+    CMD_POV    =11;  LEN_POV    = 74 # Only if the design has USE_POV_VIA_SPI_REGS; see probe_pov_via_reg()
 
     def __init__(self):         super().__init__(tt, 'reg')
 
@@ -172,8 +181,100 @@ class REG(RBZSPI):
             (self.CMD_TEXADD0+index,4),
             (addend, self.LEN_TEXADD0)
         ])
+    # Same 74-bit POV as POV.set_raw_pov(), but via CMD_POV on this interface:
+    def pov        (self, pov):   self.send_payload([ (self.CMD_POV,      4), (pov,   self.LEN_POV     ) ])
+
+    # Two POVs for probe_pov_via_reg(), checked with the model (see model/rbzero.py):
+    # - Looking down a long corridor: about 88% of visible pixels are sky/floor.
+    # - Right up against the east border wall: every line is all wall.
+    PROBE_POV_FAR  = '00010111101101000011001110100000111110110111101000000000011000000011111011'
+    PROBE_POV_NEAR = '01111011000000000010110000000001000000000000000000000000000000000100000000'
+
+    # Capability probe: Does this design accept POV via CMD_POV on this interface?
+    # SPI is write-only, so this sets sky and floor to the same colour, sends each of the
+    # two probe POVs via CMD_POV, and samples uo_out after each. If CMD_POV works, the most
+    # common (i.e. sky/floor) output value in the 'far' view all but disappears in the 'near'
+    # view. Otherwise both views are the same (whatever the POV interface last set).
+    # Sky and floor are left at their reset values afterwards.
+    def probe_pov_via_reg(self, samples=2000, threshold=0.25):
+        self.sky(0b11_00_11)
+        self.floor(0b11_00_11)
+        counts = []
+        for pov in (self.PROBE_POV_FAR, self.PROBE_POV_NEAR):
+            self.pov(pov)
+            time.sleep_ms(50) # Wait for a few frames, so it's definitely live.
+            counts.append([int(self.tt.uo_out.value) for _ in range(samples)])
+        far, near = counts
+        mode = max(set(far), key=far.count)
+        self.sky(0b01_01_01)
+        self.floor(0b10_10_10)
+        return (far.count(mode) - near.count(mode)) / samples > threshold
+
+
+
+# Register animations, played back here one step per frame so that timed effects
+# (e.g. the environment flash, vshift scrolling, leak wading) don't need a stream of
+# register writes from the host: the host uploads each one once with load(), then
+# triggers it with play(). Each step is a list of REG calls as (method, args) tuples,
+# e.g. [ [('sky',(63,)), ('floor',(63,))], [('sky',(47,))], [], ... ]
+# Steps are locked to the falling edge of vsync_n (uo_out[3], as per the Tiny VGA PMOD
+# pinout), or fall back to a 60Hz timer if that pin can't raise an IRQ.
+class ANIM:
+    VSYNC_PIN = 'pin_uo_out3'
+
+    def __init__(self, reg):
+        self.reg = reg
+        self.programs = {}  # name => (steps, loop), with steps as bound REG methods.
+        self.playing = {}   # name => index of next step.
+        self.frames = 0     # Frames seen.
+        self.deferred = 0   # Frames where a step was held over because reg was busy.
+        pin = getattr(tt.pins, self.VSYNC_PIN)
+        pin = getattr(pin, 'raw_pin', pin)
+        try:
+            pin.irq(handler=self.frame, trigger=Pin.IRQ_FALLING)
+            self.source = 'vsync'
+        except Exception:
+            self.timer = Timer(freq=60, mode=Timer.PERIODIC, callback=self.frame)
+            self.source = 'timer'
+
+    def __repr__(self): return f'ANIM({self.source}, programs={list(self.programs)}, playing={self.playing})'
+
+    def load(self, name, steps, loop=False):
+        self.playing.pop(name, None)
+        self.programs[name] = ([[(getattr(self.reg, m), a) for m, a in step] for step in steps], loop)
+
+    def play(self, name):
+        self.playing[name] = 0 # (Re)start from the first step.
+
+    def stop(self, name=None):
+        if name is None:
+            self.playing.clear()
+        else:
+            self.playing.pop(name, None)
+
+    def frame(self, _):
+        self.frames += 1
+        if not self.playing:
+            return
+        if self.reg.busy:
+            # The host's commands are mid-transaction on this SPI bus; do this step next frame:
+            self.deferred += 1
+            return
+        for name in list(self.playing):
+            steps, loop = self.programs[name]
+            i = self.playing[name]
+            for method, args in steps[i]:
+                method(*args)
+            i += 1
+            if i < len(steps):
+                self.playing[name] = i
+            elif loop:
+                self.playing[name] = 0
+            else:
+                del self.playing[name]
 
 
 
 pov = POV()
 reg = REG()
+anim = ANIM(reg)
@@ -0,0 +1,104 @@
+# raybox_profiler.py
+#
+# Lightweight span profiler for raybox_game and raybox_controller.
+#
+# Spans are recorded as (name, category, start, duration) tuples into a fixed-size
+# in-memory ring buffer, so the cost per span is just two perf_counter_ns() calls
+# and a deque append. This means it can be left enabled all the time: only the most
+# recent TRACE_RING_SIZE spans are kept, and nothing is written until save() is called.
+#
+# save() writes the spans in Chrome Trace Event format (JSON), which can be opened
+# directly in https://ui.perfetto.dev or chrome://tracing to see where each tick's
+# time budget goes.
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# Max. number of spans kept in the ring buffer. Each span is a small tuple, so 200k
+# is only a few tens of MB even in the worst case, and covers many seconds of play:
+TRACE_RING_SIZE = 200_000
+
+
+# A single timed span. Use via SpanProfiler.span() as a context manager:
+class Span:
+    __slots__ = ('profiler', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, profiler, name, cat, args):
+        self.profiler = profiler
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.cat, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+# Records spans into a ring buffer, and writes them out as a Chrome trace:
+class SpanProfiler:
+    def __init__(self, size=TRACE_RING_SIZE):
+        self.origin = time.perf_counter_ns()
+        self.spans = deque(maxlen=size)
+        self.dropped = 0 # Count of spans that fell off the end of the ring buffer.
+        self.enabled = True
+
+    def span(self, name, cat='game', args=None):
+        return Span(self, name, cat, args)
+
+    def record(self, name, cat, start, stop, args=None):
+        if len(self.spans) == self.spans.maxlen:
+            self.dropped += 1
+        self.spans.append((name, cat, start, stop-start, threading.get_ident(), args))
+
+    # Convert the ring buffer contents to a list of Chrome Trace Event dicts.
+    # Timestamps and durations are in microseconds, per the format spec.
+    def events(self):
+        pid = os.getpid()
+        events = [
+            { 'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': { 'name': 'raybox_game' } },
+        ]
+        for tid in {s[4] for s in self.spans}:
+            name = 'main' if tid == threading.main_thread().ident else f'thread-{tid}'
+            events.append({ 'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': { 'name': name } })
+        for name, cat, start, dur, tid, args in self.spans:
+            e = {
+                'name': name,
+                'cat':  cat,
+                'ph':   'X', # "Complete" event, i.e. has both ts and dur.
+                'ts':   (start-self.origin)/1000.0,
+                'dur':  dur/1000.0,
+                'pid':  pid,
+                'tid':  tid,
+            }
+            if args is not None:
+                e['args'] = args
+            events.append(e)
+        return events
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({ 'traceEvents': self.events(), 'displayTimeUnit': 'ms' }, f)
+        print(f"Wrote {len(self.spans)} trace span(s) to {path} ({self.dropped} older span(s) dropped)")
+
+
+# Stand-in used when profiling is disabled, so callers don't need to check:
+class NullProfiler:
+    enabled = False
+    _null_span = nullcontext()
+
+    def span(self, name, cat='game', args=None):
+        return self._null_span
+
+    def record(self, name, cat, start, stop, args=None):
+        pass
+
+    def save(self, path):
+        pass
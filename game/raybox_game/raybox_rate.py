@@ -0,0 +1,100 @@
+# raybox_rate.py
+#
+# Adaptive update rate for raybox_game: instead of a fixed TICK, this continuously
+# measures how long each update takes to go out over the link (and how long the HUD
+# takes to redraw), and picks:
+# - tick:       Time between POV updates. As fast as the link sustains (with HEADROOM to
+#               spare), up to 2 updates per 60Hz frame (MIN_TICK).
+# - hud_every:  Redraw the HUD only every Nth tick, if redrawing every tick would cost
+#               more than HUD_SLACK of the link's own pace.
+# - reg_every:  Flush coalesced register writes only every Nth tick, when the link (not
+#               MIN_TICK) is what's limiting the rate.
+# Backing off (when updates get slower) is fast; speeding up again is gradual.
+#
+# The settled values are saved per device (or set of devices) in PROFILE_FILE on exit,
+# so the next run starts at about the right rate rather than having to find it again.
+# With fixed_tick, the tick is fixed and the HUD and registers go out every tick.
+
+import json
+
+MIN_TICK        = 1.0/120.0 # Fastest tick: 2 updates per 60Hz frame.
+MAX_TICK        = 0.1       # Slowest tick, no matter how bad the link is.
+DEFAULT_TICK    = 0.008     # Starting tick when there's no saved profile.
+HEADROOM        = 1.25      # Tick is kept this much longer than the time each update takes.
+HUD_SLACK       = 1.25      # HUD may slow ticks by up to this much before being skipped.
+HUD_MAX_EVERY   = 8         # Redraw the HUD at least every this many ticks.
+REG_EVERY_BUSY  = 2         # Ticks between register flushes while the link is the bottleneck.
+SMOOTHING       = 0.1       # EWMA weight of each new measurement.
+BACKOFF         = 1.5       # Max. factor the tick can grow by in one update.
+SPEEDUP         = 0.05      # Fraction of the way the tick moves towards a faster target per update.
+PROFILE_FILE    = 'raybox_rate_profiles.json'
+
+
+class RateController:
+    def __init__(self, key, path=PROFILE_FILE, fixed_tick=None):
+        self.key = key
+        self.path = path
+        self.fixed_tick = fixed_tick
+        profile = self.load().get(key, {})
+        self.tick = min(max(profile.get('tick', DEFAULT_TICK), MIN_TICK), MAX_TICK)
+        self.rtt = profile.get('rtt', 0.0)
+        self.hud = profile.get('hud', 0.0)
+        self.hud_every = 1
+        self.reg_every = 1
+        self.ticks = 0
+        self._retune()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        if self.fixed_tick is not None:
+            return
+        profiles = self.load()
+        profiles[self.key] = { 'tick': self.tick, 'rtt': self.rtt, 'hud': self.hud }
+        with open(self.path, 'w') as f:
+            json.dump(profiles, f, indent=2)
+        print(f"Saved update rate profile for {self.key!r}: {self.summary()}")
+
+    # Feed in the latest measurements, in seconds: `rtt` is the time for an update to go out
+    # (e.g. raybox.latency()) and `hud` is the time the last HUD redraw took (if one was done):
+    def update(self, rtt, hud=None):
+        self.ticks += 1
+        self.rtt += (rtt - self.rtt)*SMOOTHING
+        if hud is not None:
+            self.hud += (hud - self.hud)*SMOOTHING
+        self._retune()
+
+    def _retune(self):
+        if self.fixed_tick is not None:
+            self.tick = self.fixed_tick
+            return
+        link_bound = self.rtt*HEADROOM > MIN_TICK
+        # Smallest HUD interval whose (amortized) cost keeps the tick within HUD_SLACK of
+        # what the link (or MIN_TICK) allows on its own:
+        budget = max(self.rtt*HEADROOM, MIN_TICK)*HUD_SLACK
+        self.hud_every = 1
+        while self.hud_every < HUD_MAX_EVERY and (self.rtt + self.hud/self.hud_every)*HEADROOM > budget:
+            self.hud_every += 1
+        target = min(max((self.rtt + self.hud/self.hud_every)*HEADROOM, MIN_TICK), MAX_TICK)
+        if target > self.tick:
+            self.tick = min(target, self.tick*BACKOFF)
+        else:
+            self.tick += (target - self.tick)*SPEEDUP
+        self.reg_every = REG_EVERY_BUSY if link_bound else 1
+
+    def hud_due(self):
+        return self.ticks % self.hud_every == 0
+
+    def reg_due(self):
+        return self.ticks % self.reg_every == 0
+
+    def summary(self):
+        return (
+            f"tick {self.tick*1000.0:.2f}ms ({1.0/self.tick:.0f} updates/s), rtt {self.rtt*1000.0:.2f}ms, "
+            f"HUD {self.hud*1000.0:.2f}ms every {self.hud_every} tick(s), registers every {self.reg_every} tick(s)"
+        )
@@ -0,0 +1,39 @@
+# raybox_wallsets.py
+#
+# Wall sets for raybox_game (--walls MANIFEST): named sets of wall textures, packed into one
+# texture ROM by utils/texpack.py, which writes a JSON manifest of each set's texadd0..3
+# values. Switching to a set is then just one texadd register write per wall slot, with no
+# address arithmetic:
+#   {
+#     "rom":  "walls.bin",
+#     "sets": [ { "name": "tt07", "texadd": [0, 0, 0, 0], ... }, ... ]
+#   }
+# A set with fewer than 4 texadd values leaves the other slots as they are.
+#
+# Example:
+#   python3 ../../utils/texpack.py walls.bin tt07=../../assets/tt07-wall-textures.bin wolf=wolf.bin:0,14,84,106
+#   python3 raybox_game.py ttsdk2 --walls walls.json
+
+import json
+import os
+
+class WallSets:
+    def __init__(self, path):
+        with open(path) as f:
+            manifest = json.load(f)
+        self.rom = manifest.get('rom')
+        self.sets = [(s['name'], s['texadd']) for s in manifest['sets']]
+        if not self.sets:
+            raise ValueError(f"No wall sets in {path}")
+        self.index = 0
+        print(f"Wall sets from {os.path.basename(path)} (ROM: {self.rom}): {', '.join(name for name, _ in self.sets)}")
+
+    # Select the set `step` places on from the current one (wrapping around), or the current
+    # one again with step=0, and write its texadd# values to `game_map` (an RBZMap, which
+    # queues each as a register write). Returns the set's name:
+    def select(self, game_map, step=0):
+        self.index = (self.index + step) % len(self.sets)
+        name, texadd = self.sets[self.index]
+        for i, value in enumerate(texadd):
+            setattr(game_map, f'texadd{i}', value)
+        return name
@@ -0,0 +1,85 @@
+# fixed_point.py
+#
+# Helpers for modelling raybox-zero's fixed-point maths in Python/NumPy,
+# following the conventions of src/rtl/fixed_point_params.v and src/rtl/pov.v.
+#
+# Values are handled as their raw two's complement integer bit patterns, i.e. an
+# SQm.n `F value with raw integer r represents r * 2**-n. Everything here works on
+# both plain Python ints and NumPy int64 arrays.
+
+# Defaults, per fixed_point_params.v (and sim_main.cpp):
+QM = 11
+QN = 11
+
+
+def mask(bits):
+    return (1 << bits) - 1
+
+# Truncate to the lower `bits` bits, i.e. an unsigned Verilog vector of that width:
+def wrap(v, bits):
+    return v & mask(bits)
+
+# Reinterpret the lower `bits` bits as a two's complement signed value:
+def signed(v, bits):
+    half = 1 << (bits-1)
+    return ((v + half) & mask(bits)) - half
+
+# Extract the `F part out of a double-width `F2 product (i.e. `FF(f) in Verilog),
+# as an unsigned bit pattern:
+def FF(f2, qm=QM, qn=QN):
+    return (f2 >> qn) & mask(qm+qn)
+
+def to_real(v, qn=QN):
+    return v * 2.0**-qn
+
+def from_real(r, qm=QM, qn=QN):
+    # Same as `realF() followed by $rtoi(), i.e. truncation towards zero:
+    return signed(int(r * 2.0**qn), qm+qn)
+
+
+# --- POV vectors ---
+#
+# The host sends POV as 74 bits: playerX/Y as UQ6.9 (15b each), then facingX/Y and
+# vplaneX/Y as SQ2.9 (11b each). pov.v (or spi_registers.v) then extends these to `F.
+
+POV_FORMATS = ['UQ6.9', 'UQ6.9', 'SQ2.9', 'SQ2.9', 'SQ2.9', 'SQ2.9']
+POV_BITS    = { 'UQ6.9': 15, 'SQ2.9': 11 }
+
+# Same as Player.float_to_fixed() in raybox_game.py:
+def float_to_fixed(f, q):
+    return int(f * (2.0**9.0)) & mask(POV_BITS[q])
+
+# Quantize POV floats (e.g. from Player.current_view_vectors()) to the 6 raw values we'd send:
+def pov_fixed(px, py, fx, fy, vx, vy):
+    return tuple(float_to_fixed(v, q) for v, q in zip((px, py, fx, fy, vx, vy), POV_FORMATS))
+
+# Split a 74-character binary string (as passed to set_raw_pov()) into its 6 raw values:
+def pov_from_bits(bits):
+    if len(bits) != 74:
+        raise ValueError(f"POV must be 74 bits, but got {len(bits)}")
+    out = []
+    i = 0
+    for q in POV_FORMATS:
+        n = POV_BITS[q]
+        out.append(int(bits[i:i+n], 2))
+        i += n
+    return tuple(out)
+
+def pov_to_bits(pov):
+    return ''.join(f'{v:0{POV_BITS[q]}b}' for v, q in zip(pov, POV_FORMATS))
+
+# Extend the 6 raw POV values to `F (signed raw ints), exactly as pov.v does:
+# playerX/Y are zero-padded UQ6.9, and facing/vplane are sign-extended SQ2.9.
+def pov_to_F(pov, qm=QM, qn=QN):
+    if qn < 9 or qm < 6:
+        raise ValueError(f"Q{qm}.{qn} can't hold the UQ6.9/SQ2.9 POV vectors")
+    shift = qn-9
+    out = []
+    for v, q in zip(pov, POV_FORMATS):
+        if q == 'SQ2.9':
+            v = signed(v, 11)
+        out.append(v << shift)
+    return tuple(out)
+
+# This is the reset POV in pov.v, handy as a known-good default:
+POV_RESET = (11.5, 10.5, 0.720137, -0.693832, 0.346916, 0.360069)
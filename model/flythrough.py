@@ -0,0 +1,149 @@
+# flythrough.py
+#
+# Batch-renders every frame of a camera path through the rbzero.py model, using a
+# pool of worker processes, and streams the frames to disk in order.
+#
+# A camera path is a text file where each line is one of:
+#   key X Y ANGLE [FRAMES]      Keyframe: Player position and angle (in degrees, same sense as
+#                               Player.a in raybox_game.py). FRAMES (default 30) are rendered
+#                               from this key, interpolating towards the next one. The last
+#                               key is rendered as a single frame.
+#   pov PX PY FX FY VX VY       One frame with the given POV vectors, as per current_view_vectors().
+#   bits BBBB...                One frame with the given 74-bit raw POV, as sent by set_raw_pov().
+#   reg NAME=VALUE [...]        Set registers (see rbzero.Registers) from the next key or frame on.
+#                               Frames between two keys all use the first key's registers.
+# Blank lines and anything after '#' are ignored.
+#
+# Each worker memory-maps the texture ROM image (read-only), so they all share the
+# one copy of it, and the map is generated by map_rom.py. Workers also do the PNG
+# encoding, so only finished file data comes back to the main process.
+#
+# Examples:
+#   python3 flythrough.py path.txt -o frames/ --tex ../assets/tt07-wall-textures.bin
+#   python3 flythrough.py path.txt -f rgb24 -o - | ffmpeg -f rawvideo -pix_fmt rgb24 -s 640x480 -r 60 -i - out.mp4
+
+import argparse
+import io
+import math
+import os
+import sys
+import time
+from multiprocessing import Pool
+import png
+from fixed_point import pov_fixed, pov_from_bits
+from rbzero import Registers, TextureROM, render_frame, to_rgb888, V_VIEW, H_VIEW
+
+DEFAULT_KEY_FRAMES = 30
+
+
+# POV floats for a Player at (x,y) with angle `a` (radians), same as Player.current_view_vectors():
+def pov_from_angle(x, y, a, facing_mag=1.0, vplane_mag=0.5):
+    sina, cosa = math.sin(a), math.cos(a)
+    return (x, y, sina*facing_mag, cosa*facing_mag, -cosa*vplane_mag, sina*vplane_mag)
+
+# Parse a camera path file into a list of (raw POV, register dict) per frame:
+def load_path(path):
+    frames = []
+    regs = {}
+    keys = [] # Pending keyframes: (x, y, angle, frames, regs)
+
+    def flush_keys():
+        for i, (x, y, a, n, r) in enumerate(keys):
+            if i+1 == len(keys):
+                frames.append((pov_fixed(*pov_from_angle(x, y, a)), r))
+                break
+            nx, ny, na, _, _ = keys[i+1]
+            # Turn whichever way is shortest:
+            da = (na - a + math.pi) % (2*math.pi) - math.pi
+            for k in range(n):
+                t = k / n
+                frames.append((pov_fixed(*pov_from_angle(x+(nx-x)*t, y+(ny-y)*t, a+da*t)), r))
+        keys.clear()
+
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            words = line.split('#', 1)[0].split()
+            if not words:
+                continue
+            cmd, params = words[0], words[1:]
+            try:
+                if cmd == 'key':
+                    n = int(params[3]) if len(params) > 3 else DEFAULT_KEY_FRAMES
+                    keys.append((float(params[0]), float(params[1]), math.radians(float(params[2])), n, dict(regs)))
+                elif cmd == 'pov':
+                    flush_keys()
+                    frames.append((pov_fixed(*map(float, params)), dict(regs)))
+                elif cmd == 'bits':
+                    flush_keys()
+                    frames.append((pov_from_bits(params[0]), dict(regs)))
+                elif cmd == 'reg':
+                    for p in params:
+                        name, value = p.split('=', 1)
+                        regs[name] = int(value, 0)
+                    Registers(**regs) # Validate names.
+                else:
+                    raise ValueError(f"Unknown command: {cmd}")
+            except (ValueError, IndexError, TypeError) as e:
+                raise ValueError(f"{path}:{lineno}: {e}")
+    flush_keys()
+    return frames
+
+
+# Per-worker state, set up once by init_worker():
+_tex = None
+_opts = None
+
+def init_worker(tex_path, opts):
+    global _tex, _opts
+    _tex = TextureROM(tex_path) if tex_path else None
+    _opts = opts
+
+# Render one frame and return its encoded file data:
+def render_job(job):
+    pov, regs = job
+    frame = render_frame(pov, Registers(**regs), _tex, _opts['map_overlay'], _opts['debug_overlay'])
+    if _opts['format'] == 'raw':
+        return frame.tobytes()
+    rgb = to_rgb888(frame)
+    if _opts['format'] == 'rgb24':
+        return rgb.tobytes()
+    out = io.BytesIO()
+    png.from_array(rgb.reshape(V_VIEW, H_VIEW*3), 'RGB').write(out)
+    return out.getvalue()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batch-render a camera path through the raybox-zero model, in parallel.')
+    parser.add_argument('path', help='Camera path file (see top of flythrough.py for the format)')
+    parser.add_argument('-o', '--output', required=True, help='Output directory for PNGs, or file for raw/rgb24 frames (- for stdout)')
+    parser.add_argument('-f', '--format', default='png', choices=['png', 'raw', 'rgb24'], help='png: one file per frame; raw: RGB222 bytes (BBGGRR), rgb24: RGB888, concatenated')
+    parser.add_argument('--tex', type=str, help='Texture SPI ROM image (.bin) to read textures from; otherwise generated textures are used')
+    parser.add_argument('-m', '--map-overlay', action='store_true', help='Show the map overlay (i_debug_m)')
+    parser.add_argument('-d', '--debug-overlay', action='store_true', help='Show the view vectors debug overlay (i_debug_v)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes (default: all CPUs)')
+    parser.add_argument('--chunk', type=int, default=4, help='Frames handed to a worker at a time')
+    args = parser.parse_args()
+
+    frames = load_path(args.path)
+    opts = dict(format=args.format, map_overlay=args.map_overlay, debug_overlay=args.debug_overlay)
+    log = sys.stderr if args.output == '-' else sys.stdout
+    if args.format == 'png':
+        os.makedirs(args.output, exist_ok=True)
+        out = None
+    else:
+        out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+
+    print(f"Rendering {len(frames)} frame(s) with {args.jobs} process(es)...", file=log)
+    start = time.perf_counter()
+    with Pool(args.jobs, init_worker, (args.tex, opts)) as pool:
+        # imap() yields results in order, while workers keep rendering ahead:
+        for i, data in enumerate(pool.imap(render_job, frames, args.chunk)):
+            if out is None:
+                with open(os.path.join(args.output, f'frame{i:05d}.png'), 'wb') as f:
+                    f.write(data)
+            else:
+                out.write(data)
+    if out is not None and out is not sys.stdout.buffer:
+        out.close()
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {len(frames)} frame(s) in {elapsed:.2f}s ({len(frames)/elapsed:.1f} fps)", file=log)
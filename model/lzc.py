@@ -0,0 +1,30 @@
+# lzc.py
+#
+# Vectorized model of src/rtl/lzc.v, the leading zero counter used by reciprocal.v.
+#
+# lzc.v is hard-coded for one input width, chosen by one of the D17..D30 defines
+# (see fixed_point_params.v), and each of these corresponds to a Qm.n config:
+
+import numpy as np
+
+LZC_CONFIGS = {
+    'D17': (8, 9),      # 17-bit range, e.g. Q8.9
+    'D18': (9, 9),      # 18-bit range, e.g. Q9.9
+    'D19': (9, 10),     # 19-bit range, e.g. Q9.10
+    'D20': (10, 10),    # 20-bit range, e.g. Q10.10
+    'D22': (11, 11),    # 22-bit range, e.g. Q11.11 (default)
+    'D24': (12, 12),    # 24-bit range, e.g. Q12.12
+    'D30': (15, 15),    # 30-bit range, e.g. Q15.15, mostly for testing.
+}
+
+# Same as Python's int.bit_length() but for arrays. frexp()'s exponent is exact
+# for all integers below 2**53, which covers every width that lzc.v supports:
+def bit_length(v):
+    return np.frexp(np.asarray(v).astype(np.float64))[1].astype(np.int64)
+
+# Count leading zeros of each `bits`-wide unsigned value (o_lzc), i.e. `bits` for 0:
+def lzc(data, bits):
+    if bits >= 32:
+        raise ValueError(f"lzc.v's 5-bit o_lzc can't count {bits} bits")
+    data = np.asarray(data, dtype=np.int64) & ((1<<bits)-1)
+    return bits - bit_length(data)
@@ -0,0 +1,34 @@
+# map_rom.py
+#
+# NumPy model of src/rtl/map_rom.v: the bitwise-generated map that raybox-zero traces.
+# Same logic as the map_data generator in RBZMap (raybox_game.py), but vectorized.
+
+import numpy as np
+
+# Returns the 2-bit wall ID (0 means empty) for each of the given map cells:
+def map_rom(col, row, wbits=5, hbits=5):
+    col = np.asarray(col, dtype=np.int64) & ((1<<wbits)-1)
+    row = np.asarray(row, dtype=np.int64) & ((1<<hbits)-1)
+    max_col = (1<<wbits)-1
+    max_row = (1<<hbits)-1
+    c = lambda i: (col >> i) & 1
+    r = lambda i: (row >> i) & 1
+
+    val0 = (
+        (col == 0) | (col == max_col) |     # Left and right borders.
+        (row == 0) | (row == max_row) |     # Top and bottom borders.
+        (((~row & 0b111) == (col & 0b111)) & (r(3) == 0) & (c(3) == 0)) | # Diagonal in top-left corner of map.
+        (
+            ((((r(1) ^ c(2)) ^ (r(0) & c(1))) & r(2) & c(1)) | ((r(0) ^ 1) & (c(0) ^ 1)))
+            & (r(2) ^ c(2) ^ 1)
+        ).astype(bool)
+    )
+    f1, f2, f3, f4 = c(3), c(2), c(1), c(0)
+    a6, b6, c6, d6 = r(3), r(2), r(1), r(0)
+    val1 = (((f3^d6) & (f2^a6) & (f4^b6) & (f1^c6)) == 1) | ((col == 8) & (row == 10))
+    return (val1.astype(np.int64) << 1) | val0.astype(np.int64)
+
+# Full map as a [row][col] array:
+def map_cells(wbits=5, hbits=5):
+    row, col = np.mgrid[0:(1<<hbits), 0:(1<<wbits)]
+    return map_rom(col, row, wbits, hbits)
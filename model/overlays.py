@@ -0,0 +1,66 @@
+# overlays.py
+#
+# Vectorized models of src/rtl/map_overlay.v and src/rtl/debug_overlay.v.
+# Each returns (area, rgb) where `area` is the (vpos, hpos) slices of the screen
+# where the overlay is enabled (i.e. where its in_*_overlay signal is asserted),
+# and `rgb` is the overlay's colour for each pixel within that area.
+
+import numpy as np
+from fixed_point import QM, QN, mask
+from map_rom import map_rom
+
+H_VIEW      = 640
+V_VIEW      = 480
+MAP_SCALE   = 3     # Power of 2 scaling for map overlay, per rbzero.v
+DEBUG_SCALE = 3     # Power of 2 scaling for debug overlay.
+
+
+def _grid(area):
+    vpos, hpos = np.ogrid[area]
+    return hpos.astype(np.int64), vpos.astype(np.int64)
+
+
+# playerX/Y are raw `F values (see fixed_point.pov_to_F()), and the rest are registers:
+def map_overlay(playerX, playerY, otherx=0, othery=0, mapdx=0, mapdy=0, qn=QN, wbits=5, hbits=5):
+    area = (
+        slice(0, min(V_VIEW, (1 << (hbits+MAP_SCALE))+1)),
+        slice(0, min(H_VIEW, (1 << (wbits+MAP_SCALE))+1))
+    )
+    hpos, vpos = _grid(area)
+    in_map_gridline = ((hpos & mask(MAP_SCALE)) == 0) | ((vpos & mask(MAP_SCALE)) == 0)
+    hpos_mapx = (hpos >> MAP_SCALE) & mask(wbits)
+    vpos_mapy = (vpos >> MAP_SCALE) & mask(hbits)
+    in_player_cell = (hpos_mapx == ((playerX >> qn) & mask(wbits))) & (vpos_mapy == ((playerY >> qn) & mask(hbits)))
+    in_other_cell = (hpos_mapx == (otherx & mask(wbits))) & (vpos_mapy == (othery & mask(hbits)))
+    in_mapdx_cell = (hpos_mapx == (mapdx & mask(wbits))) & (mapdx != 0)
+    in_mapdy_cell = (vpos_mapy == (mapdy & mask(hbits))) & (mapdy != 0)
+    in_player_pixel = (
+        in_player_cell &
+        (((playerX >> (qn-MAP_SCALE)) & mask(MAP_SCALE)) == (hpos & mask(MAP_SCALE))) &
+        (((playerY >> (qn-MAP_SCALE)) & mask(MAP_SCALE)) == (vpos & mask(MAP_SCALE)))
+    )
+    map_cell_base_color = np.array([0b00_00_00, 0b11_10_00, 0b11_00_00, 0b11_00_10])[map_rom(hpos_mapx, vpos_mapy, wbits, hbits)]
+    rgb = np.select(
+        [in_player_pixel, in_player_cell, in_map_gridline, in_other_cell, in_mapdx_cell, in_mapdy_cell],
+        [0b00_11_11,      0b00_01_00,     0b01_00_00,      0b00_00_11,    0b00_00_10,    0b00_00_01],
+        map_cell_base_color
+    )
+    return area, rgb
+
+# `vectors` are the 6 raw `F view vectors, as returned by fixed_point.pov_to_F():
+def debug_overlay(vectors, qm=QM, qn=QN):
+    w = qm+qn
+    start = H_VIEW - (1 << DEBUG_SCALE)*w - 1
+    area = (slice(0, (8 << DEBUG_SCALE)+1), slice(max(start, 0), H_VIEW))
+    hpos, v = _grid(area)
+    h = hpos - start
+    in_debug_gridline = ((h & mask(DEBUG_SCALE)) == 0) | ((v & mask(DEBUG_SCALE)) == 0)
+    # Bit of each vector shown at this h; bit index goes out of range (i.e. mask 0) past the last bit:
+    bit = w - (h >> DEBUG_SCALE) - 1
+    vrow = (v >> DEBUG_SCALE) & 0b111
+    c = np.zeros(np.broadcast_shapes(h.shape, v.shape), dtype=np.int64)
+    for row, value in zip([0, 1, 3, 4, 6, 7], vectors):
+        set_bit = (bit >= 0) & ((((value & mask(w)) >> np.maximum(bit, 0)) & 1) == 1)
+        c = np.where(vrow == row, np.where(set_bit, 0b11, 0b01), c)
+    c = np.where(in_debug_gridline, np.where(h == (qm << DEBUG_SCALE), 0b10, 0b00), c)
+    return area, c * 0b01_01_01
@@ -0,0 +1,165 @@
+# precision.py
+#
+# Fixed-point precision explorer: traces a large random set of POVs through the
+# wall_tracer.py model for each candidate Qm.n config, and compares every ray against
+# a float64 version of the same DDA trace, to help choose `Qm and `Qn in
+# fixed_point_params.v (and sim_main.cpp).
+#
+# For each config it reports:
+#   size err:   |size - floor(256/dist)| (i.e. in screen pixels, for half the wall height).
+#   texu err:   Texture 'u' error in texels (wrapping around 0..63), only for rays that
+#               hit the same wall side as the float trace.
+#   miss:       How many rays hit a different map cell/side than the float trace.
+#   sat/ovf:    How many rays had a saturated reciprocal, or a wrapped rayAddend/trackDist.
+# ...and can write a heatmap PNG per config, with one row per POV and one column per
+# traced line, showing where errors occur (brighter is worse; red is a wrong hit).
+#
+# Examples:
+#   python3 precision.py --qm 9-12 --qn 9-12 --povs 2000 -j 4
+#   python3 precision.py --qm 11 --qn 9-11 --heatmaps heatmaps/
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from fixed_point import to_real
+from map_rom import map_rom
+from wall_tracer import trace_frame, V_VIEW, MIN_DIST, MAX_STEPS, MAP_WBITS, MAP_HBITS
+from trace_budget import random_povs
+
+HEATMAP_MAX_ERR = 8.0   # Size error (in pixels) shown at full brightness in heatmaps.
+HEATMAP_ROWS    = 480   # Max. number of POVs shown in each heatmap.
+
+
+# Same DDA trace as trace_frame(), but in float64 with exact reciprocals, from the
+# same (quantized) POVs. Returns (size, texu, side, mapX, mapY) arrays of [POV][line]:
+def trace_float(pov, lines=None):
+    if lines is None:
+        lines = np.arange(V_VIEW)
+    px, py = (to_real(np.asarray(v, dtype=np.int64)[:, None], 9) for v in pov[0:2])
+    fx, fy, vx, vy = (to_real(((np.asarray(v, dtype=np.int64)[:, None] + 1024) & 2047) - 1024, 9) for v in pov[2:6])
+    shape = np.broadcast_shapes(px.shape, lines.shape)
+    rayDirX = np.broadcast_to(fx + vx*(lines-240)/256.0, shape).ravel()
+    rayDirY = np.broadcast_to(fy + vy*(lines-240)/256.0, shape).ravel()
+    playerX = np.broadcast_to(px, shape).ravel()
+    playerY = np.broadcast_to(py, shape).ravel()
+    rxi = rayDirX > 0
+    ryi = rayDirY > 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stepDistX = 1.0 / np.abs(rayDirX)
+        stepDistY = 1.0 / np.abs(rayDirY)
+        fracX = playerX - np.floor(playerX)
+        fracY = playerY - np.floor(playerY)
+        trackDistX = np.nan_to_num(stepDistX * np.where(rxi, 1.0-fracX, fracX), nan=np.inf)
+        trackDistY = np.nan_to_num(stepDistY * np.where(ryi, 1.0-fracY, fracY), nan=np.inf)
+
+    playerMapX = np.floor(playerX).astype(np.int64)
+    playerMapY = np.floor(playerY).astype(np.int64)
+    mapX = playerMapX.copy()
+    mapY = playerMapY.copy()
+    dist = np.zeros(len(mapX))
+    side = np.zeros(len(mapX), dtype=np.int64)
+    active = np.arange(len(mapX))
+    for _ in range(MAX_STEPS+1):
+        if len(active) == 0:
+            break
+        mx, my = mapX[active], mapY[active]
+        valid = (dist[active] >= MIN_DIST) & ~((mx == playerMapX[active]) & (my == playerMapY[active]))
+        hit = valid & (map_rom(mx, my, MAP_WBITS, MAP_HBITS) != 0)
+        a = active[~hit]
+        needStepX = trackDistX[a] < trackDistY[a]
+        sx, sy = a[needStepX], a[~needStepX]
+        mapX[sx] += np.where(rxi[sx], 1, -1)
+        dist[sx] = trackDistX[sx]
+        trackDistX[sx] += stepDistX[sx]
+        side[sx] = 0
+        mapY[sy] += np.where(ryi[sy], 1, -1)
+        dist[sy] = trackDistY[sy]
+        trackDistY[sy] += stepDistY[sy]
+        side[sy] = 1
+        active = a
+
+    # The RTL truncates size (and texu) rather than rounding, so compare against the floor:
+    size = np.floor(np.minimum(256.0 / dist, 2047.0))
+    wallPartial = np.where(side == 1, rayDirX, rayDirY) * dist + np.where(side == 1, playerX, playerY)
+    texu = np.floor((wallPartial - np.floor(wallPartial)) * 64.0).astype(np.int64)
+    texu ^= np.where(np.where(side == 1, ryi, ~rxi), 0b111111, 0)
+    return tuple(v.reshape(shape) for v in (size, texu, side, mapX & 31, mapY & 31))
+
+# Compare one Qm.n config against the float trace, for all POVs.
+# Returns a dict of stats, plus the per-ray size error array (for heatmaps):
+def evaluate(qm, qn, pov, ref):
+    lines = np.arange(V_VIEW)
+    ref_size, ref_texu, ref_side, ref_mapX, ref_mapY = ref
+    t = trace_frame(pov, qm=qm, qn=qn, lines=lines)
+    miss = ~t.done | (t.side != ref_side) | ((t.mapX & 31) != ref_mapX) | ((t.mapY & 31) != ref_mapY)
+    size_err = np.abs(t.size - ref_size)
+    du = np.abs(t.texu - ref_texu)
+    texu_err = np.minimum(du, 64 - du)
+    ok = ~miss
+    stats = {
+        'rays':         size_err.size,
+        'size_mean':    float(size_err[ok].mean()) if ok.any() else 0.0,
+        'size_p99':     float(np.percentile(size_err[ok], 99)) if ok.any() else 0.0,
+        'size_max':     float(size_err[ok].max()) if ok.any() else 0.0,
+        'size_gt1':     int(np.count_nonzero(size_err[ok] > 1.0)),
+        'texu_mean':    float(texu_err[ok].mean()) if ok.any() else 0.0,
+        'texu_gt1':     int(np.count_nonzero(texu_err[ok] > 1)),
+        'miss':         int(np.count_nonzero(miss)),
+        'sat':          int(np.count_nonzero(t.sat)),
+        'ovf':          int(np.count_nonzero(t.ovf)),
+    }
+    return stats, np.where(miss, -1.0, size_err)
+
+def evaluate_job(job):
+    qm, qn, pov, ref = job
+    return (qm, qn) + evaluate(qm, qn, pov, ref)
+
+# Heatmap of per-ray size error as an RGB888 array: rows are POVs, columns are lines:
+def heatmap(err):
+    err = err[:HEATMAP_ROWS]
+    level = (np.clip(err, 0.0, HEATMAP_MAX_ERR) / HEATMAP_MAX_ERR * 255.0).astype(np.uint8)
+    rgb = np.stack([level, level, level], axis=-1)
+    rgb[err < 0] = (255, 0, 0)
+    return rgb
+
+def parse_range(s):
+    lo, _, hi = s.partition('-')
+    return range(int(lo), int(hi or lo)+1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare wall_tracer precision across Qm.n configs, against a float64 trace.')
+    parser.add_argument('--qm', type=parse_range, default=parse_range('9-12'), help='Qm value or range, e.g. 9-12 (default)')
+    parser.add_argument('--qn', type=parse_range, default=parse_range('9-12'), help='Qn value or range, e.g. 9-12 (default)')
+    parser.add_argument('--povs', type=int, default=1000, help='Number of random POVs (each traces 480 rays)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for POVs')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--heatmaps', type=str, metavar='DIR', help='Write a size error heatmap PNG per config to this directory')
+    args = parser.parse_args()
+
+    configs = [(qm, qn) for qm in args.qm for qn in args.qn if qn >= 9 and qm >= 6 and qm+qn < 32]
+    pov = random_povs(args.povs, args.seed)
+    ref = trace_float(pov)
+
+    print(f"{args.povs} POVs, {args.povs*V_VIEW} rays per config")
+    print(f"{'Config':<7} {'size mean':>9} {'p99':>6} {'max':>7} {'>1px':>7} {'texu mean':>9} {'>1':>7} {'miss':>7} {'sat':>7} {'ovf':>7}")
+    if args.heatmaps:
+        import png
+        os.makedirs(args.heatmaps, exist_ok=True)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.jobs) as pool:
+        for qm, qn, s, err in pool.map(evaluate_job, [(qm, qn, pov, ref) for qm, qn in configs]):
+            pct = lambda k: f"{s[k]*100.0/s['rays']:6.2f}%"
+            print(
+                f"{f'Q{qm}.{qn}':<7} {s['size_mean']:>9.3f} {s['size_p99']:>6.1f} {s['size_max']:>7.1f} {pct('size_gt1')} "
+                f"{s['texu_mean']:>9.3f} {pct('texu_gt1')} {pct('miss')} {pct('sat')} {pct('ovf')}"
+            )
+            if args.heatmaps:
+                rgb = heatmap(err)
+                path = os.path.join(args.heatmaps, f'Q{qm}.{qn}.png')
+                png.from_array(rgb.reshape(len(rgb), -1), 'RGB').save(path)
+    elapsed = time.perf_counter() - start
+    print(f"{len(configs)} config(s), {len(configs)*args.povs*V_VIEW/elapsed/1e6:.2f}M rays/s")
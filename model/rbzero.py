@@ -0,0 +1,159 @@
+# rbzero.py
+#
+# Full-frame compositor: a vectorized model of what src/rtl/rbzero.v outputs for every
+# visible pixel of a frame, given a POV and the spi_registers values.
+#
+# Frames are returned as 480x640 NumPy uint8 arrays (indexed as [vpos][hpos]) of 6-bit
+# RGB222 values in the chip's BBGGRR bit order. As with the real display, the screen is
+# meant to be rotated, so each VGA line (row of the array) is one rendered column.
+#
+# This assumes every line's trace finishes before the texture SPI read for it starts
+# (hpos 600 of the previous line), as it normally should.
+#
+# Example (render the reset POV using textures from a ROM image, and save it as a PNG):
+#   python3 rbzero.py --tex ../assets/tt07-wall-textures.bin -o frame.png
+# ...or with generated textures, both overlays, and some registers set:
+#   python3 rbzero.py --map-overlay --debug-overlay --reg vshift=10 --reg leak=5 -o frame.png
+
+import argparse
+import time
+import numpy as np
+from fixed_point import QM, QN, mask, pov_fixed, pov_from_bits, pov_to_F, POV_RESET
+from wall_tracer import trace_frame, V_VIEW, H_VIEW, HALF_SIZE
+from row_render import row_hit, GEN_TEX_LUT
+from overlays import map_overlay, debug_overlay
+
+TEXELS = 64 # Bytes (texels) read from texture SPI memory per wall slice.
+
+
+# Register values as per spi_registers.v (names match its outputs); defaults are its reset values:
+class Registers:
+    DEFAULTS = {
+        'sky': 0b01_01_01, 'floor': 0b10_10_10,
+        'leak': 0, 'otherx': 0, 'othery': 0, 'vshift': 0, 'vinf': 0, 'leakfixed': 0,
+        'mapdx': 0, 'mapdy': 0, 'mapdxw': 0, 'mapdyw': 0,
+        'texadd0': 0, 'texadd1': 0, 'texadd2': 0, 'texadd3': 0,
+    }
+
+    def __init__(self, **kwargs):
+        for name in kwargs:
+            if name not in self.DEFAULTS:
+                raise ValueError(f"Unknown register: {name}")
+        self.__dict__.update(self.DEFAULTS)
+        self.__dict__.update(kwargs)
+
+    @property
+    def texadd(self):
+        return [self.texadd0, self.texadd1, self.texadd2, self.texadd3]
+
+
+# Texture SPI flash ROM image (e.g. as made by texy.py). This is memory-mapped read-only,
+# so multiple processes rendering from the same image share the one copy of it:
+class TextureROM:
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+
+    # Read TEXELS bytes from each given 24-bit start address. Beyond the end of the
+    # image is treated as erased (0xFF) flash, and the address wraps at 24 bits:
+    def read(self, addresses):
+        addr = (np.asarray(addresses, dtype=np.int64)[:, None] + np.arange(TEXELS)) & 0xFFFFFF
+        return np.where(addr < len(self.data), self.data[np.minimum(addr, len(self.data)-1)], 0xFF).astype(np.uint8)
+
+# Decode 2xbgr (XBGRXBGR) bytes, as loaded into tex_[rgb][01], to the chip's BBGGRR:
+def decode_2xbgr(b):
+    b = np.asarray(b, dtype=np.uint8)
+    r = ((b & 0b0000_0001) << 1) | ((b >> 4) & 1)
+    g = ((b & 0b0000_0010) << 0) | ((b >> 5) & 1)
+    b_ = ((b & 0b0000_0100) >> 1) | ((b >> 6) & 1)
+    return ((b_ << 4) | (g << 2) | r).astype(np.uint8)
+
+DECODE_2XBGR_LUT = decode_2xbgr(np.arange(256))
+
+# Expand BBGGRR to RGB888 (uint8 [...,3]), e.g. for saving as a PNG:
+def to_rgb888(frame):
+    frame = np.asarray(frame)
+    return np.stack([(frame >> s) & 0b11 for s in (0, 2, 4)], axis=-1).astype(np.uint8) * 85
+
+
+# SPI texture start address for each line's wall slice, as per rbzero.v:
+def texture_addresses(wall, side, texu, texadd):
+    shifted_wall_id = (wall - 1) & 0b11
+    base = (shifted_wall_id << 13) | (side << 12) | (texu << 6)
+    return (base + np.asarray(texadd, dtype=np.int64)[shifted_wall_id]) & 0xFFFFFF
+
+# Render one whole frame. If `tex` (a TextureROM) is None, generated textures are used,
+# same as i_gen_tex=1. map_overlay/debug_overlay are the i_debug_m/i_debug_v inputs:
+def render_frame(pov, regs=None, tex=None, map_overlay_en=False, debug_overlay_en=False, qm=QM, qn=QN, trace=None):
+    if regs is None:
+        regs = Registers()
+    w = qm+qn
+    wmask = mask(w)
+    vectors = pov_to_F(pov, qm, qn)
+    if trace is None:
+        trace = trace_frame(
+            pov, regs.otherx, regs.othery, regs.mapdx, regs.mapdy, regs.mapdxw, regs.mapdyw,
+            qm=qm, qn=qn
+        )
+
+    # texV is reset at hmax, then accumulates texa per pixel:
+    hpos = np.arange(H_VIEW, dtype=np.int64)[None, :]
+    texV = (hpos * trace.texa[:, None]) & wmask
+    texVVorg = (texV + trace.texVinit[:, None]) & wmask
+    texVV = (texVVorg + (regs.vshift << (qn+3))) & wmask
+    texv = (texVV >> (qn+3)) & 0b111111
+    texvorg = (texVVorg >> (qn+3)) & 0b111111
+
+    wall_en = row_hit(trace.size[:, None], hpos, texv, texvorg, regs.leak, regs.vinf, regs.leakfixed)
+    rows = np.arange(V_VIEW)[:, None]
+    if tex is None:
+        wall_rgb = GEN_TEX_LUT[trace.wall[:, None], trace.side[:, None], trace.texu[:, None], texv]
+    else:
+        slices = DECODE_2XBGR_LUT[tex.read(texture_addresses(trace.wall, trace.side, trace.texu, regs.texadd))]
+        wall_rgb = slices[rows, texv]
+
+    bg = np.where(hpos < HALF_SIZE, regs.floor, regs.sky)
+    frame = np.where(wall_en, wall_rgb, bg).astype(np.uint8)
+    if map_overlay_en:
+        area, rgb = map_overlay(vectors[0], vectors[1], regs.otherx, regs.othery, regs.mapdx, regs.mapdy, qn)
+        frame[area] = rgb
+    # Debug overlay is higher priority in vga_mux, so it goes on top:
+    if debug_overlay_en:
+        area, rgb = debug_overlay(vectors, qm, qn)
+        frame[area] = rgb
+    return frame
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render full raybox-zero frames as the chip would output them.')
+    parser.add_argument('--pov', type=float, nargs=6, metavar=('PX','PY','FX','FY','VX','VY'), default=POV_RESET, help='POV vectors (floats), as per Player.current_view_vectors()')
+    parser.add_argument('--pov-bits', type=str, help='POV as a 74-bit binary string (as sent by set_raw_pov); overrides --pov')
+    parser.add_argument('--reg', action='append', default=[], metavar='NAME=VALUE', help=f'Set a register (repeatable); one of: {", ".join(Registers.DEFAULTS)}')
+    parser.add_argument('--tex', type=str, help='Texture SPI ROM image (.bin) to read textures from; otherwise generated textures are used')
+    parser.add_argument('-m', '--map-overlay', action='store_true', help='Show the map overlay (i_debug_m)')
+    parser.add_argument('-d', '--debug-overlay', action='store_true', help='Show the view vectors debug overlay (i_debug_v)')
+    parser.add_argument('--qm', type=int, default=QM, help='Fixed-point integer bits (Qm)')
+    parser.add_argument('--qn', type=int, default=QN, help='Fixed-point fractional bits (Qn)')
+    parser.add_argument('-o', '--output', type=str, help='Save the frame as a PNG (if the name ends in .png), otherwise as raw RGB222 bytes')
+    parser.add_argument('-b', '--bench', type=int, default=0, metavar='N', help='Time N repeated renders and report the achievable frame rate')
+    args = parser.parse_args()
+
+    pov = pov_from_bits(args.pov_bits) if args.pov_bits else pov_fixed(*args.pov)
+    regs = Registers(**{k: int(v, 0) for k, v in (r.split('=', 1) for r in args.reg)})
+    tex = TextureROM(args.tex) if args.tex else None
+    kw = dict(regs=regs, tex=tex, map_overlay_en=args.map_overlay, debug_overlay_en=args.debug_overlay, qm=args.qm, qn=args.qn)
+    frame = render_frame(pov, **kw)
+
+    if args.output:
+        if args.output.lower().endswith('.png'):
+            import png
+            png.from_array(to_rgb888(frame).reshape(V_VIEW, H_VIEW*3), 'RGB').save(args.output)
+        else:
+            frame.tofile(args.output)
+        print(f"Saved {H_VIEW}x{V_VIEW} frame to {args.output}")
+    if args.bench > 0:
+        start = time.perf_counter()
+        for _ in range(args.bench):
+            render_frame(pov, **kw)
+        elapsed = time.perf_counter() - start
+        print(f"{args.bench} frames in {elapsed:.3f}s: {args.bench/elapsed:.1f} fps ({args.bench/elapsed*60:.0f} frames/min)")
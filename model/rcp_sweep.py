@@ -0,0 +1,119 @@
+# rcp_sweep.py
+#
+# Exhaustive sweep of reciprocal.v (via the reciprocal.py model) for each lzc.v
+# config, reporting error versus the true reciprocal over the whole input range.
+#
+# For each config, every raw input value is fed through the model and compared to
+# the exact 1/x (or |1/x| for i_abs), and we report:
+#   sat:        How many inputs set o_sat, and how many of these disagree with whether
+#               the true result actually exceeds the max representable value.
+#   wrapped:    Non-saturated results that are wrong-signed when read as signed `F,
+#               i.e. the top bit is set (which is possible because of how o_sat is derived).
+#   ulp:        Max and mean absolute error, in units of the LSB (2**-n), excluding the above.
+#   rel:        Max relative error, again excluding the above.
+#
+# Example (all configs, as used by wall_tracer; D30 has 2**30 inputs so it takes a while):
+#   python3 rcp_sweep.py
+# ...or just some configs, using 4 processes, and including the signed (i_abs=0) mode:
+#   python3 rcp_sweep.py D20 D22 -j 4 --signed
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from fixed_point import signed
+from lzc import LZC_CONFIGS
+from reciprocal import reciprocal, coeffs
+
+CHUNK_SIZE = 1 << 22 # Inputs per chunk; keeps each chunk's temporary arrays to a few hundred MB.
+
+
+# Sweep inputs range(start, stop, step) and return partial stats, to be combined by merge():
+def sweep_chunk(m, n, i_abs, start, stop, step):
+    w = m+n
+    _, _, nSat = coeffs(m, n)
+    x = np.arange(start, stop, step, dtype=np.int64)
+    o_data, o_sat = reciprocal(x, i_abs, m, n)
+
+    xs = signed(x, w).astype(np.float64)
+    with np.errstate(divide='ignore'):
+        exact = (1 << (2*n)) / xs # True result, in raw (LSB) units.
+    if i_abs:
+        exact = np.abs(exact)
+    # Should saturate if the true result is out of range (including 1/0):
+    expect_sat = ~np.isfinite(exact) | (np.abs(exact) > nSat)
+    out = signed(o_data, w).astype(np.float64)
+    wrapped = ~o_sat & (x != 0) & (np.sign(out) != np.sign(exact))
+    ok = ~o_sat & ~wrapped & ~expect_sat
+    ulp = np.abs(out[ok] - exact[ok])
+    rel = ulp / np.abs(exact[ok])
+
+    stats = {
+        'count':        len(x),
+        'sat':          int(np.count_nonzero(o_sat)),
+        'sat_mismatch': int(np.count_nonzero(o_sat != expect_sat)),
+        'wrapped':      int(np.count_nonzero(wrapped)),
+        'ok':           int(np.count_nonzero(ok)),
+        'ulp_sum':      float(ulp.sum()),
+        'ulp_max':      0.0,
+        'ulp_worst':    None,
+        'rel_max':      0.0,
+        'rel_worst':    None,
+    }
+    if len(ulp):
+        i = int(np.argmax(ulp))
+        stats['ulp_max'], stats['ulp_worst'] = float(ulp[i]), int(x[ok][i])
+        i = int(np.argmax(rel))
+        stats['rel_max'], stats['rel_worst'] = float(rel[i]), int(x[ok][i])
+    return stats
+
+def merge(total, part):
+    if total is None:
+        return part
+    for k in ('count', 'sat', 'sat_mismatch', 'wrapped', 'ok', 'ulp_sum'):
+        total[k] += part[k]
+    for k in ('ulp', 'rel'):
+        if part[k+'_max'] > total[k+'_max']:
+            total[k+'_max'], total[k+'_worst'] = part[k+'_max'], part[k+'_worst']
+    return total
+
+def sweep(m, n, i_abs, step=1, jobs=1):
+    total_range = 1 << (m+n)
+    span = CHUNK_SIZE * step
+    chunks = [(m, n, i_abs, s, min(s+span, total_range), step) for s in range(0, total_range, span)]
+    total = None
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            for part in pool.map(sweep_chunk, *zip(*chunks)):
+                total = merge(total, part)
+    else:
+        for chunk in chunks:
+            total = merge(total, sweep_chunk(*chunk))
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exhaustive error sweep of the reciprocal.v model for each lzc.v config.')
+    parser.add_argument('configs', nargs='*', default=list(LZC_CONFIGS), help=f'Configs to sweep (default: all of {" ".join(LZC_CONFIGS)})')
+    parser.add_argument('--signed', action='store_true', help='Also sweep with i_abs=0 (wall_tracer only uses i_abs=1)')
+    parser.add_argument('--step', type=int, default=1, help='Only test every Nth raw input value, for a quicker (non-exhaustive) sweep')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of worker processes')
+    args = parser.parse_args()
+
+    print(f"{'Config':<12} {'i_abs':>5} {'inputs':>11} {'sat':>10} {'sat!=exp':>8} {'wrapped':>8} {'ulp max':>9} {'ulp mean':>9} {'rel max':>9}  worst (ulp)")
+    for name in args.configs:
+        if name not in LZC_CONFIGS:
+            parser.error(f"Unknown config {name}; must be one of: {' '.join(LZC_CONFIGS)}")
+        m, n = LZC_CONFIGS[name]
+        for i_abs in ([1, 0] if args.signed else [1]):
+            start = time.perf_counter()
+            s = sweep(m, n, i_abs, args.step, args.jobs)
+            elapsed = time.perf_counter() - start
+            mean = s['ulp_sum']/s['ok'] if s['ok'] else 0.0
+            worst = '-' if s['ulp_worst'] is None else f"{s['ulp_worst']:0{(m+n+3)//4}X}"
+            label = f"{name} Q{m}.{n}"
+            print(
+                f"{label:<12} {i_abs:>5} {s['count']:>11} {s['sat']:>10} {s['sat_mismatch']:>8} {s['wrapped']:>8} "
+                f"{s['ulp_max']:>9.1f} {mean:>9.3f} {s['rel_max']:>9.2e}  {worst}"
+                f"  ({s['count']/elapsed/1e6:.1f}M inputs/s)"
+            )
@@ -0,0 +1,71 @@
+# reciprocal.py
+#
+# Vectorized, bit-exact NumPy model of the `reciprocal` module in src/rtl/reciprocal.v.
+#
+# All inputs and outputs are raw SQm.n bit patterns (see fixed_point.py), and every
+# intermediate wire is truncated to the same width as it is in the Verilog. All maths
+# fits in int64 for every config that lzc.v supports (up to D30, i.e. Q15.15).
+#
+# NOTE: As with the Verilog, an i_abs result that is in [2**(m-1), 2**m) doesn't
+# saturate, so it reads as negative if treated as signed. See rcp_sweep.py.
+
+import numpy as np
+from fixed_point import QM, QN, mask, signed
+from lzc import lzc
+
+# reciprocal_fsm.v registers the operand when started, then waits in WS1..WS3 while
+# the combo logic settles, and presents the result (with o_done) in the clock after DONE:
+RCP_FSM_STATES = ['IDLE', 'WS1', 'WS2', 'WS3', 'DONE']
+RCP_FSM_LATENCY = len(RCP_FSM_STATES) # Clocks from i_start until o_done is high.
+
+# Coefficients, as the Verilog's localparams:
+def coeffs(m=QM, n=QN):
+    w = m+n
+    n1466   = int(1.466  * (1<<n)) & mask(w)    # $rtoi() truncates.
+    n10012  = int(1.0012 * (1<<n)) & mask(w)
+    nSat    = mask(w-1)                         # Max positive value.
+    return n1466, n10012, nSat
+
+# Returns (o_data, o_sat) for the given i_data, i.e. 1/x or, if i_abs, |1/x|,
+# saturating at the max positive `F (or its negation, if not i_abs):
+def reciprocal(x, i_abs=False, m=QM, n=QN):
+    w = m+n
+    wmask = mask(w)
+    n1466, n10012, nSat = coeffs(m, n)
+
+    x = np.asarray(x, dtype=np.int64) & wmask
+    sign = (x >> (w-1)) & 1
+    unsigned_data = np.where(sign == 1, (-x) & wmask, x)
+
+    lzc_cnt = lzc(unsigned_data, w)
+
+    # Scale input to [0.5,1):
+    shift = m - lzc_cnt
+    a = np.where(
+        shift >= 0,
+        unsigned_data >> np.maximum(shift, 0),
+        (unsigned_data << np.maximum(-shift, 0)) & wmask
+    )
+    b = (n1466 - a) & wmask
+    c = signed(a, w) * signed(b, w)
+    d = (n10012 - ((c >> n) & wmask)) & wmask
+    e = signed(d, w) * signed(b, w)
+    f = (e >> n) & wmask
+    # Saturate if the upper 2 bits would overflow when multiplied by 4:
+    reci = np.where(((f >> (w-2)) & 0b11) != 0, nSat, (f << 2) & wmask)
+
+    # Rescale by the LZC factor; rescale_lzc is 5 bits, and bit 4 is its sign:
+    rescale_lzc = (m - lzc_cnt) & 0b11111
+    rescale_data = np.where(
+        (rescale_lzc & 0b10000) != 0,
+        reci << ((-rescale_lzc) & 0b11111),
+        reci >> rescale_lzc
+    ) & mask(w*2)
+    o_sat = (rescale_data >> w) != 0
+    sat_data = np.where(o_sat, nSat, rescale_data & wmask)
+    o_data = np.where((sign == 1) & ~np.asarray(i_abs, dtype=bool), (-sat_data) & wmask, sat_data)
+    return o_data, o_sat
+
+# wall_tracer.v always uses i_abs=1:
+def reciprocal_abs(x, m=QM, n=QN):
+    return reciprocal(x, True, m, n)
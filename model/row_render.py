@@ -0,0 +1,70 @@
+# row_render.py
+#
+# Vectorized model of src/rtl/row_render.v: per-pixel wall hit logic, and the
+# bitwise-generated textures (gen_tex_rgb) used when i_gen_tex=1.
+#
+# Colours are 6-bit RGB222 values in the chip's BBGGRR bit order.
+
+import numpy as np
+
+H_VIEW      = 640
+HALF_SIZE   = H_VIEW//2
+
+
+# Is hpos within the wall slice? All args broadcast against each other:
+def row_hit(size, hpos, texv, texvorg, leak=0, vinf=0, leakfix=0):
+    texvcomp = np.where(leakfix, texvorg, texv)
+    seam = ((hpos < HALF_SIZE) & (texvorg == 63)) | ((hpos >= HALF_SIZE) & (texvorg == 0))
+    return (texvcomp >= leak) & (
+        (vinf != 0) | (
+            ~seam & (
+                (size > HALF_SIZE) |
+                ((HALF_SIZE-size <= hpos) & (hpos <= HALF_SIZE+size))
+            )
+        )
+    )
+
+# Generated texture colour for each wall/side/texu/texv. All args broadcast against each other:
+def gen_tex_rgb(wall, side, texu, texv):
+    wall, side, texu, texv = np.broadcast_arrays(*(np.asarray(a, dtype=np.int64) for a in (wall, side, texu, texv)))
+    u = lambda i: (texu >> i) & 1
+    v = lambda i: (texv >> i) & 1
+
+    # Wall 1: Fancy colourful XOR pattern:
+    fancy = (
+        ((u(0)<<5) | (side<<4) | (u(2)<<3) | (side<<2) | (u(4)<<1) | side) ^
+        ((v(0)<<5) | (v(2)<<3) | (v(4)<<1))
+    )
+
+    # Wall 2: Blue bricks:
+    mortar = (((texu & 31) == 6) & (v(3) == 0)) | (((texu & 31) == 24) & (v(3) == 1))
+    v3 = texv & 0b111
+    light = np.select(
+        [mortar, v3 == 0, v3 == 7, v3 == 1],
+        [0b10_10_10, np.where(u(0) == 1, 0b01_01_01, 0b10_10_10), 0b11_01_00, 0b01_00_00],
+        0b11_00_00
+    )
+    dark = np.select(
+        [mortar, v3 == 0, v3 == 7, v3 == 1],
+        [0b01_01_01, np.where(u(0) == 1, 0b00_00_00, 0b01_01_01), 0b11_00_00, 0b00_00_00],
+        0b10_00_00
+    )
+    bricks = np.where(side == 1, light, dark)
+
+    # Wall 3: Purple panels, with borders:
+    u31 = (texu >> 1) & 0b111
+    v31 = (texv >> 1) & 0b111
+    bright = (u31 == 0) | (v31 == 7)
+    shadow = (u31 == 7) | (v31 == 0)
+    panels = np.where(side == 1,
+        np.select([bright, shadow], [0b11_01_11, 0b10_00_10], 0b10_00_11),
+        np.select([bright, shadow], [0b10_00_10, 0b01_00_01], 0b01_00_10)
+    )
+
+    # Wall 0: Red:
+    red = np.where(side == 1, 0b00_00_11, 0b00_00_10)
+
+    return np.select([wall == 1, wall == 2, wall == 3], [fancy, bricks, panels], red)
+
+# Full gen_tex_rgb lookup table, indexed as [wall][side][texu][texv]:
+GEN_TEX_LUT = gen_tex_rgb(*np.meshgrid(np.arange(4), np.arange(2), np.arange(64), np.arange(64), indexing='ij')).astype(np.uint8)
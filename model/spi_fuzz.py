@@ -0,0 +1,191 @@
+# spi_fuzz.py
+#
+# Property-based round-trip fuzzer for the spi_registers.py model: generates random
+# sequences of register commands (random, boundary and single-bit values, optionally
+# with junk bits between the command and its payload), packs them into SPI transactions
+# with a given packer, decodes them with the model, and checks that the registers end up
+# holding exactly what was sent (and nothing else changed). Failing cases are shrunk
+# (fewer commands, simpler values) before being reported.
+#
+# Packers:
+#   reg     One transaction per command, padded as RBZSPI.send_payload() does for the
+#           'reg' interface (align_right, lbits=4). This is what the game uses now.
+#   left    One transaction per command, left-aligned (i.e. padded at the end).
+#   burst   All commands concatenated (each padded as per 'reg') in one /SS-low burst.
+# To try out a new packing scheme, add it to PACKERS and fuzz it.
+#
+# With --peripheral, also checks that the REG command/length table in a host-side
+# peripheral file (e.g. ../game/raybox_game/raybox_peripheral_ttsdk2.py) matches the RTL's.
+#
+# Examples:
+#   python3 spi_fuzz.py --cases 20000
+#   python3 spi_fuzz.py --packer burst --seed 1
+#   python3 spi_fuzz.py --pov --peripheral ../game/raybox_game/raybox_peripheral_ttsdk2.py
+
+import argparse
+import ast
+import random
+import sys
+from fixed_point import mask
+from spi_registers import SPIRegisters, CMD_BITS, commands, encode, pad_to_bytes, buffer_size, to_bits
+
+MAX_SEQUENCE = 6    # Max. commands per case.
+
+
+# Bit string for one case item: (cmd, values, junk) where `junk` is a bit string inserted
+# between the command and its payload:
+def item_bits(item, options):
+    cmd, values, junk = item
+    bits = encode(commands(**options)[cmd].name, *values, **options)
+    return bits[:CMD_BITS] + junk + bits[CMD_BITS:]
+
+def pack_reg(case, options):
+    return [pad_to_bytes(item_bits(item, options)) for item in case]
+
+def pack_left(case, options):
+    return [pad_to_bytes(item_bits(item, options), align_right=False) for item in case]
+
+def pack_burst(case, options):
+    return [b''.join(pack_reg(case, options))]
+
+PACKERS = {'reg': pack_reg, 'left': pack_left, 'burst': pack_burst}
+
+
+def random_value(rng, bits):
+    kind = rng.randrange(4)
+    if kind == 0:
+        return rng.choice([0, mask(bits)])
+    if kind == 1:
+        return 1 << rng.randrange(bits)
+    return rng.getrandbits(bits)
+
+def random_case(rng, options, max_junk):
+    table = commands(**options)
+    case = []
+    for _ in range(rng.randint(1, MAX_SEQUENCE)):
+        c = table[rng.choice(list(table))]
+        values = tuple(random_value(rng, bits) for _, bits in c.fields)
+        junk = ''.join(rng.choice('01') for _ in range(rng.randint(0, max_junk))) if rng.random() < 0.5 else ''
+        case.append((c.cmd, values, junk))
+    return case
+
+# Decode a case with the model, and return (got, expected) pending register dicts:
+def run_case(case, packer, options):
+    spi = SPIRegisters(**options)
+    expected = dict(spi.pending)
+    table = commands(**options)
+    for cmd, values, _ in case:
+        expected.update((name, v) for (name, _), v in zip(table[cmd].fields, values))
+    for txn in packer(case, options):
+        spi.transaction(txn)
+    return spi.pending, expected
+
+def fails(case, packer, options):
+    got, expected = run_case(case, packer, options)
+    return got != expected
+
+# Greedily simplify a failing case: drop commands, drop junk, then zero out values:
+def shrink(case, packer, options):
+    changed = True
+    while changed:
+        changed = False
+        candidates = [case[:i] + case[i+1:] for i in range(len(case))] if len(case) > 1 else []
+        for i, (cmd, values, junk) in enumerate(case):
+            if junk:
+                candidates.append(case[:i] + [(cmd, values, '')] + case[i+1:])
+            for j, v in enumerate(values):
+                if v != 0:
+                    candidates.append(case[:i] + [(cmd, values[:j] + (0,) + values[j+1:], junk)] + case[i+1:])
+        for c in candidates:
+            if fails(c, packer, options):
+                case = c
+                changed = True
+                break
+    return case
+
+# Read the CMD_*/LEN_* constants of class REG from a host-side peripheral file (which is
+# MicroPython, so it's parsed rather than imported):
+def host_table(path):
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    consts = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ClassDef) and node.name == 'REG':
+            for stmt in node.body:
+                if isinstance(stmt, ast.Assign) and isinstance(stmt.value, ast.Constant):
+                    for t in stmt.targets:
+                        if isinstance(t, ast.Name) and t.id[:4] in ('CMD_', 'LEN_'):
+                            consts[t.id] = stmt.value.value
+    return {consts[k]: (k[4:].lower(), consts.get('LEN_' + k[4:])) for k in consts if k.startswith('CMD_')}
+
+# Compare a host table against the RTL's; returns a list of mismatch descriptions:
+def check_host_table(path, options):
+    problems = []
+    table = commands(**options)
+    host = host_table(path)
+    for cmd in sorted(set(table) | set(host)):
+        if cmd not in host:
+            problems.append(f"CMD {cmd} ({table[cmd].name}, {table[cmd].length} bits) is not in the host table")
+        elif cmd not in table:
+            problems.append(f"CMD {cmd} ({host[cmd][0]}) is not supported by the RTL with these options")
+        elif host[cmd][1] != table[cmd].length:
+            problems.append(
+                f"CMD {cmd}: host sends {host[cmd][0]} with {host[cmd][1]} bit(s), but the RTL's {table[cmd].name} "
+                f"expects {table[cmd].length} ({', '.join(f'{n}:{b}' for n, b in table[cmd].fields)})"
+            )
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Round-trip fuzz SPI register payloads through the spi_registers.v model.')
+    parser.add_argument('--cases', type=int, default=5000, help='Number of random cases')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--packer', choices=list(PACKERS), default='reg', help='How commands are packed into SPI transactions')
+    parser.add_argument('--max-junk', type=int, default=None, help='Max. junk bits between command and payload (default: 2x buffer size)')
+    parser.add_argument('--pov', action='store_true', help='Model USE_POV_VIA_SPI_REGS (CMD_POV=11)')
+    parser.add_argument('--no-leak-fixed', action='store_true', help="Model without USE_LEAK_FIXED (CMD 5 is VINF only)")
+    parser.add_argument('--no-div-walls', action='store_true', help='Model NO_DIV_WALLS')
+    parser.add_argument('--no-external-textures', action='store_true', help='Model NO_EXTERNAL_TEXTURES')
+    parser.add_argument('--peripheral', type=str, help='Host peripheral .py file whose REG table should match the RTL')
+    args = parser.parse_args()
+
+    options = dict(
+        leak_fixed=not args.no_leak_fixed, pov=args.pov,
+        div_walls=not args.no_div_walls, external_textures=not args.no_external_textures
+    )
+    max_junk = 2*buffer_size(**options) if args.max_junk is None else args.max_junk
+    packer = PACKERS[args.packer]
+    print(f"Options: {', '.join(f'{k}={v}' for k, v in options.items())}; buffer: {buffer_size(**options)} bits")
+    print(f"Commands: {', '.join(f'{c.cmd}:{c.name}({c.length})' for c in commands(**options).values())}")
+
+    failed = 0
+    if args.peripheral:
+        problems = check_host_table(args.peripheral, options)
+        for p in problems:
+            print(f"HOST TABLE: {p}")
+        failed += len(problems)
+
+    rng = random.Random(args.seed)
+    failures = 0
+    first = None
+    for _ in range(args.cases):
+        case = random_case(rng, options, max_junk)
+        if fails(case, packer, options):
+            failures += 1
+            if first is None:
+                first = case
+    print(f"Packer '{args.packer}': {args.cases-failures}/{args.cases} cases round-tripped")
+    if first is not None:
+        case = shrink(first, packer, options)
+        got, expected = run_case(case, packer, options)
+        print("Smallest failing case found:")
+        table = commands(**options)
+        for cmd, values, junk in case:
+            print(f"  {table[cmd].name}{values}" + (f" with junk {junk}" if junk else ''))
+        for i, txn in enumerate(packer(case, options)):
+            print(f"  Transaction {i}: {to_bits(txn)}")
+        for name in expected:
+            if got[name] != expected[name]:
+                print(f"  {name}: expected {expected[name]}, got {got[name]}")
+    failed += failures
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,177 @@
+# spi_registers.py
+#
+# Bit-level model of src/rtl/spi_registers.v: decodes an SPI bit/byte stream exactly as
+# the chip would, plus an encoder for building payloads the same way RBZSPI.send_payload()
+# in game/raybox_game/raybox_peripheral_ttsdk2.py does.
+#
+# How the RTL decodes a transaction (i.e. while /SS is low):
+#   - The first 4 bits (MSB first) are the command.
+#   - Every bit after that is shifted into spi_buffer (SPI_BUFFER_SIZE bits; older bits fall
+#     off the top). The bit counter stalls once LEN_* bits of payload have arrived, and that
+#     bit AND EVERY BIT AFTER IT loads the low LEN_* bits of spi_buffer into the command's
+#     'in waiting' registers. Hence the last LEN_* bits of the transaction win, which is why
+#     the host can left-pad the payload (align_right with lbits=4) to whole bytes.
+#   - Raising /SS resets the counter and command, but not spi_buffer.
+#   - Commands with no register (e.g. 12..15) use the default length, and load nothing.
+#   - Waiting registers go live on load_new (i.e. at the end of each frame).
+# This assumes SCLK is much slower than the design clock (e.g. 500kHz vs 25MHz), so every
+# SCLK rising edge is seen and each spi_done pulse is handled before the next edge.
+#
+# Example:
+#   from spi_registers import SPIRegisters, encode, pad_to_bytes
+#   spi = SPIRegisters()
+#   spi.transaction(pad_to_bytes(encode('mapd', 10, 12, 1, 2)))
+#   spi.load_new()
+#   print(spi.live['mapdx'], spi.live['mapdyw'])
+
+from fixed_point import mask, pov_fixed, POV_RESET, POV_BITS, POV_FORMATS
+
+CMD_BITS = 4
+
+# Options as per src/config/rbz_options.v (the defines that affect spi_registers.v):
+DEFAULT_OPTIONS = {
+    'leak_fixed':           True,   # USE_LEAK_FIXED: CMD 5 is VOPTS {vinf,leakfixed}, else VINF.
+    'pov':                  False,  # USE_POV_VIA_SPI_REGS: CMD_POV=11 is supported.
+    'div_walls':            True,   # Not NO_DIV_WALLS.
+    'external_textures':    True,   # Not NO_EXTERNAL_TEXTURES.
+}
+
+POV_FIELDS = ['playerX', 'playerY', 'facingX', 'facingY', 'vplaneX', 'vplaneY']
+
+
+# A single command: its number, name, and the registers its payload loads (MSB first):
+class Command:
+    def __init__(self, cmd, name, fields):
+        self.cmd = cmd
+        self.name = name
+        self.fields = fields # List of (register name, bits).
+        self.length = sum(bits for _, bits in fields)
+
+    def __repr__(self):
+        return f'Command({self.cmd}, {self.name!r}, {self.fields!r})'
+
+
+# The command table for a given set of options, as a dict of command number => Command:
+def commands(**options):
+    opts = dict(DEFAULT_OPTIONS, **options)
+    table = [
+        Command(0, 'sky',    [('sky', 6)]),
+        Command(1, 'floor',  [('floor', 6)]),
+        Command(2, 'leak',   [('leak', 6)]),
+        Command(3, 'other',  [('otherx', 6), ('othery', 6)]),
+        Command(4, 'vshift', [('vshift', 6)]),
+        Command(5, 'vopts',  [('vinf', 1), ('leakfixed', 1)]) if opts['leak_fixed'] else Command(5, 'vinf', [('vinf', 1)]),
+    ]
+    if opts['div_walls']:
+        table.append(Command(6, 'mapd', [('mapdx', 6), ('mapdy', 6), ('mapdxw', 2), ('mapdyw', 2)]))
+    if opts['external_textures']:
+        table += [Command(7+i, f'texadd{i}', [(f'texadd{i}', 24)]) for i in range(4)]
+    if opts['pov']:
+        table.append(Command(11, 'pov', [(f, POV_BITS[q]) for f, q in zip(POV_FIELDS, POV_FORMATS)]))
+    return {c.cmd: c for c in table}
+
+# SPI_BUFFER_SIZE, as chosen by the RTL for the given options:
+def buffer_size(**options):
+    opts = dict(DEFAULT_OPTIONS, **options)
+    if opts['pov']:
+        return sum(POV_BITS[q] for q in POV_FORMATS)
+    return 24 if opts['external_textures'] else 16
+
+# Reset values of every register, per the RTL:
+def reset_values(**options):
+    regs = {}
+    for c in commands(**options).values():
+        regs.update({name: 0 for name, _ in c.fields})
+    regs['sky'] = 0b01_01_01
+    regs['floor'] = 0b10_10_10
+    if dict(DEFAULT_OPTIONS, **options)['pov']:
+        regs.update(zip(POV_FIELDS, pov_fixed(*POV_RESET)))
+    return regs
+
+
+# Convert bytes (sent MSB first) or a binary string to a binary string:
+def to_bits(data):
+    if isinstance(data, str):
+        return data
+    return ''.join(f'{b:08b}' for b in data)
+
+# Build the bit string for one command, given its name and a value for each of its
+# fields (in order). Values are truncated to their field widths, like RBZSPI.to_bin():
+def encode(name, *values, **options):
+    cmd = next((c for c in commands(**options).values() if c.name == name), None)
+    if cmd is None:
+        raise ValueError(f"Unknown command: {name}")
+    if len(values) != len(cmd.fields):
+        raise ValueError(f"Command {name} needs {len(cmd.fields)} value(s), got {len(values)}")
+    return f'{cmd.cmd:0{CMD_BITS}b}' + ''.join(f'{v & mask(bits):0{bits}b}' for v, (_, bits) in zip(values, cmd.fields))
+
+# Pad a bit string to whole bytes exactly as RBZSPI.send_payload() does: with align_right,
+# the padding goes after the first `lbits` bits, otherwise it goes at the end:
+def pad_to_bytes(bits, align_right=True, lbits=CMD_BITS):
+    padding = '0' * (-len(bits) % 8)
+    if align_right:
+        if lbits != 0:
+            bits = bits[:lbits] + padding + bits[lbits:]
+    else:
+        bits += padding
+    return int(bits, 2).to_bytes(len(bits)//8, 'big')
+
+
+class SPIRegisters:
+    def __init__(self, **options):
+        self.options = dict(DEFAULT_OPTIONS, **options)
+        self.commands = commands(**options)
+        self.buffer_size = buffer_size(**options)
+        self.reset()
+
+    def reset(self):
+        self.live = reset_values(**self.options)
+        self.pending = dict(self.live) # 'In waiting' buf_* registers.
+        self.buffer = 0
+        self.loads = 0 # Count of spi_done pulses, i.e. buffer loads into pending registers.
+        self._start()
+
+    # /SS going high (inactive) resets the command and counter:
+    def _start(self):
+        self.counter = 0
+        self.cmd = 0
+
+    # Length of the current command's payload, falling back to the default (last) length:
+    def _length(self):
+        c = self.commands.get(self.cmd)
+        return c.length if c else self.commands[5].length
+
+    # One SCLK rising edge while /SS is low:
+    def clock(self, bit):
+        bit = int(bit)
+        if self.counter < CMD_BITS:
+            self.cmd = ((self.cmd << 1) | bit) & mask(CMD_BITS)
+            self.counter += 1
+            return
+        self.buffer = ((self.buffer << 1) | bit) & mask(self.buffer_size)
+        if self.counter == CMD_BITS + self._length() - 1:
+            self._load()
+        else:
+            self.counter += 1
+
+    # spi_done: load the buffer into the waiting registers for the current command:
+    def _load(self):
+        self.loads += 1
+        c = self.commands.get(self.cmd)
+        if c is None:
+            return
+        shift = c.length
+        for name, bits in c.fields:
+            shift -= bits
+            self.pending[name] = (self.buffer >> shift) & mask(bits)
+
+    # A whole transaction (/SS low, clock in all bits, /SS high), from bytes or a bit string:
+    def transaction(self, data):
+        self._start()
+        for bit in to_bits(data):
+            self.clock(bit)
+        self._start()
+
+    # load_new: the waiting registers go live:
+    def load_new(self):
+        self.live.update(self.pending)
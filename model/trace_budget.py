@@ -0,0 +1,163 @@
+# trace_budget.py
+#
+# Counts wall_tracer.v FSM clock cycles for every traced line of a frame, to find
+# viewpoints where tracing overruns the time available per line.
+#
+# The FSM starts each trace at hpos 0 (right after the previous result was presented at
+# hmax) and must reach TraceDone before hmax (hpos 799) to present its result for the
+# next line. If it's late, it misses that hmax, so the previous line's result repeats and
+# every following trace in the frame is displayed one line later (until VSYNC resets it).
+# Also, the texture SPI read for the next line uses the 'hot' results as soon as it
+# starts sending the address (hpos 608), so a trace that finishes after that gets the
+# wrong wall slice texture, even if it makes it in time for hmax.
+#
+# Fixed cycle counts per state come from wall_tracer.v and reciprocal_fsm, and TraceStep
+# takes one cycle per DDA step (plus one for the hit), as counted by wall_tracer.py.
+#
+# Examples:
+#   python3 trace_budget.py --pov 11.5 10.5 0.720137 -0.693832 0.346916 0.360069
+#   python3 trace_budget.py --random 5000 --top 10
+#   python3 trace_budget.py --path path.txt
+
+import argparse
+import math
+import numpy as np
+from fixed_point import QM, QN, pov_fixed, pov_from_bits, pov_to_bits, POV_RESET
+from wall_tracer import trace_frame, V_VIEW, MAX_STEPS
+from reciprocal import RCP_FSM_LATENCY
+from map_rom import map_cells
+
+H_TOTAL         = 800           # Clocks per line, per vga_sync.v.
+V_BACK          = 33            # VBLANK lines after VSYNC (when tracing starts) before line 0.
+TSPI_ADDR_START = 640-40+8      # hpos where the texture SPI starts sending the (hot) address.
+WAITS           = 7             # wall_tracer.v WAITS, for settling the shared multiplier.
+
+# In a state that uses the reciprocal, 1 clock clears rcp_start (while reciprocal_fsm latches
+# the operand), and then the tracer sees o_done the clock after the FSM raises it:
+RCP_CYCLES = RCP_FSM_LATENCY + 1
+
+# Clocks spent in each state, other than TraceStep and TraceDone:
+STATE_CYCLES = {
+    'SDXPrep':      1,
+    'SDYPrep':      RCP_CYCLES,
+    'TracePrepX':   RCP_CYCLES,
+    'TracePrepY':   WAITS + 1,
+    'SizePrep':     1,
+    'CalcTexU':     RCP_CYCLES,
+    'CalcTexVInit': WAITS + 1,
+}
+FIXED_CYCLES = sum(STATE_CYCLES.values())
+
+
+# Clocks from the start of each trace until it reaches TraceDone, i.e. the earliest
+# hpos at which TraceDone could see hmax. Rays that gave up after MAX_STEPS get
+# MAX_STEPS, so they show up as (at least) that bad:
+def trace_cycles(trace):
+    return FIXED_CYCLES + trace.steps + 1
+
+# Simulate the frame's sequence of traces given each one's cycle count ([...][512] for
+# lines -32..479), and return (late, stale_tex) per visible line: `late` is how many
+# lines behind its own trace each visible line is showing (0 is correct), and
+# `stale_tex` is whether that line's texture was fetched before its trace finished.
+def schedule(cycles):
+    cycles = np.asarray(cycles)
+    batch_shape, count = cycles.shape[:-1], cycles.shape[-1]
+    cycles = cycles.reshape(-1, count)
+    povs = np.arange(len(cycles))
+    start = np.zeros(len(cycles), dtype=np.int64) # Line (since VSYNC) each trace starts on.
+    shown_ray = np.full((len(cycles), V_VIEW), -1, dtype=np.int64)
+    stale = np.zeros((len(cycles), V_VIEW), dtype=bool)
+    for ray in range(count):
+        c = cycles[:, ray]
+        present = start + c // H_TOTAL          # Line whose hmax presents this result.
+        shown = present + 1 - V_BACK            # ...so it's shown from this visible line.
+        ok = (shown >= 0) & (shown < V_VIEW)
+        shown_ray[povs[ok], shown[ok]] = ray
+        stale[povs[ok], shown[ok]] = (c[ok] % H_TOTAL) > TSPI_ADDR_START
+        start = present + 1
+    # Lines where no new result was presented keep showing the previous one:
+    shown_ray = np.maximum.accumulate(shown_ray, axis=-1)
+    expected = np.arange(V_VIEW) + V_BACK - 1
+    late = np.where(shown_ray < 0, V_VIEW, expected - shown_ray)
+    return late.reshape(batch_shape + (V_VIEW,)), stale.reshape(batch_shape + (V_VIEW,))
+
+# Analyze POVs given as 6 arrays of raw values, as accepted by trace_frame():
+def analyze(pov, qm=QM, qn=QN, **regs):
+    trace = trace_frame(pov, qm=qm, qn=qn, lines=np.arange(-(V_BACK-1), V_VIEW), **regs)
+    cycles = trace_cycles(trace)
+    late, stale = schedule(cycles)
+    visible = cycles[..., V_BACK-1:] # Traces for lines 0..479.
+    return {
+        'cycles':       cycles,
+        'max_cycles':   cycles.max(axis=-1),
+        'worst_line':   np.argmax(cycles, axis=-1) - (V_BACK-1),
+        'over_tex':     np.count_nonzero(visible > TSPI_ADDR_START, axis=-1),
+        'over_line':    np.count_nonzero(cycles >= H_TOTAL, axis=-1),
+        'late_lines':   np.count_nonzero(late > 0, axis=-1),
+        'stale_tex':    np.count_nonzero(stale, axis=-1),
+        'unfinished':   np.count_nonzero(~trace.done, axis=-1),
+    }
+
+# Random POVs (as 6 arrays of raw values) at random angles, each within an empty map cell:
+def random_povs(count, seed=None):
+    rng = np.random.default_rng(seed)
+    empty = np.argwhere(map_cells() == 0)
+    rows, cols = empty[rng.integers(len(empty), size=count)].T
+    x = cols + rng.uniform(0.0, 1.0, count)
+    y = rows + rng.uniform(0.0, 1.0, count)
+    a = rng.uniform(0.0, 2.0*math.pi, count)
+    povs = [pov_fixed(*v) for v in zip(x, y, np.sin(a), np.cos(a), -np.cos(a)*0.5, np.sin(a)*0.5)]
+    return tuple(np.array(c) for c in zip(*povs))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count wall_tracer FSM cycles per line, and report lines that overrun their budget.')
+    src = parser.add_mutually_exclusive_group()
+    src.add_argument('--pov', type=float, nargs=6, metavar=('PX','PY','FX','FY','VX','VY'), help='A single POV (floats), as per Player.current_view_vectors()')
+    src.add_argument('--pov-bits', type=str, help='A single POV as a 74-bit binary string (as sent by set_raw_pov)')
+    src.add_argument('--path', type=str, help='Analyze every frame of a camera path file (see flythrough.py)')
+    src.add_argument('--random', type=int, metavar='N', help='Analyze N random POVs in empty map cells')
+    parser.add_argument('--seed', type=int, help='Random seed for --random')
+    parser.add_argument('--top', type=int, default=5, help='How many of the worst POVs to list')
+    parser.add_argument('--batch', type=int, default=1000, help='POVs to trace at once')
+    parser.add_argument('--clock', type=float, default=25.0, help='Clock in MHz, for reporting times')
+    parser.add_argument('--qm', type=int, default=QM, help='Fixed-point integer bits (Qm)')
+    parser.add_argument('--qn', type=int, default=QN, help='Fixed-point fractional bits (Qn)')
+    args = parser.parse_args()
+
+    if args.path:
+        from flythrough import load_path
+        povs = [pov for pov, _ in load_path(args.path)]
+        povs = tuple(np.array(c) for c in zip(*povs))
+    elif args.random:
+        povs = random_povs(args.random, args.seed)
+    else:
+        pov = pov_from_bits(args.pov_bits) if args.pov_bits else pov_fixed(*(args.pov or POV_RESET))
+        povs = tuple(np.array([v]) for v in pov)
+
+    count = len(povs[0])
+    results = []
+    for i in range(0, count, args.batch):
+        results.append(analyze(tuple(v[i:i+args.batch] for v in povs), args.qm, args.qn))
+    r = {k: np.concatenate([b[k] for b in results]) for k in results[0]}
+
+    us = lambda c: c / args.clock
+    print(f"Budget per line: {H_TOTAL} clocks ({us(H_TOTAL):.2f} us); texture address needed by hpos {TSPI_ADDR_START}")
+    print(f"Fixed FSM overhead per line: {FIXED_CYCLES} clocks + 1 per TraceStep ({', '.join(f'{k}={v}' for k, v in STATE_CYCLES.items())})")
+    print(f"POVs analyzed: {count}; lines traced per POV: {r['cycles'].shape[-1]}")
+    worst = int(np.argmax(r['max_cycles']))
+    print(f"Worst case: {r['max_cycles'][worst]} clocks ({us(r['max_cycles'][worst]):.2f} us, {r['max_cycles'][worst]*100/H_TOTAL:.1f}% of line) at line {r['worst_line'][worst]}")
+    print(f"Mean of per-POV max: {r['max_cycles'].mean():.1f} clocks")
+    for k, desc in [
+        ('over_tex',   f'had lines finishing after hpos {TSPI_ADDR_START}'),
+        ('over_line',  f'had traces overrunning {H_TOTAL} clocks'),
+        ('late_lines', 'showed lines late'),
+        ('stale_tex',  'showed lines with stale textures'),
+        ('unfinished', f'had rays unfinished after {MAX_STEPS} steps'),
+    ]:
+        print(f"  POVs that {desc}: {np.count_nonzero(r[k])}")
+    print(f"Worst {min(args.top, count)} POV(s):")
+    print(f"  {'#':>6} {'max clk':>7} {'line':>5} {'>tex':>5} {'>line':>5} {'late':>5}  POV bits")
+    for i in np.argsort(-r['max_cycles'], kind='stable')[:args.top]:
+        pov = tuple(int(v[i]) for v in povs)
+        print(f"  {i:>6} {r['max_cycles'][i]:>7} {r['worst_line'][i]:>5} {r['over_tex'][i]:>5} {r['over_line'][i]:>5} {r['late_lines'][i]:>5}  {pov_to_bits(pov)}")
@@ -0,0 +1,223 @@
+# wall_tracer.py
+#
+# Vectorized, bit-exact NumPy model of src/rtl/wall_tracer.v, i.e. a reference
+# raycaster that computes what the chip should show for a given POV.
+#
+# raybox-zero traces one ray per VGA line (the screen is meant to be rotated, so each
+# line appears as a column), and the wall slice for a line is then rendered across
+# hpos. This model traces all 480 visible lines at once, doing the DDA steps in
+# lock-step for every ray that hasn't yet hit a wall.
+#
+# Every `F value is handled as a raw SQm.n integer (see fixed_point.py) using the
+# same widths, truncation and signed/unsigned rules as the Verilog, and the
+# reciprocal is the same approximation as reciprocal.v, so the outputs should match
+# the hardware exactly for any Qm/Qn config.
+#
+# Example (prints a summary of the reset POV, with the default Q11.11 config):
+#   python3 wall_tracer.py
+# Save golden trace data for a given POV (as sent by raybox_game.py) to an .npz:
+#   python3 wall_tracer.py --pov 11.5 10.5 0.72 -0.69 0.35 0.36 -o golden.npz
+
+import argparse
+import time
+import numpy as np
+from fixed_point import QM, QN, mask, wrap, signed, FF, pov_fixed, pov_from_bits, pov_to_F, POV_RESET
+from reciprocal import reciprocal_abs
+from map_rom import map_rom
+
+H_VIEW      = 640           # Visible pixels per line (i.e. wall height axis).
+HALF_SIZE   = H_VIEW//2
+V_VIEW      = 480           # Visible lines, hence one traced ray each.
+MAP_WBITS   = 5             # 32x...
+MAP_HBITS   = 5             # ...32 map, per rbzero.v
+MIN_DIST    = 0.125         # Hits closer than this are ignored.
+MAX_STEPS   = 256           # Give up on any ray that takes more TraceStep iterations than this.
+
+# Trace.sat bits, i.e. which reciprocal results saturated:
+SAT_STEPX   = 1
+SAT_STEPY   = 2
+SAT_SIZE    = 4
+# Trace.ovf bits, i.e. which values wrapped around their `F range:
+OVF_ADDEND  = 1             # rayAddendX/Y.
+OVF_TRACK   = 2             # trackDistX/Y, initially or while stepping.
+
+
+# Tracing results for each visible line, as NumPy arrays, equivalent to the wall_tracer outputs:
+class Trace:
+    def __init__(self, **kwargs):
+        self.wall       = kwargs['wall']        # o_wall: Wall ID that we hit.
+        self.side       = kwargs['side']        # o_side: 0 if we hit an X gridline, 1 for Y.
+        self.size       = kwargs['size']        # o_size: Wall half-size, 11 bits.
+        self.texu       = kwargs['texu']        # o_texu: Texture 'u' coordinate, 0..63.
+        self.texa       = kwargs['texa']        # o_texa: visualWallDist, raw `F (signed).
+        self.texVinit   = kwargs['texVinit']    # o_texVinit: raw `F (signed).
+        self.mapX       = kwargs['mapX']        # Map cell that was hit (not an output, but handy for comparisons).
+        self.mapY       = kwargs['mapY']
+        self.steps      = kwargs['steps']       # Number of TraceStep iterations (excluding the final hit step).
+        self.done       = kwargs['done']        # False if the ray gave up after MAX_STEPS.
+        self.sat        = kwargs['sat']         # Bits set for reciprocal o_sat: SAT_STEPX, SAT_STEPY, SAT_SIZE.
+        self.ovf        = kwargs['ovf']         # Bits set for values that wrapped: OVF_ADDEND, OVF_TRACK.
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+# Trace all visible lines for one frame.
+# `pov` is the 6 raw UQ6.9/SQ2.9 values (see fixed_point.pov_fixed()), and the
+# remaining args are the respective spi_registers values.
+# `pov` can also be 6 arrays of P values each, to trace P frames at once, in which
+# case each of the Trace arrays is shaped [P][line] instead of just [line].
+# `lines` can be used to trace other lines, e.g. -32..-1 are traced during VBLANK:
+def trace_frame(pov, otherx=0, othery=0, mapdx=0, mapdy=0, mapdxw=0, mapdyw=0, qm=QM, qn=QN, lines=None):
+    w = qm+qn
+    wmask = mask(w)
+    MIN_DIST_F = int(MIN_DIST * 2.0**qn)
+    HALF_SIZE_CLIP = wrap(HALF_SIZE << (qn-8), w)
+
+    # rayAddend starts at -vplane*272 during VSYNC, and increments by vplane after each line.
+    # Counting the VBLANK lines, visible line 0 is traced with -vplane*240:
+    if lines is None:
+        lines = np.arange(V_VIEW, dtype=np.int64)
+    lines = np.asarray(lines, dtype=np.int64)
+
+    # Flatten every POV/line combination into one array of rays:
+    vectors = [np.asarray(v, dtype=np.int64)[..., None] for v in pov_to_F(pov, qm, qn)]
+    shape = np.broadcast_shapes(lines.shape, *(v.shape for v in vectors))
+    lines = np.broadcast_to(lines, shape).ravel()
+    playerX, playerY, facingX, facingY, vplaneX, vplaneY = (np.broadcast_to(v, shape).ravel() for v in vectors)
+
+    ovf = np.zeros(len(lines), dtype=np.int64)
+    rayAddendX = signed((lines-240) * vplaneX, w)
+    rayAddendY = signed((lines-240) * vplaneY, w)
+    ovf |= np.where((rayAddendX != (lines-240) * vplaneX) | (rayAddendY != (lines-240) * vplaneY), OVF_ADDEND, 0)
+    rayDirX = signed(facingX + (rayAddendX >> 8), w)
+    rayDirY = signed(facingY + (rayAddendY >> 8), w)
+    rxi = rayDirX > 0
+    ryi = rayDirY > 0
+
+    playerMapX = playerX >> qn
+    playerMapY = playerY >> qn
+    partialX = np.where(rxi, (1<<qn) - (playerX & mask(qn)), playerX & mask(qn))
+    partialY = np.where(ryi, (1<<qn) - (playerY & mask(qn)), playerY & mask(qn))
+
+    # SDXPrep, SDYPrep: Step distances (as raw unsigned bit patterns):
+    stepDistX, satX = reciprocal_abs(rayDirX, qm, qn)
+    stepDistY, satY = reciprocal_abs(rayDirY, qm, qn)
+    # TracePrepX, TracePrepY: Initial (unsigned) tracking distances:
+    trackDistX = FF(signed(stepDistX, w) * partialX, qm, qn)
+    trackDistY = FF(signed(stepDistY, w) * partialY, qm, qn)
+    ovf |= np.where(
+        ((signed(stepDistX, w) * partialX) >> qn != trackDistX) |
+        ((signed(stepDistY, w) * partialY) >> qn != trackDistY), OVF_TRACK, 0)
+
+    count = len(lines)
+    playerMapX &= mask(qm)
+    playerMapY &= mask(qm)
+    mapX = playerMapX.copy()
+    mapY = playerMapY.copy()
+    visualWallDist = np.zeros(count, dtype=np.int64)
+    side = np.zeros(count, dtype=np.int64)
+    wall = np.zeros(count, dtype=np.int64)
+    steps = np.zeros(count, dtype=np.int64)
+    done = np.zeros(count, dtype=bool)
+    mapdx5, mapdy5 = mapdx & 0b11111, mapdy & 0b11111
+    otherx5, othery5 = otherx & 0b11111, othery & 0b11111
+
+    # TraceStep: Each iteration is one clock for every ray that is still active.
+    # Only the still-active rays (by index) are processed in each iteration:
+    active = np.arange(count)
+    for _ in range(MAX_STEPS+1):
+        if len(active) == 0:
+            break
+        mx = mapX[active]
+        my = mapY[active]
+        col = mx & mask(MAP_WBITS)
+        row = my & mask(MAP_HBITS)
+        vwd = visualWallDist[active]
+        valid = (vwd >= MIN_DIST_F) & ~((mx == playerMapX[active]) & (my == playerMapY[active]))
+        # Hit priority matches the if/else chain in TraceStep:
+        hit_dx = valid & (col == mapdx5) & (mapdx5 != 0)
+        hit_dy = valid & (row == mapdy5) & (mapdy5 != 0) & ~hit_dx
+        hit_other = valid & (col == otherx5) & (row == othery5) & ~hit_dx & ~hit_dy
+        map_val = map_rom(col, row, MAP_WBITS, MAP_HBITS)
+        hit_map = valid & (map_val != 0) & ~hit_dx & ~hit_dy & ~hit_other
+        hit = hit_dx | hit_dy | hit_other | hit_map
+        wall[active] = np.select([hit_dx, hit_dy, hit_other, hit_map], [mapdxw, mapdyw, 0, map_val], 0)
+        done[active[hit]] = True
+
+        # No hit, so step on whichever axis is nearest:
+        a = active[~hit]
+        tdx = trackDistX[a]
+        tdy = trackDistY[a]
+        needStepX = tdx < tdy # Unsigned comparison.
+        sx = a[needStepX]
+        sy = a[~needStepX]
+        mapX[sx] = (mapX[sx] + np.where(rxi[sx], 1, -1)) & mask(qm)
+        visualWallDist[sx] = signed(trackDistX[sx], w)
+        ovf[sx] |= np.where(trackDistX[sx] + stepDistX[sx] > wmask, OVF_TRACK, 0)
+        trackDistX[sx] = (trackDistX[sx] + stepDistX[sx]) & wmask
+        side[sx] = 0
+        mapY[sy] = (mapY[sy] + np.where(ryi[sy], 1, -1)) & mask(qm)
+        visualWallDist[sy] = signed(trackDistY[sy], w)
+        ovf[sy] |= np.where(trackDistY[sy] + stepDistY[sy] > wmask, OVF_TRACK, 0)
+        trackDistY[sy] = (trackDistY[sy] + stepDistY[sy]) & wmask
+        side[sy] = 1
+        steps[a] += 1
+        active = a
+
+    # SizePrep, CalcTexU: Wall size and texture 'u' coordinate:
+    size_full, satSize = reciprocal_abs(visualWallDist, qm, qn)
+    sat = np.where(satX, SAT_STEPX, 0) | np.where(satY, SAT_STEPY, 0) | np.where(satSize, SAT_SIZE, 0)
+    size = (size_full >> (qn-8)) & mask(11)
+    wallPartial = wrap(
+        FF(np.where(side == 1, rayDirX, rayDirY) * visualWallDist, qm, qn) +
+        np.where(side == 1, playerX, playerY),
+        w
+    )
+    texu_mirror = np.where(side == 1, ryi, ~rxi)
+    texu = ((wallPartial >> (qn-6)) & 0b111111) ^ np.where(texu_mirror, 0b111111, 0)
+
+    # CalcTexVInit, TraceDone:
+    mul_out = signed(size_full - HALF_SIZE_CLIP, w) * visualWallDist
+    texVinit = signed(((mul_out >> (2*qn-8)) & mask(qm)) << qn, w)
+
+    return Trace(**{
+        k: v.reshape(shape) for k, v in dict(
+            wall=wall, side=side, size=size, texu=texu,
+            texa=visualWallDist, texVinit=texVinit,
+            mapX=mapX, mapY=mapY, steps=steps, done=done, sat=sat, ovf=ovf,
+        ).items()
+    })
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reference model of raybox-zero wall_tracer.v; traces all lines of a frame.')
+    parser.add_argument('--pov', type=float, nargs=6, metavar=('PX','PY','FX','FY','VX','VY'), default=POV_RESET, help='POV vectors (floats), as per Player.current_view_vectors()')
+    parser.add_argument('--pov-bits', type=str, help='POV as a 74-bit binary string (as sent by set_raw_pov); overrides --pov')
+    parser.add_argument('--other', type=int, nargs=2, default=(0,0), metavar=('X','Y'), help='otherx/othery register values')
+    parser.add_argument('--mapd', type=int, nargs=4, default=(0,0,0,0), metavar=('DX','DY','DXW','DYW'), help='mapdx/mapdy/mapdxw/mapdyw register values')
+    parser.add_argument('--qm', type=int, default=QM, help='Fixed-point integer bits (Qm)')
+    parser.add_argument('--qn', type=int, default=QN, help='Fixed-point fractional bits (Qn)')
+    parser.add_argument('-o', '--output', type=str, help='Write per-line results to this .npz file (e.g. as golden data)')
+    parser.add_argument('-b', '--bench', type=int, default=0, metavar='N', help='Time N repeated traces and report the achievable frame rate')
+    args = parser.parse_args()
+
+    pov = pov_from_bits(args.pov_bits) if args.pov_bits else pov_fixed(*args.pov)
+    kw = dict(
+        otherx=args.other[0], othery=args.other[1],
+        mapdx=args.mapd[0], mapdy=args.mapd[1], mapdxw=args.mapd[2], mapdyw=args.mapd[3],
+        qm=args.qm, qn=args.qn,
+    )
+    t = trace_frame(pov, **kw)
+    print(f"POV (raw): {pov}  Q{args.qm}.{args.qn}")
+    print(f"Walls hit: {np.bincount(t.wall, minlength=4)}  Sides: {np.bincount(t.side, minlength=2)}  Unfinished: {np.count_nonzero(~t.done)}")
+    print(f"Size min/max: {t.size.min()}/{t.size.max()}  Steps min/max: {t.steps.min()}/{t.steps.max()}")
+    if args.output:
+        np.savez_compressed(args.output, pov=np.array(pov), **t.as_dict())
+        print(f"Saved per-line trace results to {args.output}")
+    if args.bench > 0:
+        start = time.perf_counter()
+        for _ in range(args.bench):
+            trace_frame(pov, **kw)
+        elapsed = time.perf_counter() - start
+        print(f"{args.bench} frames in {elapsed:.3f}s: {args.bench/elapsed:.1f} fps")
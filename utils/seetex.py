@@ -1,70 +1,123 @@
 # This script converts a raw raybox-zero textures binary to a PNG,
-# expecting the source binary to be in 2xbgr format, which is:
+# expecting the source binary to be in 2xbgr format (by default), which is:
 # 8 bits per pixel (only 6 used): 2 "planes" of XBGR, i.e. bit packing (MSB to LSB) is: -BGR-bgr
+# Other formats, and decoding, are as per texcodec.py.
+#
+# The binary is memory-mapped, and the PNG is written in chunks of rows as they're decoded,
+# so even full 1MB (or bigger) ROM images are quick and don't need much memory.
+#
+# By default the whole file is shown, with white-only rows (e.g. 0xFF padding) trimmed from
+# the bottom. Instead, part of it can be selected (and is shown as-is). Addresses wrap at 24
+# bits, and beyond the end of the file is erased (0xFF) flash, the same as the chip sees it:
+#   --range 0x2000:0x4000     Bytes in the range (end is exclusive; default is end of file).
+#   --tiles 0,1,5             64x64 tiles (4096 bytes each), in the given order.
+#   --texadd 0,0x40000,0,0    The textures for each wall ID (both sides) that the chip reads
+#                             with texadd0..3 set to these values.
+#
+# With --palette, the PNG is written with indexed colour, using the entries of a RIFF
+# palette (by default assets/rgb222.pal) rather than 24-bit RGB.
+#
+# Examples:
+#   python3 seetex.py ../assets/wolfwall1bit-1MB.bin wolf.png -f mono
+#   python3 seetex.py ../assets/tt07-wall-textures.bin walls.png --texadd 0,0,0x10000,0 -P
 
-from PIL import Image
 import argparse
 import os
+import png
+import numpy as np
+from texcodec import FORMATS, PALETTE_FILE, decode_rgb222, RGB222_RGB888, load_palette, palette_lut
 
-def luma_2b_to_8b(value):
-    """Convert a 2-bit value to 8-bit by repeating the bits."""
-    return (value << 6) | (value << 4) | (value << 2) | value
+WIDTH       = 64
+TILE_BYTES  = 64*64
+WALL_BYTES  = 2*TILE_BYTES  # Both sides of a wall.
+CHUNK_ROWS  = 4096          # Rows decoded and written at a time.
 
-def decode_2xbgr(byte):
-    """Decode a single byte in 2xbgr (xbgrXBGR) format into 8-bit R, G, B."""
-    r_2bit = ((byte << 1) & 0b10) | ((byte >> 4) & 0b01)
-    g_2bit = ((byte << 0) & 0b10) | ((byte >> 5) & 0b01)
-    b_2bit = ((byte >> 1) & 0b10) | ((byte >> 6) & 0b01)
-    
-    r = luma_2b_to_8b(r_2bit)
-    g = luma_2b_to_8b(g_2bit)
-    b = luma_2b_to_8b(b_2bit)
-    return (r, g, b)
+# Byte addresses (each a range of `start` to `end`) that a selection covers:
+def selected_spans(args):
+    if args.range:
+        start, _, end = args.range.partition(':')
+        return [(int(start, 0), int(end, 0) if end else None)]
+    if args.tiles:
+        return [(int(t, 0)*TILE_BYTES, (int(t, 0)+1)*TILE_BYTES) for t in args.tiles.split(',')]
+    if args.texadd:
+        # As per texture_addresses() in model/rbzero.py, wall IDs 1..4 use texadd0..3:
+        texadd = [int(t, 0) for t in args.texadd.split(',')]
+        return [((w << 13) + texadd[w], (w << 13) + texadd[w] + WALL_BYTES) for w in range(len(texadd))]
+    return None
 
-def convert_file_to_png(input_path, output_path):
+# Read bytes from `start` to `end`, as the chip would:
+def read_span(rom, start, end):
+    addr = np.arange(start, end) & 0xFFFFFF
+    inside = addr < len(rom)
+    data = np.full(len(addr), 0xFF, dtype=np.uint8)
+    data[inside] = rom[addr[inside]]
+    return data
+
+def convert_file_to_png(input_path, output_path, format='2xbgr', palette_path=None, spans=None):
     if not os.path.exists(input_path):
         print(f"Error: input file '{input_path}' does not exist.")
         return
 
-    with open(input_path, 'rb') as f:
-        data = f.read()
-
-    width = 64
-    total_pixels = len(data)
-    height = total_pixels // width
+    size = os.path.getsize(input_path)
+    rom = np.memmap(input_path, dtype=np.uint8, mode='r') if size else np.zeros(0, dtype=np.uint8)
 
-    if total_pixels % width != 0:
-        print("Warning: input data does not align to 64 pixels per row. Truncating extra bytes.")
-        data = data[:width * height]
+    width = WIDTH
+    if spans is None:
+        total_pixels = len(rom)
+        height = total_pixels // width
 
-    # Decode pixels
-    pixels = [decode_2xbgr(b) for b in data]
+        if total_pixels % width != 0:
+            print("Warning: input data does not align to 64 pixels per row. Truncating extra bytes.")
 
-    # Trim white-only rows from the bottom
-    while height > 0:
-        row_start = (height - 1) * width
-        row = pixels[row_start:row_start + width]
-        if all(pixel == (255, 255, 255) for pixel in row):
-            height -= 1
-        else:
-            break
+        # Trim white-only rows from the bottom, i.e. stop after the last non-white pixel:
+        white = decode_rgb222(np.arange(256, dtype=np.uint8), format) == 63
+        coloured = np.flatnonzero(~white[rom[:width * height]])
+        height = coloured[-1] // width + 1 if len(coloured) else 0
+        chunks = [(y*width, min(y + CHUNK_ROWS, height)*width) for y in range(0, height, CHUNK_ROWS)]
+        read = lambda start, end: rom[start:end]
+    else:
+        spans = [(start, len(rom) if end is None else end) for start, end in spans]
+        if any((end - start) % width for start, end in spans):
+            print("Warning: selection does not align to 64 pixels per row. Truncating extra bytes.")
+        spans = [(start, start + (end - start) // width * width) for start, end in spans if end > start]
+        height = sum(end - start for start, end in spans) // width
+        chunks = [(s, min(s + CHUNK_ROWS*width, end)) for start, end in spans for s in range(start, end, CHUNK_ROWS*width)]
+        read = lambda start, end: read_span(rom, start, end)
 
     if height == 0:
         print("Image is fully white or empty. No output generated.")
         return
 
-    image = Image.new("RGB", (width, height))
-    image.putdata(pixels[:width * height])
+    if palette_path:
+        palette = load_palette(palette_path)
+        lut, channels = palette_lut(palette), 1
+        writer = png.Writer(width=width, height=height, bitdepth=8, palette=[tuple(c) for c in palette])
+    else:
+        lut, channels = RGB222_RGB888, 3
+        writer = png.Writer(width=width, height=height, bitdepth=8, greyscale=False)
+
+    # Decode and write one chunk of rows at a time:
+    def rows():
+        for start, end in chunks:
+            yield from lut[decode_rgb222(read(start, end), format)].reshape(-1, width * channels)
+
     os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
-    image.save(output_path)
+    with open(output_path, 'wb') as f:
+        writer.write(f, rows())
     print(f"Saved PNG to {output_path} ({width}x{height})")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
-        description="Convert a raw 2xbgr binary file (64px wide) to a trimmed 24-bit PNG image."
+        description="Convert a raw texture binary file (64px wide) to a trimmed 24-bit PNG image."
     )
-    parser.add_argument("input", help="Input binary file in 2xbgr format")
+    parser.add_argument("input", help="Input binary file (2xbgr format by default)")
     parser.add_argument("output", help="Output PNG file path")
+    parser.add_argument("-f", "--format", default="2xbgr", choices=FORMATS, help="Input pixel format (mono is 1 byte per pixel, as written by texy9.py)")
+    parser.add_argument("-P", "--palette", nargs="?", const=PALETTE_FILE, help=f"Write an indexed-colour PNG using this RIFF palette (default: {PALETTE_FILE})")
+    select = parser.add_mutually_exclusive_group()
+    select.add_argument("-r", "--range", help="Only show bytes START:END (e.g. 0x2000:0x4000; END defaults to end of file)")
+    select.add_argument("-t", "--tiles", help="Only show these comma-separated 64x64 tile indices, in order")
+    select.add_argument("--texadd", help="Only show the textures of wall IDs 1..4 as read with these comma-separated texadd0..3 values")
     args = parser.parse_args()
 
-    convert_file_to_png(args.input, args.output)
+    convert_file_to_png(args.input, args.output, args.format, args.palette, selected_spans(args))
@@ -0,0 +1,121 @@
+# texcodec.py
+#
+# Texture pixel formats, shared by texy.py, texy9.py and seetex.py so that encoding and
+# decoding can't drift apart. Every conversion is a table lookup on whole NumPy arrays (or
+# anything np.frombuffer() takes, e.g. bytes, memoryviews, mmaps).
+#
+# Formats (see also texy.py):
+# - 2xbgr       = 8 bits per pixel (only 6 used): 2 "planes" of XBGR, i.e. bit packing (MSB to LSB) is: -BGR-bgr
+# - bgrx2222    = 8 bits per pixel (only 6 used): packing of 2 bits per channel, i.e. BbGgRr--
+# - mono        = 1 bit per pixel: average of R, G, B (no channel weighting) above 127. texy9.py
+#                 writes 1 byte per pixel (-------L), texy.py packs 8 pixels per byte (MSB first).
+#
+# In between, colours are RGB222 as the chip sees them, i.e. a 6-bit BBGGRR index, and each
+# 2-bit channel level expands to 8 bits as 0, 85, 170, 255 (i.e. the bits repeated).
+#
+# RGB222 colours can also be mapped to/from the entries of a RIFF palette, e.g.
+# assets/rgb222.pal (which lists them from white to black).
+
+import os
+import numpy as np
+
+FORMATS         = ['mono', 'bgrx2222', '2xbgr']
+PALETTE_FILE    = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'rgb222.pal')
+
+def b8_b2_threshold(v):
+    return 3 if v >= 213 else 2 if v >= 128 else 1 if v >= 42 else 0
+
+def b2_b8(v):
+    return [0, 85, 170, 255][v]
+
+# LUTs for the above. Values outside 0..255 (e.g. with random noise added) are clipped
+# first, which gives the same result:
+B8_B2 = np.array([b8_b2_threshold(v) for v in range(256)], dtype=np.int64)
+B2_B8 = np.array([b2_b8(v) for v in range(4)], dtype=np.int64)
+
+def threshold(values):
+    return B8_B2[np.clip(values, 0, 255)]
+
+# BBGGRR index <=> 2-bit levels [...,(r,g,b)]:
+def rgb222(quant):
+    quant = np.asarray(quant)
+    return (quant[..., 2] << 4) | (quant[..., 1] << 2) | quant[..., 0]
+
+def split_rgb222(index):
+    index = np.asarray(index)
+    return np.stack([(index >> s) & 0b11 for s in (0, 2, 4)], axis=-1)
+
+RGB222 = np.arange(64)
+RGB222_RGB888 = B2_B8[split_rgb222(RGB222)].astype(np.uint8)
+
+def pack_2xbgr(r2, g2, b2):
+    return (
+        ((b2 & 1) << 6) | ((g2 & 1) << 5) | ((r2 & 1) << 4) |
+        ((b2 & 2) << 1) | ((g2 & 2)     ) | ((r2 & 2) >> 1)
+    )
+
+def pack_bgrx2222(r2, g2, b2):
+    return (b2 << 6) | (g2 << 4) | (r2 << 2)
+
+# Encode LUTs (BBGGRR => byte), and decode LUTs (byte => BBGGRR). Unused bits are ignored
+# when decoding:
+ENCODE_LUT = {
+    fmt: pack(*(split_rgb222(RGB222)[:, c] for c in range(3))).astype(np.uint8)
+    for fmt, pack in [('2xbgr', pack_2xbgr), ('bgrx2222', pack_bgrx2222)]
+}
+DECODE_LUT = {}
+for fmt, lut in ENCODE_LUT.items():
+    used = np.bitwise_or.reduce(lut)
+    DECODE_LUT[fmt] = np.zeros(256, dtype=np.uint8)
+    DECODE_LUT[fmt][lut] = RGB222
+    DECODE_LUT[fmt] = DECODE_LUT[fmt][np.arange(256) & used]
+del fmt, lut, used
+
+# Mono: indexed by r+g+b, for an average above 127:
+MONO_LUT = (np.arange(3*255 + 1) / 3 > 127).astype(np.uint8)
+
+def as_bytes(data):
+    return data if isinstance(data, np.ndarray) else np.frombuffer(data, dtype=np.uint8)
+
+# Encode 2-bit levels `quant` [...,(r,g,b)] in `format`. For mono, the bit comes from `values`
+# (the 8-bit values that were quantized), one byte per pixel:
+def encode(quant, values, format):
+    if format == 'mono':
+        return MONO_LUT[np.asarray(values).sum(axis=-1)]
+    return ENCODE_LUT[format][rgb222(quant)]
+
+# Decode bytes in `format` to 2-bit levels [...,(r,g,b)]. Mono is one byte per pixel:
+def decode_rgb222(data, format):
+    data = as_bytes(data)
+    if format == 'mono':
+        return np.where(data & 1, 63, 0)
+    return DECODE_LUT[format][data]
+
+# Decode bytes in `format` to RGB888 (uint8 [...,3]):
+def decode(data, format):
+    return RGB222_RGB888[decode_rgb222(data, format)]
+
+# texy.py's mono: pack 1 bit per pixel, 8 per byte, MSB first, along the last axis:
+def pack_mono(bits):
+    return np.packbits(np.asarray(bits, dtype=np.uint8), axis=-1)
+
+def unpack_mono(data):
+    return np.unpackbits(as_bytes(data), axis=-1)
+
+# Load a RIFF palette ('RIFF' .. 'PAL data' .. version, count, then R,G,B,flags entries) as
+# a uint8 [count,3] array:
+def load_palette(path=PALETTE_FILE):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[0:4] != b'RIFF' or data[8:16] != b'PAL data':
+        raise Exception(f"{path} is not a RIFF palette")
+    count = int.from_bytes(data[22:24], 'little')
+    return np.frombuffer(data, dtype=np.uint8, count=count*4, offset=24).reshape(count, 4)[:, :3]
+
+# LUT of BBGGRR => index of that colour in `palette`:
+def palette_lut(palette):
+    match = (RGB222_RGB888[:, None, :] == palette[None, :, :]).all(axis=-1)
+    missing = np.flatnonzero(~match.any(axis=1))
+    if len(missing):
+        raise Exception(f"Palette is missing RGB222 colour(s): {[tuple(c) for c in RGB222_RGB888[missing]]}")
+    return match.argmax(axis=1).astype(np.uint8)
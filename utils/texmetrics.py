@@ -0,0 +1,67 @@
+# texmetrics.py
+#
+# Image quality metrics for comparing quantized tiles against their source, for texy9.py's
+# sweep mode and automatic quantizer selection. Each takes batches of RGB888 tiles (shape
+# (..., H, W, 3)) and gives one value per tile, higher being better:
+# - psnr:           Peak signal-to-noise ratio (dB) of the pixels as they are. This favours
+#                   plain thresholding, as dithering adds lots of per-pixel error.
+# - blurred_psnr:   PSNR after a small box blur of both, i.e. roughly how the tile looks from
+#                   a distance (or scaled down on screen), where dithering averages out.
+# - ssim:           SSIM-like structural similarity (-1..1, 1 being identical): how well local
+#                   mean, contrast and structure are kept, in a sliding box window per channel.
+#
+# All of them work on the 64x64 texel grid itself, i.e. the texels the chip actually samples
+# and magnifies onto the screen, with no resampling, and windows are measured in texels.
+# Box blurs are separable running sums, so the cost per texel doesn't depend on the window
+# size, and thousands of tiles take a few seconds.
+
+import numpy as np
+
+PSNR_MAX        = 99.0  # PSNR given to identical tiles (i.e. zero error), so results stay finite.
+BLUR_RADIUS     = 1     # blurred_psnr box blur: 3x3 texels.
+SSIM_RADIUS     = 3     # ssim window: 7x7 texels.
+SSIM_C1         = (0.01*255)**2
+SSIM_C2         = (0.03*255)**2
+
+def mse(a, b):
+    return ((np.asarray(a, dtype=np.float64) - b) ** 2).mean(axis=(-3, -2, -1))
+
+def psnr(a, b):
+    error = mse(a, b)
+    with np.errstate(divide='ignore'):
+        return np.minimum(10.0 * np.log10(255.0**2 / error), PSNR_MAX)
+
+# Box blur with the given radius, over the H and W axes (edges are clamped):
+def blur(tiles, radius=BLUR_RADIUS):
+    tiles = np.asarray(tiles, dtype=np.float64)
+    size = 2*radius + 1
+    for axis in (-3, -2):
+        n = tiles.shape[axis]
+        pad = [(0, 0)] * tiles.ndim
+        pad[axis] = (radius + 1, radius)
+        sums = np.cumsum(np.pad(tiles, pad, mode='edge'), axis=axis)
+        # Each window's sum is the difference of running sums `size` apart (hence padding one
+        # extra element at the start):
+        hi, lo = [slice(None)] * tiles.ndim, [slice(None)] * tiles.ndim
+        hi[axis], lo[axis] = slice(size, size + n), slice(0, n)
+        tiles = sums[tuple(hi)] - sums[tuple(lo)]
+    return tiles / (size * size)
+
+def blurred_psnr(a, b, radius=BLUR_RADIUS):
+    return psnr(blur(a, radius), blur(b, radius))
+
+def ssim(a, b, radius=SSIM_RADIUS):
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    mu_a, mu_b = blur(a, radius), blur(b, radius)
+    var_a = blur(a*a, radius) - mu_a*mu_a
+    var_b = blur(b*b, radius) - mu_b*mu_b
+    cov = blur(a*b, radius) - mu_a*mu_b
+    s = ((2*mu_a*mu_b + SSIM_C1) * (2*cov + SSIM_C2)) / ((mu_a*mu_a + mu_b*mu_b + SSIM_C1) * (var_a + var_b + SSIM_C2))
+    return s.mean(axis=(-3, -2, -1))
+
+METRICS = {
+    'psnr':         psnr,
+    'blurred_psnr': blurred_psnr,
+    'ssim':         ssim,
+}
@@ -0,0 +1,136 @@
+# texpack.py
+#
+# Packs several wall sets into one texture ROM (flash) image, and writes a JSON manifest of
+# the texadd0..3 values that select each set, e.g. for raybox_game.py --walls.
+#
+# As per texture_addresses() in model/rbzero.py, the chip reads side S of wall ID 1..4 (slot
+# W = 0..3) from ((W<<13) | (S<<12) | (texu<<6)) + texadd[W]. So each wall is 2 tiles (side 0
+# then side 1) in a row, and texadd is *added* rather than OR'd in, so a wall at address A
+# just needs texadd[W] = A - (W<<13) (wrapping at 24 bits). Walls are always placed on tile
+# (4096 byte) boundaries, which is also the flash erase sector size.
+#
+# Tiles are deduplicated: a wall whose 2 tiles are already somewhere in the ROM in the right
+# order (even if they were placed as parts of 2 different walls) reuses them, and if its first
+# tile is the last one written so far, only its second tile is added. The first set's walls,
+# taken straight from a texy/texy9 binary, land at their usual addresses (texadd all 0).
+#
+# Each set is NAME=FILE[:WALLS], where FILE is a binary of 64x64 tiles (4096 bytes each,
+# i.e. 2xbgr or bgrx2222, as written by texy.py/texy9.py), and WALLS is up to 4 comma-
+# separated walls for slots 0..3 (default: 0,2,4,6). Each wall is the tile index of its
+# side 0 (with side 1 being the next tile), or A+B for any 2 tiles.
+#
+# Examples:
+#   python3 texpack.py walls.bin tt07=../assets/tt07-wall-textures.bin wolf=wolf.bin:0,14,84,106
+#   python3 texpack.py walls.bin a=walls1.bin b=walls1.bin:8,10,12,14 c=walls2.bin:0,3+9 -p 1048576
+# The texadd values printed for each set can be given to seetex.py --texadd to check them.
+
+import argparse
+import json
+import os
+
+TILE_BYTES      = 64*64
+WALL_SLOTS      = 4
+ADDRESS_BITS    = 24
+
+parser = argparse.ArgumentParser(description='Packs wall sets into one deduplicated texture ROM, with a JSON manifest of their texadd values.')
+parser.add_argument('outfile', help='Output ROM image')
+parser.add_argument('sets', nargs='+', metavar='NAME=FILE[:WALLS]', help='A wall set: its name, a binary of tiles, and up to 4 comma-separated walls (tile index of side 0, or A+B; default 0,2,4,6)')
+parser.add_argument('-m', '--manifest', type=str, help='Output JSON manifest (default: outfile with .json extension)')
+parser.add_argument('-p', '--pad', type=int, default=0, help='Pad the ROM out to the specified size, using 0xFF filler')
+
+# Parse a NAME=FILE[:WALLS] set. Returns (name, file, walls), with walls as (side 0, side 1)
+# tile indices:
+def parse_set(spec):
+    name, sep, source = spec.partition('=')
+    if not sep or not name:
+        raise Exception(f"Wall set {spec!r} should be NAME=FILE[:WALLS]")
+    path, _, walls = source.partition(':')
+    pairs = []
+    for wall in (walls or '0,2,4,6').split(','):
+        side0, plus, side1 = wall.partition('+')
+        pairs.append((int(side0, 0), int(side1, 0) if plus else int(side0, 0) + 1))
+    if len(pairs) > WALL_SLOTS:
+        raise Exception(f"Wall set {name!r} has {len(pairs)} walls, but there are only {WALL_SLOTS} slots")
+    return name, path, pairs
+
+class RomPacker:
+    def __init__(self):
+        self.tiles = []     # Tile data, in ROM order.
+        self.order = []     # Index in `distinct` of each tile in the ROM.
+        self.distinct = {}  # Tile data => index.
+        self.pairs = {}     # (index, index) of each pair of tiles in a row in the ROM => tile number of the first.
+
+    def _append(self, tile):
+        index = self.distinct.setdefault(tile, len(self.distinct))
+        if self.order:
+            self.pairs.setdefault((self.order[-1], index), len(self.order) - 1)
+        self.order.append(index)
+        self.tiles.append(tile)
+
+    # Place a wall (its side 0 and side 1 tiles), reusing tiles already in the ROM where it
+    # can. Returns its address:
+    def place(self, side0, side1):
+        pair = (self.distinct.get(side0), self.distinct.get(side1))
+        if pair in self.pairs:
+            return self.pairs[pair] * TILE_BYTES
+        if not self.tiles or self.tiles[-1] != side0:
+            self._append(side0)
+        self._append(side1)
+        return (len(self.tiles) - 2) * TILE_BYTES
+
+    def image(self):
+        return b''.join(self.tiles)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    manifest_path = args.manifest or os.path.splitext(args.outfile)[0] + '.json'
+
+    packer = RomPacker()
+    sources = {} # File path => its data.
+    sets = []
+    walls_in = 0
+    for spec in args.sets:
+        name, path, pairs = parse_set(spec)
+        if path not in sources:
+            with open(path, 'rb') as f:
+                sources[path] = f.read()
+        data = sources[path]
+        tiles = [data[t:t+TILE_BYTES] for t in range(0, len(data) - TILE_BYTES + 1, TILE_BYTES)]
+        walls = []
+        for side0, side1 in pairs:
+            if max(side0, side1) >= len(tiles):
+                raise Exception(f"Wall set {name!r}: tile {max(side0, side1)} is beyond the last tile in {path} ({len(tiles)-1})")
+            address = packer.place(tiles[side0], tiles[side1])
+            walls.append({'tiles': [side0, side1], 'address': address})
+        sets.append({
+            'name':     name,
+            'source':   path,
+            'texadd':   [(wall['address'] - (slot << 13)) % (1 << ADDRESS_BITS) for slot, wall in enumerate(walls)],
+            'walls':    walls,
+        })
+        walls_in += len(walls)
+
+    image = packer.image()
+    if len(image) > 1 << ADDRESS_BITS:
+        raise Exception(f"ROM is {len(image)} bytes, beyond the {ADDRESS_BITS}-bit address range")
+    if args.pad and len(image) > args.pad:
+        raise Exception(f"ROM is {len(image)} bytes, which doesn't fit in --pad {args.pad}")
+
+    # --- Write output ---
+    with open(args.outfile, 'wb') as out:
+        out.write(image)
+        if args.pad > len(image):
+            out.write(bytes([255] * (args.pad - len(image))))
+    with open(manifest_path, 'w') as out:
+        json.dump({
+            'rom':          os.path.basename(args.outfile),
+            'size':         max(len(image), args.pad),
+            'tile_bytes':   TILE_BYTES,
+            'sets':         sets,
+        }, out, indent=2)
+        out.write('\n')
+
+    print(f"Packed {len(sets)} wall set(s) ({walls_in} walls, {2*walls_in} tiles) into {len(packer.tiles)} tiles ({len(image)} bytes) in {args.outfile}")
+    for s in sets:
+        print(f"    {s['name']}: texadd {','.join(hex(t) for t in s['texadd'])}")
+    print(f"Wrote manifest {manifest_path}")
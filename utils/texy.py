@@ -1,6 +1,9 @@
 import png
 import argparse
-from itertools import chain
+import numpy as np
+from multiprocessing import Pool, shared_memory
+from texcodec import B2_B8, FORMATS, threshold, encode, pack_mono
+from tilesheet import TileSheet
 
 # Walls I like are: 0,1,14,15,84,85,106,107
 # Overall good parameters:
@@ -8,10 +11,17 @@ from itertools import chain
 # Another good set:
 #   python3 texy.py ../assets/allwolfwalls.png walls.bin -m 1.4 -b 20 -f 2xbgr -p 1048576 -s 78,79,66,67,46,47,50,51,0,1,2,3,52,53,14,15,16,17,8,9,12,13,32,33,38,39,22,23,44,45,86,87,88,89,98,99,100,101
 
-# A note on formats:
+# A note on formats (encoded by texcodec.py, which has the details):
 # - 2xbgr       = 8 bits per pixel (only 6 used): 2 "planes" of XBGR, i.e. bit packing (MSB to LSB) is: -BGR-bgr
 # - bgrx2222    = 8 bits per pixel (only 6 used): packing of 2 bits per channel, i.e. BbGgRr--
-# - mono        = 8 bits per pixel (only 1 used); average threshold (no channel weighting) resolves to a single "luminosity" bit: -------L
+# - mono        = 1 bit per pixel, 8 pixels per byte (MSB first); average threshold (no channel weighting) resolves to a single "luminosity" bit
+
+# Only the selected walls are decoded from the source PNG (see tilesheet.py), so even huge
+# sheets don't need much memory.
+#
+# With --jobs N, walls are processed by a pool of N worker processes, which read the decoded
+# walls from shared memory. Results are still written in --select order, so the output is
+# the same either way.
 
 parser = argparse.ArgumentParser(
     description='Converts PNG images for use as raybox-zero textures'
@@ -21,144 +31,108 @@ parser.add_argument('outfile')
 parser.add_argument('-s', '--select', type=str, help='Takes a comma-separated list of wall indices (first is 0) and only includes those specified')
 parser.add_argument('-b', '--bias', type=int, default=0, help='Add (or subtract) a given bias on each colour channel')
 parser.add_argument('-m', '--multiplier', type=float, default=1.0, help='Adjust contrast using a multiplier')
-parser.add_argument('-f', '--format', type=str, default='2xbgr', choices=['mono', 'bgrx2222', '2xbgr'], help='Desired target format')
+parser.add_argument('-f', '--format', type=str, default='2xbgr', choices=FORMATS, help='Desired target format')
 parser.add_argument('-p', '--pad', type=int, default=0, help='Pad the file out to the specified size, using 0xFF filler')
-args = parser.parse_args()
-if args.select is not None:
-    args.select = [int(s.strip()) for s in args.select.split(',')]
-if args.infile is None:
-    raise Exception(f"No input PNG file specified")
-
-src = png.Reader(filename=args.infile)
-loaded = src.asRGB8()
-(width, height, data) = loaded[0:3]
-
-# Get number of texture rows and columns,
-# and make sure width and height are multiples of 64:
-(cols,cr) = divmod(width, 64)
-(rows,rr) = divmod(height, 64)
-total_walls = cols*rows
-# Validation...
-e = []
-if cr != 0: e.append(f"Width {width} is not a multiple of 64")
-if rr != 0: e.append(f"Height {height} is not a multiple of 64")
-if total_walls%2 != 0: e.append(f"Wall count {total_walls} is not even")
-if len(e) > 0: raise Exception('; '.join(e))
-print(f"{cols} columns, {rows} rows")
-
-# Extract all actual pixel data:
-data = list(data)
-
-preview_rows = []
-
-def b8_b2(v):
-    return 3 if v >=213 else (2 if v >= 128 else (1 if v >= 42 else 0))
-
-def b2_b8(v):
-    return [0,85,170,255][v]
-
-outfile = open(args.outfile, 'wb')
-written_bytes = 0
-
-# Process each wall that we want... user-specified, or all:
-select_walls = args.select or range(0, total_walls)
-actual_walls_extracted = []
-print(f"Wall IDs to extract, in order: {list(select_walls)}")
-for i in select_walls:
-    if i >= total_walls:
-        print(f"==> WARNING: SKIPPING wall ID {i} because it exceeds the maximum ({total_walls-1})")
-        continue
-    actual_walls_extracted.append(i)
-    (wr,wc) = divmod(i, cols)
-    (wx,wy) = (wc*64, wr*64)
-    print(f"Wall {i:3d} is at  RC({wc:3d}, {wr:3d})  =>  XY({wx:5d}, {wy:5d})")
-    # Process each *column* of pixel data.
-    # For raybox-zero, it is packed bottom to top, left to right.
-    for x in range(wx, wx+64):
-        # Process each pixel of each column, from bottom to top:
-        preview_slice_original = []
-        preview_slice_adjusted = []
-        preview_slice_lossy = []
-        outfile_data = []
-        for y in range(wy+63, wy-1, -1):
-            bias = args.bias
-            mul = args.multiplier
-            r8 = data[y][x*3+0]
-            g8 = data[y][x*3+1]
-            b8 = data[y][x*3+2]
-            preview_slice_original += [r8,g8,b8]
-            r8 = int((float(r8)-128.0)*mul) + 128 + bias
-            g8 = int((float(g8)-128.0)*mul) + 128 + bias
-            b8 = int((float(b8)-128.0)*mul) + 128 + bias
-            if r8 > 255: r8 = 255
-            if g8 > 255: g8 = 255
-            if b8 > 255: b8 = 255
-            if r8 < 0: r8 = 0
-            if g8 < 0: g8 = 0
-            if b8 < 0: b8 = 0
-            preview_slice_adjusted += [r8,g8,b8]
-
-            if args.format == '2xbgr':
-                # Each byte must be made up of this bit stream:
-                # X,b[0],g[0],r[0], X,b[1],g[1],r[1]
-                r2 = b8_b2(r8)
-                g2 = b8_b2(g8)
-                b2 = b8_b2(b8)
-                # Now convert it BACK to an RGB888 equivalent for the preview...
-                preview_slice_lossy += [ b2_b8(r2), b2_b8(g2), b2_b8(b2) ]
-                # Now pack it:
-                outfile_data.append(
-                    ((0)        <<7) | # X
-                    (((b2&1)>>0)<<6) | # B[0]
-                    (((g2&1)>>0)<<5) | # G[0]
-                    (((r2&1)>>0)<<4) | # R[0]
-                    ((0)        <<3) | #
-                    (((b2&2)>>1)<<2) | # B[1]
-                    (((g2&2)>>1)<<1) | # G[1]
-                    (((r2&2)>>1)<<0)   # R[1]
-                )
-            elif args.format == 'bgrx2222':
-                # Convert RGB888 input data to our desired target format...
-                r2 = b8_b2(r8)
-                g2 = b8_b2(g8)
-                b2 = b8_b2(b8)
-                # # This is the simple 'shift' method:
-                # r2 = r8 >> 6
-                # g2 = g8 >> 6
-                # b2 = b8 >> 6
-                # preview_slice_lossy += [r2<<6, g2<<6, b2<<6]
-                # Now convert it BACK to an RGB888 equivalent for the preview...
-                preview_slice_lossy += [ b2_b8(r2), b2_b8(g2), b2_b8(b2) ]
-                # Pack this pixel as an bgrx2222 byte:
-                outfile_data.append( (b2<<6)|(g2<<4)|(r2<<2)|0 ) # 2 LSB not used.
-            elif args.format == 'mono':
-                # Average and threshold:
-                m = 1 if ((r8+g8+b8)/3)>127 else 0
-                # Now convert it BACK to an RGB equivalent for the preview...
-                preview_slice_lossy += ([m*255]*3)
-                # Pack this pixel as a single bit:
-                outfile_data.append( m )
-        wall_index_marker = list(chain.from_iterable([ [k]*3 for k in [255*int(j) for j in f"{i:08b}"] ]))
-        # When a slice is done, write it to our output file:
-        if args.format == 'bgrx2222' or args.format == '2xbgr':
-            byte_list = outfile_data
-        elif args.format == 'mono':
-            byte_list = [int("".join(map(str, outfile_data[i:i+8])), 2) for i in range(0, len(outfile_data), 8)]
-        outfile.write(bytes(byte_list))
-        written_bytes += len(byte_list)
-
-        preview_rows.append(preview_slice_original + preview_slice_adjusted + preview_slice_lossy + wall_index_marker)
-
-# Create the preview file:
-preview_file = open('preview.png', 'wb')
-preview = png.Writer(
-    width=64*3+8, height=len(actual_walls_extracted)*64, # Extra 8 is a binary marker for wall index.
-    bitdepth=8, greyscale=False
-)
-preview.write(preview_file, preview_rows)
-preview_file.close()
-print(f"{len(select_walls)} wall(s) selected. {len(actual_walls_extracted)} actual wall(s) extracted: {actual_walls_extracted}")
+parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of worker processes to process walls with')
+
+# Convert wall `i` (at data[slots[i]], as [y][x][r,g,b]). Returns (bytes, preview rows):
+def process_wall(i):
+    # For raybox-zero, each *column* of pixel data is packed bottom to top, left to right,
+    # i.e. rows of the wall rotated clockwise:
+    original = np.rot90(data[slots[i]].astype(np.int64), -1)
+    adjusted = np.clip(np.trunc((original - 128) * args.multiplier).astype(np.int64) + 128 + args.bias, 0, 255)
+    if args.format == 'mono':
+        # Average and threshold, then pack 1 bit per pixel:
+        m = encode(None, adjusted, 'mono')
+        lossy = np.repeat(m[..., None] * 255, 3, axis=-1)
+        wall_bytes = pack_mono(m)
+    else:
+        quant = threshold(adjusted)
+        # Convert it BACK to an RGB888 equivalent for the preview:
+        lossy = B2_B8[quant]
+        wall_bytes = encode(quant, adjusted, args.format)
+    # Each preview row ends with an 8-pixel binary marker of the wall index:
+    wall_index_marker = np.broadcast_to(np.unpackbits(np.array([i], dtype=np.uint8))[:, None] * 255, (64, 8, 3))
+    preview_rows = np.concatenate([original, adjusted, lossy, wall_index_marker], axis=1).astype(np.uint8)
+    return wall_bytes.tobytes(), preview_rows
+
+# Set up a worker process, with the same args and a view of the image in shared memory:
+def init_worker(worker_args, worker_slots, shm_name, shape):
+    global args, slots, data, image_shm
+    args, slots = worker_args, worker_slots
+    image_shm = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray(shape, dtype=np.uint8, buffer=image_shm.buf)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.select is not None:
+        args.select = [int(s.strip()) for s in args.select.split(',')]
+    if args.infile is None:
+        raise Exception(f"No input PNG file specified")
+
+    sheet = TileSheet(args.infile)
+    (width, height) = (sheet.width, sheet.height)
+
+    # Get number of texture rows and columns,
+    # and make sure width and height are multiples of 64:
+    (cols,cr) = divmod(width, 64)
+    (rows,rr) = divmod(height, 64)
+    total_walls = cols*rows
+    # Validation...
+    e = []
+    if cr != 0: e.append(f"Width {width} is not a multiple of 64")
+    if rr != 0: e.append(f"Height {height} is not a multiple of 64")
+    if total_walls%2 != 0: e.append(f"Wall count {total_walls} is not even")
+    if len(e) > 0: raise Exception('; '.join(e))
+    print(f"{cols} columns, {rows} rows")
+
+    outfile = open(args.outfile, 'wb')
+    written_bytes = 0
+
+    # Process each wall that we want... user-specified, or all:
+    select_walls = args.select or range(0, total_walls)
+    actual_walls_extracted = []
+    print(f"Wall IDs to extract, in order: {list(select_walls)}")
+    for i in select_walls:
+        if i >= total_walls:
+            print(f"==> WARNING: SKIPPING wall ID {i} because it exceeds the maximum ({total_walls-1})")
+            continue
+        actual_walls_extracted.append(i)
+        (wr,wc) = divmod(i, cols)
+        (wx,wy) = (wc*64, wr*64)
+        print(f"Wall {i:3d} is at  RC({wc:3d}, {wr:3d})  =>  XY({wx:5d}, {wy:5d})")
+
+    # Extract the pixel data of just those walls:
+    (data, slots) = sheet.read_tiles(actual_walls_extracted)
+
+    if args.jobs > 1 and len(actual_walls_extracted) > 1:
+        image_shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+        try:
+            np.ndarray(data.shape, dtype=np.uint8, buffer=image_shm.buf)[:] = data
+            with Pool(args.jobs, initializer=init_worker, initargs=(args, slots, image_shm.name, data.shape)) as pool:
+                results = pool.map(process_wall, actual_walls_extracted)
+        finally:
+            image_shm.close()
+            image_shm.unlink()
+    else:
+        results = [process_wall(i) for i in actual_walls_extracted]
+
+    preview_rows = []
+    for wall_bytes, wall_preview_rows in results:
+        outfile.write(wall_bytes)
+        written_bytes += len(wall_bytes)
+        preview_rows += list(wall_preview_rows.reshape(64, -1))
+
+    # Create the preview file:
+    preview_file = open('preview.png', 'wb')
+    preview = png.Writer(
+        width=64*3+8, height=len(actual_walls_extracted)*64, # Extra 8 is a binary marker for wall index.
+        bitdepth=8, greyscale=False
+    )
+    preview.write(preview_file, preview_rows)
+    preview_file.close()
+    print(f"{len(select_walls)} wall(s) selected. {len(actual_walls_extracted)} actual wall(s) extracted: {actual_walls_extracted}")
 
-if args.pad is not None and args.pad > written_bytes:
-    outfile.write(bytes([255] * (args.pad-written_bytes)))
-outfile.close()
+    if args.pad is not None and args.pad > written_bytes:
+        outfile.write(bytes([255] * (args.pad-written_bytes)))
+    outfile.close()
@@ -1,7 +1,44 @@
 import png
 import argparse
-import random
-from itertools import chain
+import csv
+import itertools
+import math
+import numpy as np
+from multiprocessing import Pool, shared_memory
+from dither import MODES as DITHER_MODES, error_diffuse
+from texcodec import B2_B8, FORMATS, threshold, encode
+from tilecache import TileCache, DEFAULT_PATH as CACHE_PATH
+from tilesheet import TileSheet
+from texmetrics import METRICS
+
+# Each 64x64 tile is handled as a (64, 64, 3) integer array of [y][x][r,g,b], so every step
+# (rotation, adjustment, quantization, packing and preview) works on whole tiles at once.
+#
+# Only the selected tiles are decoded from the source PNG (see tilesheet.py), into `data`, a
+# (N, 64, 64, 3) array of distinct tiles, with `slots` mapping each tile index to its place.
+#
+# Tiles are independent, so with --jobs N they're split into chunks that are processed by a
+# pool of N worker processes. The decoded tiles are put in shared memory for the workers to
+# read, rather than being pickled for each chunk, and results are reassembled in --select
+# order, so the output is the same for any N. The random quantizer is seeded per tile (from
+# --seed and the tile index) for the same reason.
+#
+# Converted tiles are kept in an on-disk cache (see tilecache.py), keyed by each tile's source
+# pixels and the parameters that apply to it, so a rebuild only converts tiles that changed.
+#
+# With -q auto (or an 'A' suffix in --select), each tile gets whichever of the --auto-candidates
+# quantizers scores best against its adjusted source, by --auto-metric (see texmetrics.py). Each
+# candidate is one batched pass over all the auto tiles. The choice is shown in each tile's
+# preview marker (rows 16..23), and printed as a --select list to pin it for later builds.
+#
+# Sweep mode (--sweep) converts the selected tiles with every combination of a grid of
+# parameters instead, e.g.:
+#   python3 texy9.py ../assets/tt07-wall-textures.png sweep.csv -s 0,1,2,3 --sweep quantize=threshold,fs,atkinson --sweep bias=0,20 --sweep unsharp_amount=0,1.5
+# The source is loaded once, and each combination is one batched pass over all the tiles (one
+# per worker, with --jobs). It writes a table (CSV, to outfile) of quality metrics for each
+# tile and combination (see texmetrics.py), and a contact sheet (--sweep-sheet) with a row per
+# tile: its index, the source, then its result for each combination in turn, numbered as in
+# the table.
 
 # --- Config and CLI args ---
 parser = argparse.ArgumentParser(description='Converts PNG tiles to binary and preview format.')
@@ -11,66 +48,78 @@ parser.add_argument('--unsharp-radius', type=int, default=1, help='Unsharp mask
 parser.add_argument('--flatten-uniform', action='store_true', help='Disable dithering for uniform tiles')
 parser.add_argument('--flatten-epsilon', type=int, default=4, help='RGB channel epsilon for tile uniformity')
 parser.add_argument('-r', '--rotate', type=int, default=90, choices=[0,90,180,270], help='Clockwise rotation angle')
-parser.add_argument('-f', '--format', type=str, default='2xbgr', choices=['mono', 'bgrx2222', '2xbgr'], help='Output pixel format')
-parser.add_argument('-q', '--quantize', type=str, default='threshold', help='Quantization method to use (threshold, ordered2x2, ordered4x4, fs, atkinson, random)')
+parser.add_argument('-f', '--format', type=str, default='2xbgr', choices=FORMATS, help='Output pixel format (see texcodec.py)')
+parser.add_argument('--dither-mode', type=str, default='legacy', choices=DITHER_MODES, help="Error diffusion kernels: 'legacy' reproduces earlier output exactly (see dither.py)")
+parser.add_argument('-q', '--quantize', type=str, default='threshold', help='Quantization method to use (threshold, ordered2x2, ordered4x4, fs, atkinson, stucki, sierra, random, or auto)')
+parser.add_argument('--auto-metric', type=str, default='ssim', choices=list(METRICS), help='Metric that -q auto picks the best quantizer by')
+parser.add_argument('--auto-candidates', type=str, default='threshold,ordered2x2,ordered4x4,fs,atkinson,stucki,sierra', help='Comma-separated quantizers that -q auto chooses from (ties go to the first)')
 parser.add_argument('infile')
 parser.add_argument('outfile')
 parser.add_argument('-s', '--select', type=str, help='Comma-separated tile indices (0-based)')
 parser.add_argument('-b', '--bias', type=int, default=0, help='Colour bias to add')
 parser.add_argument('-m', '--multiplier', type=float, default=1.0, help='Colour contrast multiplier')
 parser.add_argument('-p', '--pad', type=int, default=0, help='Pad output binary to this size')
-args = parser.parse_args()
-
-quantize_map = {}
-if args.select:
-    parsed = []
-    for s in args.select.split(','):
-        s = s.strip()
-        if s[-1].isalpha():
-            index = int(s[:-1])
-            code = s[-1]
-            qmap = {'t': 'threshold', 'f': 'fs', 'd': 'ordered2x2', 'D': 'ordered4x4', 'a': 'atkinson', 'r': 'random', 's': 'stucki'}
-            quantize_map[index] = qmap.get(code, args.quantize)
-            parsed.append(index)
-        else:
-            parsed.append(int(s))
-    args.select = parsed
+parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of worker processes to process tiles with')
+parser.add_argument('--seed', type=int, default=0, help='Seed for the random quantizer (combined with each tile index)')
+parser.add_argument('--cache', type=str, default=CACHE_PATH, help=f'Directory for the converted tile cache (default: {CACHE_PATH})')
+parser.add_argument('--cache-size', type=int, default=256, help='Max. size of the tile cache, in MB')
+parser.add_argument('--no-cache', action='store_true', help="Don't use the tile cache")
+parser.add_argument('--sweep', type=str, action='append', metavar='PARAM=V1,V2,...', help='Sweep mode: try each of these values of a parameter (quantize, bias, multiplier, unsharp_amount, unsharp_radius or dither_mode); repeat for a grid')
+parser.add_argument('--sweep-sheet', type=str, default='sweep.png', help='Sweep mode contact sheet PNG')
+
+# Parameters that can be swept, and their types:
+SWEEP_PARAMS = {
+    'quantize':         str,
+    'bias':             int,
+    'multiplier':       float,
+    'unsharp_amount':   float,
+    'unsharp_radius':   int,
+    'dither_mode':      str,
+}
+
+# Per-tile quantizer codes, as suffixes in --select:
+QUANTIZE_CODES = {'t': 'threshold', 'f': 'fs', 'd': 'ordered2x2', 'D': 'ordered4x4', 'a': 'atkinson', 'r': 'random', 's': 'stucki', 'S': 'sierra', 'A': 'auto'}
+
+# Short names for the preview marker:
+QUANTIZE_LABELS = {'threshold': 't', 'ordered2x2': 'd2', 'ordered4x4': 'd4', 'fs': 'fs', 'atkinson': 'a', 'stucki': 'st', 'sierra': 'si', 'random': 'r'}
+
+# Parse args, and the per-tile quantizer codes in --select. Returns (args, quantize_map):
+def parse_args():
+    args = parser.parse_args()
+    args.auto_candidates = [q.strip() for q in args.auto_candidates.split(',')]
+    unknown = [q for q in args.auto_candidates if q not in QUANTIZE_LABELS]
+    if unknown:
+        raise Exception(f"Unknown --auto-candidates: {', '.join(unknown)}")
+    quantize_map = {}
+    if args.select:
+        parsed = []
+        for s in args.select.split(','):
+            s = s.strip()
+            if s[-1].isalpha():
+                index = int(s[:-1])
+                code = s[-1]
+                quantize_map[index] = QUANTIZE_CODES.get(code, args.quantize)
+                parsed.append(index)
+            else:
+                parsed.append(int(s))
+        args.select = parsed
+    return args, quantize_map
 
 # --- Utilities ---
 def apply_unsharp_mask(tile, amount=1.5, radius=1):
-    def clamp(v): return max(0, min(255, v))
-
-    # Create blurred version
-    blurred = [[[0, 0, 0] for _ in range(64)] for _ in range(64)]
-    for y in range(64):
-        for x in range(64):
-            total = [0, 0, 0]
-            count = 0
-            for dy in range(-radius, radius + 1):
-                for dx in range(-radius, radius + 1):
-                    nx, ny = x + dx, y + dy
-                    if 0 <= nx < 64 and 0 <= ny < 64:
-                        for c in range(3):
-                            total[c] += tile[ny][nx][c]
-                        count += 1
-            for c in range(3):
-                blurred[y][x][c] = total[c] // count
+    # Box blur, averaging only the neighbours that are inside the tile:
+    padded = np.pad(tile, ((radius, radius), (radius, radius), (0, 0)))
+    inside = np.pad(np.ones((64, 64), dtype=np.int64), radius)
+    total = np.zeros_like(tile)
+    count = np.zeros((64, 64), dtype=np.int64)
+    for dy in range(2*radius + 1):
+        for dx in range(2*radius + 1):
+            total += padded[dy:dy+64, dx:dx+64]
+            count += inside[dy:dy+64, dx:dx+64]
+    blurred = total // count[..., None]
 
     # Apply unsharp mask: result = original + amount * (original - blurred)
-    sharpened = [[[0, 0, 0] for _ in range(64)] for _ in range(64)]
-    for y in range(64):
-        for x in range(64):
-            for c in range(3):
-                o = tile[y][x][c]
-                b = blurred[y][x][c]
-                v = clamp(int(o + amount * (o - b)))
-                sharpened[y][x][c] = v
-    return sharpened
-def b8_b2_threshold(v):
-    return 3 if v >= 213 else 2 if v >= 128 else 1 if v >= 42 else 0
-
-def b2_b8(v):
-    return [0, 85, 170, 255][v]
+    return np.clip(np.trunc(tile + amount * (tile - blurred)), 0, 255).astype(np.int64)
 
 FONT = {
     '0': ['111','101','101','101','111'], '1': ['010','110','010','010','111'],
@@ -80,231 +129,340 @@ FONT = {
     '8': ['111','101','111','101','111'], '9': ['111','101','111','001','111'],
     'a': ['111','101','111','101','101'], 'b': ['110','101','110','101','110'],
     'c': ['111','100','100','100','111'], 'd': ['110','101','101','101','110'],
-    'e': ['111','100','111','100','111'], 'f': ['111','100','111','100','100']
+    'e': ['111','100','111','100','111'], 'f': ['111','100','111','100','100'],
+    'i': ['010','000','010','010','010'], 'r': ['000','101','110','100','100'],
+    's': ['011','100','111','001','110'], 't': ['010','111','010','010','011']
 }
 
-def render_marker_line(index, row):
-    marker = [[0, 0, 0] for _ in range(32)]
-    dec, hexval = str(index), format(index, 'x')
-    text = dec if row // 8 == 0 else hexval if row // 8 == 1 else ''
-    col = 32 - (len(text) * 4)
-    y = row % 8
+# Text as an (8, width, 3) array, right-aligned:
+def render_text(text, width):
+    image = np.zeros((8, width, 3), dtype=np.int64)
+    col = width - (len(text) * 4)
     for char in text:
         glyph = FONT.get(char.lower())
-        if glyph and y < len(glyph):
-            for x, pixel in enumerate(glyph[y]):
-                if pixel == '1' and 0 <= col + x < 32:
-                    marker[col + x] = [255, 255, 255]
+        if glyph:
+            for y, bits in enumerate(glyph):
+                for x, pixel in enumerate(bits):
+                    if pixel == '1' and 0 <= col + x < width:
+                        image[y, col + x] = 255
         col += 4
-    return list(chain(*marker))
-
-# --- Load image ---
-reader = png.Reader(filename=args.infile)
-width, height, pixels, _ = reader.asRGB8()
-data = list(pixels)
-cols, remx = divmod(width, 64)
-rows, remy = divmod(height, 64)
-if remx or remy:
-    raise Exception("Image dimensions must be divisible by 64")
-total_tiles = cols * rows
-selected = args.select or list(range(total_tiles))
-
-# --- Output setup ---
-out = open(args.outfile, 'wb')
-preview_rows = []
-written = 0
+    return image
+
+# Tile index marker for the preview, as a (64, 32, 3) array: decimal index in rows 0..7,
+# hex in rows 8..15, and optionally a label (e.g. the auto-selected quantizer) in rows 16..23,
+# right-aligned:
+def render_marker(index, label=None):
+    marker = np.zeros((64, 32, 3), dtype=np.int64)
+    marker[0:8] = render_text(str(index), 32)
+    marker[8:16] = render_text(format(index, 'x'), 32)
+    if label:
+        marker[16:24] = render_text(label, 32)
+    return marker
 
 # --- Tile processing ---
 def build_dither_mask(tile, epsilon):
-    mask = [[False for _ in range(64)] for _ in range(64)]
-    for y in range(64):
-        for x in range(64):
-            cx = min(63, max(0, x))
-            cy = min(63, max(0, y))
-            r0, g0, b0 = tile[cy][cx]
-            diffs = []
-            for dx in [-1, 0, 1]:
-                for dy in [-1, 0, 1]:
-                    nx = min(63, max(0, cx + dx))
-                    ny = min(63, max(0, cy + dy))
-                    r1, g1, b1 = tile[ny][nx]
-                    diff = abs(r0 - r1) + abs(g0 - g1) + abs(b0 - b1)
-                    diffs.append(diff)
-            avg_diff = sum(diffs) / len(diffs)
-            mask[y][x] = avg_diff > epsilon
-    return mask
+    # Mean L1 RGB difference to each of the 9 neighbours (clamped at the edges):
+    padded = np.pad(tile, ((1, 1), (1, 1), (0, 0)), mode='edge')
+    total = np.zeros((64, 64), dtype=np.int64)
+    for dy in range(3):
+        for dx in range(3):
+            total += np.abs(tile - padded[dy:dy+64, dx:dx+64]).sum(axis=2)
+    return total / 9 > epsilon
+
 def tile_is_uniform(tile, epsilon):
-    ref = tile[0][0]
-    for row in tile:
-        for px in row:
-            if any(abs(a - b) > epsilon for a, b in zip(px, ref)):
-                return False
-    return True
-
-for idx, tile_id in enumerate(selected):
+    return not (np.abs(tile - tile[0, 0]) > epsilon).any()
+
+def adjust(tile):
+    return np.clip(np.trunc((tile - 128) * args.multiplier).astype(np.int64) + 128 + args.bias, 0, 255)
+
+ORDERED_MATRICES = {
+    'ordered2x2': [[0, 2], [3, 1]],
+    'ordered4x4': [[0,8,2,10],[12,4,14,6],[3,11,1,9],[15,7,13,5]],
+}
+
+# Quantize a batch of adjusted tiles (shape (N, 64, 64, 3)) to 2 bits per channel, dithering
+# only where `mask` is set. `tile_ids` seeds the random quantizer for each tile. Returns
+# (quantized, values) as per dither.error_diffuse():
+def quantize(adjusted, mask, method, tile_ids):
+    quant = threshold(adjusted)
+    if method == 'random':
+        noise = np.array([
+            np.random.default_rng([args.seed, tile_id]).integers(-21, 21, (64, 64, 3), endpoint=True)
+            for tile_id in tile_ids
+        ], dtype=np.int64).reshape(adjusted.shape)
+        quant[mask] = threshold(adjusted[mask] + noise[mask])
+    elif method.startswith('ordered'):
+        matrix = np.array(ORDERED_MATRICES.get(method, [[0]]))
+        dim = len(matrix)
+        bias = np.tile(matrix, (64 // dim, 64 // dim)) / (dim * dim)
+        level = np.clip(np.trunc(adjusted / 256.0 * 4 + bias[:, :, None]).astype(np.int64), 0, 3)
+        quant[mask] = level[mask]
+    elif method in ['fs', 'atkinson', 'stucki', 'sierra']:
+        return error_diffuse(adjusted, mask, method, args.dither_mode)
+    return quant, adjusted
+
+# For each of a batch of adjusted tiles, quantize with every --auto-candidates method and keep
+# the one that scores best. Returns (methods, quantized, values):
+def choose_quantizers(adjusted, mask, tile_ids):
+    metric = METRICS[args.auto_metric]
+    best = np.zeros(len(adjusted), dtype=np.int64)
+    best_score = np.full(len(adjusted), -np.inf)
+    quant = np.empty_like(adjusted)
+    values = np.empty_like(adjusted)
+    for c, method in enumerate(args.auto_candidates):
+        q, v = quantize(adjusted, mask, method, tile_ids)
+        score = metric(B2_B8[q], adjusted)
+        better = score > best_score
+        best[better], best_score[better] = c, score[better]
+        quant[better], values[better] = q[better], v[better]
+    return [args.auto_candidates[c] for c in best], quant, values
+
+# Convert a list of tiles from `data`, as per `args`. Returns arrays (shape (N, 64, 64, 3)) of
+# the tiles after rotation (orig), after adjustment, quantized, and the values quantized, and
+# the list of quantizers used:
+def convert_tiles(tile_ids):
+    tiles_orig = []
+    tiles_adjusted = []
+    region_masks = []
+    tile_quants = []
+    for tile_id in tile_ids:
+        tile_quant = quantize_map.get(tile_id, args.quantize)
+
+        # Extract tile and rotate (clockwise):
+        tile_orig = np.rot90(data[slots[tile_id]].astype(np.int64), -args.rotate // 90)
+
+        if args.unsharp_mask:
+            tile = apply_unsharp_mask(tile_orig, amount=args.unsharp_amount, radius=args.unsharp_radius)
+        else:
+            tile = tile_orig
+        if args.flatten_uniform and tile_is_uniform(tile, args.flatten_epsilon):
+          tile_quant = 'threshold'
+
+        if args.flatten_uniform:
+          region_mask = build_dither_mask(tile, args.flatten_epsilon)
+        else:
+          region_mask = np.ones((64, 64), dtype=bool)
+
+        tiles_orig.append(tile_orig)
+        tiles_adjusted.append(adjust(tile))
+        region_masks.append(region_mask)
+        tile_quants.append(tile_quant)
+
+    # Quantize all tiles that use each method together, as one batch:
+    tiles_adjusted = np.array(tiles_adjusted, dtype=np.int64).reshape(-1, 64, 64, 3)
+    region_masks = np.array(region_masks, dtype=bool).reshape(-1, 64, 64)
+    tiles_quant = np.empty_like(tiles_adjusted)
+    tiles_values = np.empty_like(tiles_adjusted)
+    for method in dict.fromkeys(tile_quants):
+        batch = [i for i, q in enumerate(tile_quants) if q == method]
+        if method == 'auto':
+            chosen, tiles_quant[batch], tiles_values[batch] = choose_quantizers(
+                tiles_adjusted[batch], region_masks[batch], [tile_ids[i] for i in batch]
+            )
+            for i, q in zip(batch, chosen):
+                tile_quants[i] = q
+        else:
+            tiles_quant[batch], tiles_values[batch] = quantize(
+                tiles_adjusted[batch], region_masks[batch], method, [tile_ids[i] for i in batch]
+            )
+    return np.array(tiles_orig).reshape(-1, 64, 64, 3), tiles_adjusted, tiles_quant, tiles_values, tile_quants
+
+# Process a list of tiles from `data`. Returns a list of (encoded, preview, quantizer) for each
+# tile: its output binary, its (64, 64*3, 3) preview rows (without the marker, which is added
+# later), and the quantizer used:
+def process_tiles(tile_ids):
+    tiles_orig, tiles_adjusted, tiles_quant, tiles_values, tile_quants = convert_tiles(tile_ids)
+    encoded = encode(tiles_quant, tiles_values, args.format)
+
+    # Preview is rotated back 90 degrees anticlockwise:
+    return [
+        (encoded[idx].tobytes(), np.concatenate([
+            np.rot90(tiles_orig[idx]), np.rot90(tiles_adjusted[idx]), np.rot90(B2_B8[tiles_quant[idx]])
+        ], axis=1).astype(np.uint8), tile_quants[idx])
+        for idx in range(len(tile_ids))
+    ]
+
+# Cache key for a tile: its source pixels, and everything that affects its output:
+def tile_key(cache, tile_id):
     tile_quant = quantize_map.get(tile_id, args.quantize)
-    use_dither = True
-    row, col = divmod(tile_id, cols)
-
-    x0, y0 = col * 64, row * 64
-
-    # Extract tile and rotate:
-    tile_orig = [[[0, 0, 0] for _ in range(64)] for _ in range(64)]
-    for y in range(64):
-        for x in range(64):
-            px = data[y0 + y][(x0 + x)*3:(x0 + x)*3+3]
-            # Rotations are in clockwise degrees.
-            if args.rotate == 0:
-                tx, ty = x, y
-            elif args.rotate == 90:
-                tx, ty = 63-y, x
-                # tile_orig[x][63 - y] = px # Default.
-            elif args.rotate == 180:
-                tx, ty = 63-x, 63-y
-            elif args.rotate == 270:
-                tx, ty = y, 63-x
-            else:
-                raise Exception(f"Invalid rotation [{args.rotate}]; must be one of: 0, 90, 180, 270")
-            tile_orig[ty][tx] = px
+    return cache.key(
+        data[slots[tile_id]].tobytes(),
+        args.rotate, args.format, args.bias, args.multiplier, tile_quant, args.dither_mode,
+        args.unsharp_mask and (args.unsharp_amount, args.unsharp_radius),
+        args.flatten_uniform and args.flatten_epsilon,
+        tile_quant == 'random' and (args.seed, tile_id),
+        tile_quant == 'auto' and (args.auto_metric, args.auto_candidates, args.seed, tile_id),
+    )
+
+TILE_BYTES = 64*64
+PREVIEW_SHAPE = (64, 64*3, 3)
+PREVIEW_BYTES = 64*64*3*3
+
+# Parse --sweep options into a list of every combination, each a dict of parameter => value:
+def sweep_combinations(specs):
+    grid = {}
+    for spec in specs:
+        param, _, values = spec.partition('=')
+        param = param.strip().replace('-', '_')
+        if param not in SWEEP_PARAMS:
+            raise Exception(f"Can't sweep {param!r}; try one of: {', '.join(SWEEP_PARAMS)}")
+        grid[param] = [SWEEP_PARAMS[param](v.strip()) for v in values.split(',')]
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
 
-    if args.unsharp_mask:
-        tile = apply_unsharp_mask(tile_orig, amount=args.unsharp_amount, radius=args.unsharp_radius)
+# The args for one sweep combination. Sweeping the quantizer overrides per-tile codes in
+# --select, and sweeping unsharp settings turns on --unsharp-mask:
+def sweep_args(combo):
+    params = argparse.Namespace(**{**vars(args), **combo})
+    if 'unsharp_amount' in combo or 'unsharp_radius' in combo:
+        params.unsharp_mask = True
+    return params, ({} if 'quantize' in combo else quantize_map)
+
+# Convert tiles with one sweep combination. Returns (metrics, lossy, quantizers): a dict of
+# metric name => value per tile, the quantized tiles rotated back (for the contact sheet), and
+# the quantizer used for each:
+def sweep_tiles(job):
+    global args, quantize_map
+    combo, tile_ids = job
+    base = args, quantize_map
+    args, quantize_map = sweep_args(combo)
+    try:
+        tiles_orig, _, tiles_quant, _, tile_quants = convert_tiles(tile_ids)
+    finally:
+        args, quantize_map = base
+    lossy = B2_B8[tiles_quant]
+    metrics = {name: metric(lossy, tiles_orig) for name, metric in METRICS.items()}
+    return metrics, np.rot90(lossy, axes=(1, 2)).astype(np.uint8), tile_quants
+
+# Run `func` over `jobs` in a pool of --jobs worker processes, which share `data`:
+def pool_map(func, jobs):
+    image_shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+    try:
+        np.ndarray(data.shape, dtype=np.uint8, buffer=image_shm.buf)[:] = data
+        with Pool(args.jobs, initializer=init_worker, initargs=(args, quantize_map, slots, image_shm.name, data.shape)) as pool:
+            return pool.map(func, jobs)
+    finally:
+        image_shm.close()
+        image_shm.unlink()
+
+def run_sweep(tile_ids):
+    tile_ids = list(dict.fromkeys(tile_ids))
+    combos = sweep_combinations(args.sweep)
+    jobs = [(combo, tile_ids) for combo in combos]
+    if args.jobs > 1 and len(jobs) > 1:
+        results = pool_map(sweep_tiles, jobs)
     else:
-        tile = tile_orig
-    if args.flatten_uniform and tile_is_uniform(tile, args.flatten_epsilon):
-      tile_quant = 'threshold'
-      use_dither = False
+        results = [sweep_tiles(job) for job in jobs]
+
+    # --- Table: one row per tile and combination ---
+    with open(args.outfile, 'w', newline='') as f:
+        table = csv.writer(f)
+        table.writerow(['tile', 'combo', *SWEEP_PARAMS, *METRICS])
+        for t, tile_id in enumerate(tile_ids):
+            for c, (combo, (metrics, _, quants)) in enumerate(zip(combos, results)):
+                params, _ = sweep_args(combo)
+                table.writerow([
+                    tile_id, c, quants[t], params.bias, params.multiplier,
+                    params.unsharp_amount if params.unsharp_mask else 0, params.unsharp_radius, params.dither_mode,
+                    *(f"{metrics[name][t]:.3f}" for name in METRICS)
+                ])
+
+    # --- Contact sheet: header of combo numbers, then a row per tile ---
+    header = np.concatenate([np.zeros((8, 32 + 64, 3), dtype=np.int64)] + [render_text(str(c), 64) for c in range(len(combos))], axis=1)
+    rows = [
+        np.concatenate(
+            [render_marker(tile_id), np.rot90(data[slots[tile_id]], -args.rotate // 90 + 1)] + [lossy[t] for _, lossy, _ in results],
+            axis=1
+        )
+        for t, tile_id in enumerate(tile_ids)
+    ]
+    sheet = np.concatenate([header] + rows).astype(np.uint8)
+    with open(args.sweep_sheet, 'wb') as pf:
+        writer = png.Writer(width=sheet.shape[1], height=len(sheet), bitdepth=8, greyscale=False)
+        writer.write(pf, sheet.reshape(len(sheet), -1))
+
+    print(f"Swept {len(combos)} combination(s) of {len(tile_ids)} tile(s); mean over tiles:")
+    for c, (combo, (metrics, _, _)) in enumerate(zip(combos, results)):
+        scores = ', '.join(f"{name} {values.mean():6.2f}" for name, values in metrics.items())
+        print(f"  {c:3d}: {scores}  {combo}")
+    print(f"Wrote {args.outfile} and {args.sweep_sheet}")
 
-    if args.flatten_uniform:
-      region_mask = build_dither_mask(tile, args.flatten_epsilon)
+# Set up a worker process, with the same args and a view of the tiles in shared memory:
+def init_worker(worker_args, worker_quantize_map, worker_slots, shm_name, shape):
+    global args, quantize_map, slots, data, image_shm
+    args, quantize_map, slots = worker_args, worker_quantize_map, worker_slots
+    image_shm = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray(shape, dtype=np.uint8, buffer=image_shm.buf)
+
+if __name__ == '__main__':
+    args, quantize_map = parse_args()
+
+    # --- Load selected tiles ---
+    sheet = TileSheet(args.infile)
+    if sheet.width % 64 or sheet.height % 64:
+        raise Exception("Image dimensions must be divisible by 64")
+    total_tiles = sheet.cols * sheet.rows
+    selected = args.select or list(range(total_tiles))
+    if max(selected) >= total_tiles:
+        raise Exception(f"Tile {max(selected)} is beyond the last tile ({total_tiles-1})")
+    data, slots = sheet.read_tiles(selected)
+
+    if args.sweep:
+        run_sweep(selected)
+        raise SystemExit
+
+    # --- Tile cache ---
+    results = {} # Index in `selected` => (encoded, preview, quantizer)
+    cache = None if args.no_cache else TileCache(args.cache, args.cache_size * 1024 * 1024)
+    if cache:
+        keys = [tile_key(cache, tile_id) for tile_id in selected]
+        for idx, key in enumerate(keys):
+            entry = cache.get(key)
+            if entry is not None:
+                preview = entry[TILE_BYTES:TILE_BYTES+PREVIEW_BYTES]
+                results[idx] = (entry[:TILE_BYTES], np.frombuffer(preview, dtype=np.uint8).reshape(PREVIEW_SHAPE), entry[TILE_BYTES+PREVIEW_BYTES:].decode())
+    todo = [idx for idx in range(len(selected)) if idx not in results]
+    todo_ids = [selected[idx] for idx in todo]
+
+    # --- Tile processing ---
+    if args.jobs > 1 and len(todo) > 1:
+        # A few chunks per worker, so that slow (e.g. error diffusion) tiles even out:
+        size = math.ceil(len(todo) / (args.jobs * 4))
+        chunks = [todo_ids[i:i+size] for i in range(0, len(todo), size)]
+        processed = [tile for chunk in pool_map(process_tiles, chunks) for tile in chunk]
     else:
-      region_mask = [[True for _ in range(64)] for _ in range(64)]
-
-    tile_original = []
-    tile_adjusted = []
-    tile_lossy = []
-    encoded = []
-
-    errbuf = [[[0, 0, 0] for _ in range(64)] for _ in range(64)] if tile_quant in ['fs', 'atkinson', 'stucki', 'sierra'] else None
-
-    for y in range(64):
-        row_o = []
-        row_a = []
-        row_q = []
-        for x in range(64):
-            r, g, b = tile[y][x]
-            row_o.append([r, g, b])
-            r = min(255, max(0, int((r - 128) * args.multiplier) + 128 + args.bias))
-            g = min(255, max(0, int((g - 128) * args.multiplier) + 128 + args.bias))
-            b = min(255, max(0, int((b - 128) * args.multiplier) + 128 + args.bias))
-            row_a.append([r, g, b])
-
-            use_dither_here = region_mask[y][x]
-
-            if not use_dither_here:
-                r2, g2, b2 = map(b8_b2_threshold, (r, g, b))
-
-            elif tile_quant == 'random':
-                r2, g2, b2 = [b8_b2_threshold(v + random.randint(-21, 21)) for v in (r, g, b)]
-            elif tile_quant.startswith('ordered'):
-                matrix = [[0]]
-                if tile_quant == 'ordered2x2':
-                    matrix = [[0, 2], [3, 1]]
-                elif tile_quant == 'ordered4x4':
-                    matrix = [[0,8,2,10],[12,4,14,6],[3,11,1,9],[15,7,13,5]]
-                dim = len(matrix)
-                def dither(val, x, y):
-                    bias = matrix[y % dim][x % dim] / (dim * dim)
-                    level = int(val / 256.0 * 4 + bias)
-                    return min(3, max(0, level))
-                r2, g2, b2 = dither(r,x,y), dither(g,x,y), dither(b,x,y)
-            elif tile_quant in ['fs', 'atkinson', 'stucki', 'sierra']:
-                r += errbuf[y][x][0]
-                g += errbuf[y][x][1]
-                b += errbuf[y][x][2]
-                r = min(255, max(0, r))
-                g = min(255, max(0, g))
-                b = min(255, max(0, b))
-                r2, g2, b2 = map(b8_b2_threshold, (r, g, b))
-                rq, gq, bq = map(b2_b8, (r2, g2, b2))
-                err = [r - rq, g - gq, b - bq]
-                if tile_quant == 'fs':
-                    for dx, dy, w in [(1, 0, 7), (-1, 1, 3), (0, 1, 5), (1, 1, 1)]:
-                        nx, ny = x + dx, y + dy
-                        if 0 <= nx < 64 and 0 <= ny < 64:
-                            for c in range(3):
-                                errbuf[ny][nx][c] += err[c] * w // 16
-                        nx, ny = x + dx, y + dy
-                        if 0 <= nx < 64 and 0 <= ny < 64:
-                            for c in range(3):
-                                errbuf[ny][nx][c] += err[c] * w // 16
-                elif tile_quant == 'atkinson':
-                    for dx, dy in [(1,0), (2,0), (-1,1), (0,1), (1,1), (0,2)]:
-                        nx, ny = x + dx, y + dy
-                        if 0 <= nx < 64 and 0 <= ny < 64:
-                            for c in range(3):
-                                errbuf[ny][nx][c] += err[c] // 8
-                elif tile_quant == 'stucki':
-                    for dx, dy, w in [
-                        (1, 0, 8), (2, 0, 4),
-                        (-2, 1, 2), (-1, 1, 4), (0, 1, 8), (1, 1, 4), (2, 1, 2),
-                        (-2, 2, 1), (-1, 2, 2), (0, 2, 4), (1, 2, 2), (2, 2, 1)
-                    ]:
-                        nx, ny = x + dx, y + dy
-                        if 0 <= nx < 64 and 0 <= ny < 64:
-                            for c in range(3):
-                                errbuf[ny][nx][c] += err[c] * w // 42
-                elif tile_quant == 'sierra':
-                    for dx, dy, w in [
-                        (1, 0, 5), (2, 0, 3),
-                        (-2, 1, 2), (-1, 1, 4), (0, 1, 5), (1, 1, 4), (2, 1, 2),
-                        (-1, 2, 2), (0, 2, 3), (1, 2, 2)
-                    ]:
-                        nx, ny = x + dx, y + dy
-                        if 0 <= nx < 64 and 0 <= ny < 64:
-                            for c in range(3):
-                                errbuf[ny][nx][c] += err[c] * w // 32
-                        nx, ny = x + dx, y + dy
-                        if 0 <= nx < 64 and 0 <= ny < 64:
-                            for c in range(3):
-                                errbuf[ny][nx][c] += err[c] // 8
-            else:
-                # Default fallback quantization method
-                r2, g2, b2 = map(b8_b2_threshold, (r, g, b))
-
-            row_q.append([b2_b8(r2), b2_b8(g2), b2_b8(b2)])
-
-            if args.format == '2xbgr':
-                byte = (
-                    ((b2 & 1) << 6) | ((g2 & 1) << 5) | ((r2 & 1) << 4) |
-                    ((b2 & 2) << 1) | ((g2 & 2)     ) | ((r2 & 2) >> 1)
-                )
-            elif args.format == 'bgrx2222':
-                byte = (b2 << 6) | (g2 << 4) | (r2 << 2)
-            elif args.format == 'mono':
-                avg = (r + g + b) // 3
-                byte = 1 if avg > 127 else 0
-            encoded.append(byte)
-
-        tile_original.append(row_o)  # unmodified
-        tile_adjusted.append(row_a)
-        tile_lossy.append(row_q)
-
-    out.write(bytes(encoded))
-    written += len(encoded)
-
-    for y in range(64):
-        marker = render_marker_line(tile_id, y)
-        row_rotated_original = list(chain.from_iterable(tile_orig[x][63 - y] for x in range(64)))
-        row_rotated_adjusted = list(chain.from_iterable(tile_adjusted[x][63 - y] for x in range(64)))
-        row_rotated_lossy = list(chain.from_iterable(tile_lossy[x][63 - y] for x in range(64)))
-        preview_rows.append(row_rotated_original + row_rotated_adjusted + row_rotated_lossy + marker)
-
-# --- Write preview PNG ---
-with open("preview.png", 'wb') as pf:
-    writer = png.Writer(width=64*3 + 32, height=len(selected)*64, bitdepth=8, greyscale=False)
-    writer.write(pf, preview_rows)
-
-if args.pad > written:
-    out.write(bytes([255] * (args.pad - written)))
-out.close()
+        processed = process_tiles(todo_ids) if todo else []
+
+    for idx, (encoded, preview, quant) in zip(todo, processed):
+        results[idx] = (encoded, preview, quant)
+        if cache:
+            cache.put(keys[idx], encoded + preview.tobytes() + quant.encode())
+    if cache:
+        cache.evict()
+        print(cache.summary())
+
+    # Tiles that had their quantizer chosen automatically get it in their marker, and a --select
+    # list that pins all of them is printed:
+    auto = [idx for idx, tile_id in enumerate(selected) if quantize_map.get(tile_id, args.quantize) == 'auto']
+    if auto:
+        codes = {method: code for code, method in QUANTIZE_CODES.items()}
+        print("Auto-selected quantizers (as --select): " + ','.join(f"{selected[idx]}{codes[results[idx][2]]}" for idx in auto))
+
+    encoded = b''.join(results[idx][0] for idx in range(len(selected)))
+    preview = np.concatenate([
+        np.concatenate([
+            results[idx][1],
+            render_marker(tile_id, QUANTIZE_LABELS.get(results[idx][2]) if idx in auto else None).astype(np.uint8)
+        ], axis=1)
+        for idx, tile_id in enumerate(selected)
+    ])
+
+    # --- Write output ---
+    with open(args.outfile, 'wb') as out:
+        out.write(encoded)
+        if args.pad > len(encoded):
+            out.write(bytes([255] * (args.pad - len(encoded))))
+
+    # --- Write preview PNG ---
+    with open("preview.png", 'wb') as pf:
+        writer = png.Writer(width=64*3 + 32, height=len(selected)*64, bitdepth=8, greyscale=False)
+        writer.write(pf, preview.reshape(len(preview), -1))
@@ -0,0 +1,81 @@
+# tilecache.py
+#
+# On-disk cache of converted tiles for texy9.py, so that rebuilding a ROM after tweaking one
+# tile (or adding one to --select) only converts the tiles that actually changed.
+#
+# Entries are content-addressed: each is keyed by a hash of the tile's source pixels and
+# every parameter that affects its output (see tile_key() in texy9.py), so there's nothing
+# to invalidate; a changed tile or parameter is just a different key. Each entry is one file
+# in the cache directory, holding that tile's output bytes.
+#
+# Using an entry bumps its file's mtime, and evict() deletes the least recently used entries
+# whenever the cache is over its size limit.
+#
+# By default the cache lives in the user's cache directory (not the working directory), so
+# builds don't leave it lying around in the source tree.
+
+import hashlib
+import os
+
+CACHE_VERSION   = 3         # Bump whenever tile conversion changes, to ignore older entries.
+ENTRY_SUFFIX    = '.tile'
+DEFAULT_PATH    = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'raybox-zero', 'texy9'
+)
+
+class TileCache:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    # Hash of `parts`, each either bytes or something with a stable repr():
+    def key(self, *parts):
+        h = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+        for part in parts:
+            data = part if isinstance(part, bytes) else repr(part).encode()
+            h.update(len(data).to_bytes(8, 'little'))
+            h.update(data)
+        return h.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ENTRY_SUFFIX)
+
+    # Cached bytes for `key`, or None:
+    def get(self, key):
+        try:
+            with open(self._file(key), 'rb') as f:
+                data = f.read()
+            os.utime(self._file(key))
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        # Write then rename, so a build that's interrupted can't leave a partial entry:
+        temp = self._file(key) + f".{os.getpid()}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, self._file(key))
+
+    # Delete least recently used entries until the cache fits in max_bytes:
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(ENTRY_SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def summary(self):
+        return f"Tile cache {self.path}: {self.hits} hit(s), {self.misses} miss(es)"
@@ -0,0 +1,49 @@
+# tilesheet.py
+#
+# Streaming reader for PNG sheets of 64x64 tiles (numbered left to right, top to bottom),
+# for texy.py and texy9.py.
+#
+# pypng decodes rows on demand, so rather than loading the whole image, read_tiles() goes
+# through it one 64-row band at a time, copies out just the selected tiles as compact uint8
+# arrays, and discards everything else (stopping after the last band it needs). Peak memory
+# is one band plus the selected tiles, no matter how big the sheet is. (Interlaced PNGs are
+# the exception: pypng has to decode those whole.)
+
+import png
+import numpy as np
+
+TILE = 64
+
+class TileSheet:
+    def __init__(self, path):
+        self.path = path
+        self.width, self.height, self.pixels, _ = png.Reader(filename=path).asRGB8()
+        self.cols = self.width // TILE
+        self.rows = self.height // TILE
+
+    # Read the given tiles (in any order, with repeats). Returns (tiles, slots): a uint8 array
+    # of each distinct tile's pixels, shape (N, 64, 64, 3), and a dict of tile ID => its index
+    # in that array. The sheet can only be read once:
+    def read_tiles(self, tile_ids):
+        wanted = sorted(set(tile_ids))
+        slots = {tile_id: slot for slot, tile_id in enumerate(wanted)}
+        tiles = np.empty((len(wanted), TILE, TILE, 3), dtype=np.uint8)
+        bands = {}
+        for tile_id in wanted:
+            bands.setdefault(tile_id // self.cols, []).append(tile_id)
+        last_band = max(bands, default=-1)
+
+        band = np.empty((TILE, self.width * 3), dtype=np.uint8)
+        for y, row in enumerate(self.pixels):
+            b, r = divmod(y, TILE)
+            if b > last_band:
+                break
+            if b not in bands:
+                continue
+            band[r] = row
+            if r == TILE - 1:
+                pixels = band.reshape(TILE, self.width, 3)
+                for tile_id in bands[b]:
+                    x = (tile_id % self.cols) * TILE
+                    tiles[slots[tile_id]] = pixels[:, x:x+TILE]
+        return tiles, slots